@@ -0,0 +1,386 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import pandas as pd
+import structlog
+from data.data_load import DataLoad
+from data.data_preprocess import DataPreprocess
+from data.data_validation import DataValidation
+from data.synthetic import SyntheticDataGenerator
+from evaluation.classifier_eval import ModelEvaluation
+from evaluation.fast_metrics import FastEvaluation
+from feature_engine.discretisation import EqualFrequencyDiscretiser
+from feature_engine.imputation import MeanMedianImputer
+from feature_engine.wrappers import SklearnTransformerWrapper
+from predict.predict import Predict
+from predict.prediction_store import PredictionStore
+from serving.server import serve_in_thread
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+STAGES = ("load", "validate", "preprocess", "evaluate", "predict")
+
+
+class PipelineBenchmark:
+    """
+    Classe para medir o tempo e a memória de cada etapa do pipeline.
+
+    Para cada tamanho, um CSV sintético (ver SyntheticDataGenerator) é
+    gravado em `data/raw` e as etapas são executadas com as classes do
+    projeto: DataLoad.load_data, DataValidation.run,
+    DataPreprocess.transform, ModelEvaluation e Predict.run. A etapa de
+    predição usa um InferenceServer local com um pipeline treinado no
+    próprio conjunto sintético, então o benchmark roda sem rede e sem
+    MLflow. O tempo é o menor de `repeats` execuções, e o
+    pico de memória alocada é medido com o tracemalloc em uma execução
+    separada, para não distorcer o tempo. Na etapa de predição, o pico
+    inclui o servidor local, que roda no mesmo processo.
+
+    Os resultados são acrescentados ao histórico JSON com o commit e a
+    máquina, e o modo de comparação aponta as etapas que ficaram mais lentas
+    ou usam mais memória do que o limite entre duas execuções.
+
+    Attributes:
+        sizes (List[int]): Os tamanhos dos conjuntos, em linhas.
+        stages (List[str]): As etapas medidas.
+        repeats (int): Quantas execuções cronometradas por etapa.
+        memory (bool): Se o pico de memória é medido.
+        history_path (str): O arquivo JSON do histórico.
+        threshold (float): A piora relativa que conta como regressão.
+
+    Methods:
+        run: Mede as etapas em todos os tamanhos.
+        save: Acrescenta uma execução ao histórico.
+        load_history: Lê o histórico.
+        compare: Compara duas execuções do histórico.
+    """
+
+    def __init__(
+        self,
+        sizes: Optional[List[int]] = None,
+        stages: Optional[List[str]] = None,
+        repeats: Optional[int] = None,
+        memory: bool = True,
+        history_path: Optional[str] = None,
+        threshold: Optional[float] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe PipelineBenchmark.
+
+        Args:
+            sizes (List[int], opcional): Os tamanhos dos conjuntos. Padrão é o
+                `benchmark_sizes` do config.yaml.
+            stages (List[str], opcional): As etapas medidas. Padrão são todas.
+            repeats (int, opcional): Execuções cronometradas por etapa. Padrão
+                é o `benchmark_repeats` do config.yaml.
+            memory (bool, opcional): Mede o pico de memória. Padrão é True.
+            history_path (str, opcional): O arquivo do histórico. Padrão é o
+                `path_benchmark_history` do config.yaml.
+            threshold (float, opcional): A piora relativa que conta como
+                regressão. Padrão é o `benchmark_regression_threshold` do
+                config.yaml.
+        """
+
+        config = load_config_file()
+        self.sizes = sizes or config.get(
+            "benchmark_sizes", [150000, 1000000, 10000000]
+        )
+        self.stages = stages or list(STAGES)
+        self.repeats = repeats or config.get("benchmark_repeats", 1)
+        self.memory = memory
+        self.history_path = history_path or get_project_path(
+            config.get("path_benchmark_history", "benchmarks/history.json")
+        )
+        self.threshold = threshold or config.get(
+            "benchmark_regression_threshold", 0.1
+        )
+        self._dataset_key = "benchmark_dataset_name"
+        self._dataset_path = get_project_path(
+            "data", "raw", config.get(self._dataset_key, "benchmark.csv")
+        )
+        self._target = config.get("target_name")
+
+    def _measure(self, stage: Callable[[], Any]) -> Dict[str, float]:
+        """
+        Mede o tempo e o pico de memória de uma etapa.
+
+        Args:
+            stage (Callable[[], Any]): A etapa, sem argumentos.
+
+        Returns:
+            Dict[str, float]: O menor tempo, em segundos, e o pico de memória
+                alocada, em MB.
+        """
+
+        timings = []
+        for _ in range(self.repeats):
+            gc.collect()
+            started = time.perf_counter()
+            stage()
+            timings.append(time.perf_counter() - started)
+
+        result = {"seconds": min(timings)}
+        if self.memory:
+            gc.collect()
+            tracemalloc.start()
+            stage()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result["peak_mb"] = peak / 1024**2
+        return result
+
+    def _fit_pipeline(self, dataframe: pd.DataFrame) -> Pipeline:
+        """
+        Treina o pipeline do projeto em uma amostra do conjunto.
+
+        Args:
+            dataframe (pd.DataFrame): O conjunto carregado.
+
+        Returns:
+            Pipeline: O pipeline treinado.
+        """
+
+        config = load_config_file()
+        sample = dataframe.sample(min(len(dataframe), 150000), random_state=0)
+        pipe = Pipeline(
+            [
+                (
+                    "imputer",
+                    MeanMedianImputer(variables=config.get("vars_imputer")),
+                ),
+                (
+                    "discretizer",
+                    EqualFrequencyDiscretiser(
+                        variables=config.get("vars_discretize")
+                    ),
+                ),
+                ("scaler", SklearnTransformerWrapper(StandardScaler())),
+                ("model", LogisticRegression(max_iter=1000)),
+            ]
+        )
+        return pipe.fit(
+            sample.drop(columns=self._target), sample[self._target]
+        )
+
+    def _run_size(self, n_rows: int) -> List[Dict[str, Any]]:
+        """
+        Mede as etapas em um conjunto de um tamanho.
+
+        Args:
+            n_rows (int): A quantidade de linhas.
+
+        Returns:
+            List[Dict[str, Any]]: O resultado de cada etapa.
+        """
+
+        logger.info(f"Benchmark com {n_rows} linhas.")
+        SyntheticDataGenerator().write(self._dataset_path, n_rows)
+        dataframe = DataLoad().load_data(self._dataset_key)
+        features = dataframe.drop(columns=self._target)
+        pipe = self._fit_pipeline(dataframe)
+        preprocess = DataPreprocess(pipe[:-1])
+        preprocess.trained_pipe = pipe[:-1]
+        y_pred = pipe.predict_proba(features)[:, 1]
+
+        stages = {
+            "load": lambda: DataLoad().load_data(self._dataset_key),
+            "validate": lambda: DataValidation().run(dataframe),
+            "preprocess": lambda: preprocess.transform(features),
+            "evaluate": lambda: (
+                ModelEvaluation.evaluate_predictions(
+                    dataframe[self._target], y_pred
+                ),
+                FastEvaluation().metrics(dataframe[self._target], y_pred),
+            ),
+        }
+        if "predict" in self.stages:
+            endpoint = f"{serve_in_thread(pipe)}/invocations"
+            store = PredictionStore(
+                os.path.join(tempfile.mkdtemp(), "benchmark.db")
+            )
+            store.sketches = None
+            stages["predict"] = lambda: Predict(
+                features, endpoint=endpoint, store=store
+            ).run()
+
+        results = []
+        for name in self.stages:
+            result = {"stage": name, "n_rows": n_rows}
+            result.update(self._measure(stages[name]))
+            result["rows_per_s"] = n_rows / result["seconds"]
+            logger.info(f"Benchmark {result}")
+            results.append(result)
+        return results
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Mede as etapas em todos os tamanhos.
+
+        Returns:
+            Dict[str, Any]: A execução, com o instante, o commit, a máquina
+                e os resultados.
+        """
+
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        results = []
+        try:
+            for n_rows in self.sizes:
+                results += self._run_size(n_rows)
+        finally:
+            if os.path.exists(self._dataset_path):
+                os.remove(self._dataset_path)
+
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": commit,
+            "host": {
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+                "python": platform.python_version(),
+            },
+            "repeats": self.repeats,
+            "results": results,
+        }
+
+    def load_history(self) -> List[Dict[str, Any]]:
+        """
+        Lê o histórico de execuções.
+
+        Returns:
+            List[Dict[str, Any]]: As execuções, da mais antiga à mais nova.
+        """
+
+        if not os.path.exists(self.history_path):
+            return []
+        with open(self.history_path) as f:
+            return json.load(f)
+
+    def save(self, benchmark_run: Dict[str, Any]) -> None:
+        """
+        Acrescenta uma execução ao histórico.
+
+        O arquivo é gravado com um nome temporário e renomeado, então uma
+        interrupção não corrompe o histórico.
+
+        Args:
+            benchmark_run (Dict[str, Any]): O resultado de `run`.
+        """
+
+        history = self.load_history() + [benchmark_run]
+        os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+        tmp_path = f"{self.history_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(history, f, indent=2)
+        os.replace(tmp_path, self.history_path)
+        logger.info(f"Benchmark gravado em {self.history_path}.")
+
+    def compare(self, baseline: int = -2, candidate: int = -1) -> pd.DataFrame:
+        """
+        Compara duas execuções do histórico.
+
+        Args:
+            baseline (int, opcional): A posição da execução de referência.
+                Padrão é a penúltima.
+            candidate (int, opcional): A posição da execução comparada.
+                Padrão é a última.
+
+        Returns:
+            pd.DataFrame: Para cada etapa e tamanho, os tempos e picos de
+                memória, a variação relativa e se houve regressão.
+
+        Raises:
+            ValueError: Se o histórico tiver menos de duas execuções.
+        """
+
+        history = self.load_history()
+        if len(history) < 2:
+            raise ValueError("O histórico precisa de duas execuções.")
+
+        keys = ["stage", "n_rows"]
+        df_base = pd.DataFrame(history[baseline]["results"])
+        df_cand = pd.DataFrame(history[candidate]["results"])
+        df_compare = df_base.merge(
+            df_cand, on=keys, suffixes=("_base", "_cand")
+        )
+
+        df_compare["regression"] = False
+        for metric in ["seconds", "peak_mb"]:
+            if f"{metric}_base" not in df_compare:
+                continue
+            change = (
+                df_compare[f"{metric}_cand"] / df_compare[f"{metric}_base"] - 1
+            )
+            df_compare[f"{metric}_change"] = change
+            df_compare["regression"] |= change > self.threshold
+
+        for row in df_compare[df_compare["regression"]].itertuples():
+            logger.warning(
+                f"Regressão em {row.stage} com {row.n_rows} linhas: "
+                f"{row.seconds_change:+.1%} no tempo."
+            )
+        return df_compare
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", nargs="*", type=int, help="Os tamanhos, em linhas."
+    )
+    parser.add_argument(
+        "--stages", nargs="*", choices=STAGES, help="As etapas medidas."
+    )
+    parser.add_argument("--repeats", type=int, help="Execuções por etapa.")
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Não mede o pico de memória.",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Compara as duas últimas execuções do histórico.",
+    )
+    parser.add_argument(
+        "--threshold", type=float, help="A piora que conta como regressão."
+    )
+    args = parser.parse_args()
+
+    benchmark = PipelineBenchmark(
+        sizes=args.sizes,
+        stages=args.stages,
+        repeats=args.repeats,
+        memory=not args.no_memory,
+        threshold=args.threshold,
+    )
+    if args.compare:
+        df_compare = benchmark.compare()
+        print(df_compare.to_string(index=False))
+        sys.exit(int(df_compare["regression"].any()))
+
+    benchmark.save(benchmark.run())
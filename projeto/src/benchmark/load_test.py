@@ -0,0 +1,696 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from deploy.backends import LocalBackend
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+TARGETS = ("endpoint", "local", "predict")
+
+
+class LatencyHistogram:
+    """
+    Histograma de latências no estilo HDR, com erro relativo limitado.
+
+    As faixas crescem geometricamente a partir de `lowest_ms`, com razão
+    `1 + 10**-significant_digits`, então qualquer percentil é conhecido com
+    erro relativo menor que `10**-significant_digits`, usando poucos KB de
+    memória para qualquer quantidade de amostras. Histogramas de threads ou
+    execuções diferentes se somam com `merge`.
+
+    Attributes:
+        lowest_ms (float): A menor latência distinguível.
+        highest_ms (float): A maior latência registrada sem saturar.
+        significant_digits (int): Os dígitos significativos preservados.
+        counts (np.ndarray): As contagens de cada faixa.
+        total (int): A quantidade de amostras.
+        max_ms (float): A maior latência registrada.
+
+    Methods:
+        record: Registra uma latência.
+        merge: Soma outro histograma a este.
+        percentile: Estima um percentil.
+        summary: Resume os percentis principais.
+        to_dict: Serializa as faixas não vazias.
+    """
+
+    def __init__(
+        self,
+        lowest_ms: float = 0.01,
+        highest_ms: float = 600000.0,
+        significant_digits: int = 2,
+    ) -> None:
+        """
+        Inicializa uma instância da classe LatencyHistogram.
+
+        Args:
+            lowest_ms (float, opcional): A menor latência distinguível.
+                Padrão é 0,01 ms.
+            highest_ms (float, opcional): A maior latência sem saturar.
+                Padrão é 10 minutos.
+            significant_digits (int, opcional): Os dígitos significativos.
+                Padrão é 2 (erro relativo de 1%).
+        """
+
+        self.lowest_ms = lowest_ms
+        self.highest_ms = highest_ms
+        self.significant_digits = significant_digits
+        self._log_ratio = math.log1p(10**-significant_digits)
+        n_buckets = self._index(highest_ms) + 1
+        self.counts = np.zeros(n_buckets, dtype="int64")
+        self.total = 0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, latency_ms: float) -> int:
+        """
+        Calcula a faixa de uma latência.
+
+        Args:
+            latency_ms (float): A latência, em ms.
+
+        Returns:
+            int: O índice da faixa.
+        """
+
+        latency_ms = min(max(latency_ms, self.lowest_ms), self.highest_ms)
+        return int(math.log(latency_ms / self.lowest_ms) / self._log_ratio)
+
+    def record(self, latency_ms: float) -> None:
+        """
+        Registra uma latência.
+
+        Args:
+            latency_ms (float): A latência, em ms.
+        """
+
+        index = self._index(latency_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.max_ms = max(self.max_ms, latency_ms)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """
+        Soma outro histograma, com a mesma configuração, a este.
+
+        Args:
+            other (LatencyHistogram): O histograma somado.
+
+        Returns:
+            LatencyHistogram: Este histograma.
+        """
+
+        with self._lock:
+            self.counts += other.counts
+            self.total += other.total
+            self.max_ms = max(self.max_ms, other.max_ms)
+        return self
+
+    def percentile(self, q: float) -> float:
+        """
+        Estima um percentil pelo limite superior da sua faixa.
+
+        Args:
+            q (float): O percentil, entre 0 e 100.
+
+        Returns:
+            float: A latência, em ms, ou NaN sem amostras.
+        """
+
+        if self.total == 0:
+            return float("nan")
+        rank = max(math.ceil(q / 100 * self.total), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        upper = self.lowest_ms * math.exp((index + 1) * self._log_ratio)
+        return min(upper, self.max_ms)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Resume os percentis principais.
+
+        Returns:
+            Dict[str, float]: p50, p90, p95, p99, p99.9 e máximo, em ms.
+        """
+
+        return {
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max_ms,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serializa as faixas não vazias.
+
+        Returns:
+            Dict[str, Any]: A configuração e as contagens por limite
+                superior de faixa, em ms.
+        """
+
+        nonzero = np.flatnonzero(self.counts)
+        upper = self.lowest_ms * np.exp((nonzero + 1) * self._log_ratio)
+        return {
+            "lowest_ms": self.lowest_ms,
+            "significant_digits": self.significant_digits,
+            "buckets": {
+                f"{bound:.4g}": int(self.counts[i])
+                for bound, i in zip(upper, nonzero)
+            },
+        }
+
+
+class LoadTest:
+    """
+    Classe do gerador de carga e do teste de SLO de latência.
+
+    Reproduz linhas gravadas na tabela `predictions`, sintéticas (ver
+    SyntheticDataGenerator) ou de um CSV contra o caminho de pontuação:
+    qualquer `/invocations` (`endpoint`), um InferenceServer iniciado no
+    próprio processo (`local`) ou a classe Predict (`predict`), que inclui a
+    gravação das predições.
+
+    No modo fechado (`closed_loop`), `concurrency` clientes enviam uma
+    requisição assim que recebem a anterior. No modo aberto (`open_loop`),
+    as requisições chegam em uma taxa fixa, independente das respostas, e a
+    latência é medida a partir do instante agendado, então a fila formada
+    quando o servidor não acompanha entra na latência (sem coordinated
+    omission). As latências vão para histogramas HDR e o relatório traz
+    percentis, vazão e taxa de erros. `find_saturation` aumenta a taxa até
+    o SLO ser violado, para planejar a capacidade antes de cada versão.
+
+    Attributes:
+        target (str): O alvo: 'endpoint', 'local' ou 'predict'.
+        endpoint (str): A URL do `/invocations`.
+        rows (pd.DataFrame): As linhas reproduzidas.
+        rows_per_request (int): As linhas de cada requisição.
+        duration (float): A duração de cada execução, em segundos.
+        concurrency (int): Os clientes simultâneos do modo fechado.
+        slo_p99_ms (float): O p99 máximo aceito.
+        max_error_rate (float): A taxa de erros máxima aceita.
+
+    Methods:
+        closed_loop: Executa o teste com concorrência fixa.
+        open_loop: Executa o teste com taxa de chegada fixa.
+        find_saturation: Encontra a maior taxa que cumpre o SLO.
+    """
+
+    def __init__(
+        self,
+        target: str = "endpoint",
+        endpoint: Optional[str] = None,
+        source: str = "synthetic",
+        n_rows: int = 10000,
+        rows_per_request: Optional[int] = None,
+        duration: Optional[float] = None,
+        model: Any = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe LoadTest.
+
+        Args:
+            target (str, opcional): 'endpoint', 'local' ou 'predict'. Padrão
+                é 'endpoint'.
+            endpoint (str, opcional): A URL do `/invocations`. Padrão é o
+                servidor em `serving_host` e `serving_port`, ou o servidor
+                local com o alvo 'local'.
+            source (str, opcional): 'predictions', 'synthetic' ou o caminho
+                de um CSV. Padrão é 'synthetic'.
+            n_rows (int, opcional): Quantas linhas carregar. Padrão é 10000.
+            rows_per_request (int, opcional): As linhas por requisição.
+                Padrão é o `load_test_rows_per_request` do config.yaml.
+            duration (float, opcional): A duração de cada execução. Padrão é
+                o `load_test_duration_seconds` do config.yaml.
+            model (opcional): O pipeline do alvo 'local'. Padrão é o alias
+                'modelo'.
+
+        Raises:
+            ValueError: Se o alvo não for suportado.
+        """
+
+        if target not in TARGETS:
+            raise ValueError(f"Alvo não suportado: {target}")
+
+        config = load_config_file()
+        self.target = target
+        self.rows_per_request = rows_per_request or config.get(
+            "load_test_rows_per_request", 1
+        )
+        self.duration = duration or config.get(
+            "load_test_duration_seconds", 30
+        )
+        self.concurrency = config.get("load_test_concurrency", 8)
+        self.slo_p99_ms = config.get("load_test_slo_p99_ms", 100)
+        self.max_error_rate = config.get("load_test_max_error_rate", 0.01)
+        self.rows = self._load_rows(source, n_rows)
+
+        if target == "local":
+            from serving.server import serve_in_thread
+
+            endpoint = f"{serve_in_thread(model)}/invocations"
+        self.endpoint = endpoint or (
+            f"http://{config.get('serving_host', '127.0.0.1')}:"
+            f"{config.get('serving_port', 5001)}/invocations"
+        )
+
+        self._store = None
+        if target == "predict":
+            import tempfile
+
+            from predict.prediction_store import PredictionStore
+
+            # as predições do teste não vão para a base de produção
+            self._store = PredictionStore(
+                os.path.join(tempfile.mkdtemp(), "load_test.db")
+            )
+
+    @staticmethod
+    def _load_rows(source: str, n_rows: int) -> pd.DataFrame:
+        """
+        Carrega as linhas reproduzidas no teste.
+
+        Args:
+            source (str): 'predictions', 'synthetic' ou o caminho de um CSV.
+            n_rows (int): Quantas linhas carregar.
+
+        Returns:
+            pd.DataFrame: As variáveis de entrada do modelo.
+        """
+
+        config = load_config_file()
+        features = [
+            column
+            for column in config.get("columns_to_use")
+            if column != config.get("target_name")
+        ]
+        if source == "predictions":
+            from predict.prediction_store import PredictionStore
+
+            df_rows = PredictionStore().read(columns=features, limit=n_rows)
+        elif source == "synthetic":
+            from data.synthetic import SyntheticDataGenerator
+
+            df_rows = SyntheticDataGenerator().generate(n_rows)
+        else:
+            df_rows = pd.read_csv(source, nrows=n_rows)
+
+        if df_rows.empty:
+            raise ValueError(f"Nenhuma linha encontrada em {source}.")
+        return df_rows[features].astype("float64").reset_index(drop=True)
+
+    def _requests(self) -> Callable[[int], pd.DataFrame]:
+        """
+        Cria a função que devolve as linhas da requisição `i`.
+
+        As linhas são percorridas em ciclo, então qualquer duração é
+        atendida com um conjunto finito.
+
+        Returns:
+            Callable[[int], pd.DataFrame]: As linhas de cada requisição.
+        """
+
+        n_batches = max(len(self.rows) // self.rows_per_request, 1)
+        if len(self.rows) < self.rows_per_request:
+            logger.warning(
+                f"Só {len(self.rows)} linhas carregadas: cada requisição terá "
+                f"{len(self.rows)} linhas, e não {self.rows_per_request}."
+            )
+        batches = [
+            self.rows.iloc[
+                i * self.rows_per_request : (i + 1) * self.rows_per_request
+            ]
+            for i in range(n_batches)
+        ]
+        return lambda i: batches[i % n_batches]
+
+    def _scorer(self, concurrency: int) -> Callable[[pd.DataFrame], Any]:
+        """
+        Cria a função que pontua uma requisição no alvo.
+
+        Args:
+            concurrency (int): As requisições simultâneas, para dimensionar o
+                pool de conexões.
+
+        Returns:
+            Callable[[pd.DataFrame], Any]: A função de pontuação.
+        """
+
+        if self.target == "predict":
+            from predict.predict import Predict
+
+            return lambda df: Predict(
+                df, endpoint=self.endpoint, store=self._store
+            ).run()
+
+        backend = LocalBackend(
+            self.endpoint,
+            batch_size=self.rows_per_request,
+            max_workers=concurrency,
+            max_retries=0,
+        )
+        return backend.predict
+
+    def _report(
+        self,
+        mode: str,
+        histogram: LatencyHistogram,
+        errors: int,
+        rows: int,
+        elapsed: float,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """
+        Monta o relatório de uma execução.
+
+        Args:
+            mode (str): 'closed_loop' ou 'open_loop'.
+            histogram (LatencyHistogram): As latências das requisições.
+            errors (int): A quantidade de requisições com erro.
+            rows (int): As linhas pontuadas pelas requisições sem erro.
+            elapsed (float): A duração real, em segundos.
+            **params: Os parâmetros da execução.
+
+        Returns:
+            Dict[str, Any]: Os percentis, a vazão, a taxa de erros e o
+                histograma.
+        """
+
+        requests = histogram.total
+        succeeded = requests - errors
+        report = {
+            "mode": mode,
+            "target": self.target,
+            **params,
+            "rows_per_request": rows / succeeded if succeeded else 0.0,
+            "requests": requests,
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0.0,
+            "throughput_rps": succeeded / elapsed,
+            "rows_per_s": rows / elapsed,
+            **histogram.summary(),
+            "histogram": histogram.to_dict(),
+        }
+        logger.info(
+            f"{mode} {params}: {report['throughput_rps']:.1f} req/s, "
+            f"p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms, "
+            f"erros {report['error_rate']:.2%}"
+        )
+        return report
+
+    def closed_loop(
+        self,
+        concurrency: Optional[int] = None,
+        duration: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Executa o teste com `concurrency` clientes em ciclo fechado.
+
+        Args:
+            concurrency (int, opcional): Os clientes simultâneos. Padrão é
+                o `load_test_concurrency` do config.yaml.
+            duration (float, opcional): A duração, em segundos. Padrão é o
+                `duration` da instância.
+
+        Returns:
+            Dict[str, Any]: O relatório da execução.
+        """
+
+        concurrency = concurrency or self.concurrency
+        duration = duration or self.duration
+        next_rows, score = self._requests(), self._scorer(concurrency)
+        histogram = LatencyHistogram()
+        errors, scored, counter = [0], [0], iter(range(sys.maxsize))
+        lock = threading.Lock()
+        started = time.perf_counter()
+        deadline = started + duration
+
+        def client() -> None:
+            while time.perf_counter() < deadline:
+                with lock:
+                    rows = next_rows(next(counter))
+                sent = time.perf_counter()
+                try:
+                    score(rows)
+                except Exception:
+                    with lock:
+                        errors[0] += 1
+                else:
+                    with lock:
+                        scored[0] += len(rows)
+                histogram.record((time.perf_counter() - sent) * 1000)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return self._report(
+            "closed_loop",
+            histogram,
+            errors[0],
+            scored[0],
+            time.perf_counter() - started,
+            concurrency=concurrency,
+        )
+
+    def open_loop(
+        self,
+        rate: float,
+        duration: Optional[float] = None,
+        max_concurrency: int = 256,
+        poisson: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Executa o teste com requisições chegando a uma taxa fixa.
+
+        Cada requisição tem um instante agendado, e a latência conta a
+        partir dele, incluindo a espera por um cliente livre.
+
+        Args:
+            rate (float): As requisições por segundo.
+            duration (float, opcional): A duração, em segundos. Padrão é o
+                `duration` da instância.
+            max_concurrency (int, opcional): O máximo de requisições em
+                andamento. Padrão é 256.
+            poisson (bool, opcional): Sorteia os intervalos entre chegadas
+                (processo de Poisson) em vez de intervalos fixos. Padrão é
+                True.
+
+        Returns:
+            Dict[str, Any]: O relatório da execução.
+        """
+
+        duration = duration or self.duration
+        next_rows, score = self._requests(), self._scorer(max_concurrency)
+        histogram = LatencyHistogram()
+        errors, scored = [0], [0]
+        lock = threading.Lock()
+
+        n_requests = max(int(rate * duration), 1)
+        gaps = (
+            np.random.default_rng().exponential(1 / rate, n_requests)
+            if poisson
+            else np.full(n_requests, 1 / rate)
+        )
+
+        def send(i: int, scheduled: float) -> None:
+            rows = next_rows(i)
+            try:
+                score(rows)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            else:
+                with lock:
+                    scored[0] += len(rows)
+            histogram.record((time.perf_counter() - scheduled) * 1000)
+
+        started = time.perf_counter()
+        schedule = started + np.cumsum(gaps) - gaps[0]
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = []
+            for i, scheduled in enumerate(schedule):
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(send, i, scheduled))
+            wait(futures)
+
+        return self._report(
+            "open_loop",
+            histogram,
+            errors[0],
+            scored[0],
+            time.perf_counter() - started,
+            rate=rate,
+        )
+
+    def _meets_slo(self, report: Dict[str, Any]) -> bool:
+        """
+        Verifica se uma execução cumpre o SLO.
+
+        A vazão obtida precisa acompanhar 90% da taxa oferecida, além dos
+        limites de p99 e de erros.
+
+        Args:
+            report (Dict[str, Any]): O relatório de `open_loop`.
+
+        Returns:
+            bool: Se o SLO foi cumprido.
+        """
+
+        return (
+            report["p99_ms"] <= self.slo_p99_ms
+            and report["error_rate"] <= self.max_error_rate
+            and report["throughput_rps"] >= 0.9 * report["rate"]
+        )
+
+    def find_saturation(
+        self,
+        start_rate: float = 10.0,
+        growth: float = 1.5,
+        max_rate: float = 100000.0,
+        min_rate: float = 0.1,
+        refine_steps: int = 3,
+        duration: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Encontra a maior taxa de chegada que cumpre o SLO.
+
+        A taxa cresce geometricamente até o SLO ser violado, e o intervalo
+        entre a última taxa aprovada e a primeira reprovada é refinado por
+        busca binária. Se a taxa inicial já viola o SLO, a taxa decresce
+        geometricamente até ser aprovada.
+
+        Args:
+            start_rate (float, opcional): A taxa inicial. Padrão é 10 req/s.
+            growth (float, opcional): O fator de crescimento. Padrão é 1,5.
+            max_rate (float, opcional): A taxa máxima testada.
+            min_rate (float, opcional): A taxa mínima testada. Padrão é
+                0,1 req/s.
+            refine_steps (int, opcional): Os passos da busca binária. Padrão
+                é 3.
+            duration (float, opcional): A duração de cada execução.
+
+        Returns:
+            Dict[str, Any]: A taxa de saturação, o SLO e os relatórios de
+                cada execução.
+
+        Raises:
+            RuntimeError: Se nem a taxa mínima cumprir o SLO.
+        """
+
+        runs: List[Dict[str, Any]] = []
+        passed, failed, rate = None, None, start_rate
+        while rate <= max_rate:
+            report = self.open_loop(rate, duration)
+            runs.append(report)
+            if not self._meets_slo(report):
+                failed = rate
+                break
+            passed, rate = rate, rate * growth
+
+        # a taxa inicial já viola o SLO: a busca continua para baixo
+        rate = start_rate / growth
+        while passed is None and rate >= min_rate:
+            report = self.open_loop(rate, duration)
+            runs.append(report)
+            if self._meets_slo(report):
+                passed = rate
+            else:
+                failed, rate = rate, rate / growth
+        if passed is None:
+            raise RuntimeError(
+                f"Nenhuma taxa entre {min_rate} e {start_rate} req/s cumpre "
+                f"p99 <= {self.slo_p99_ms} ms e erros <= "
+                f"{self.max_error_rate:.2%}."
+            )
+
+        if failed is not None:
+            low, high = passed, failed
+            for _ in range(refine_steps):
+                rate = (low + high) / 2
+                report = self.open_loop(rate, duration)
+                runs.append(report)
+                if self._meets_slo(report):
+                    low = rate
+                else:
+                    high = rate
+            passed = low
+
+        logger.info(
+            f"Saturação: {passed} req/s cumprem p99 <= {self.slo_p99_ms} ms "
+            f"e erros <= {self.max_error_rate:.2%}."
+        )
+        return {
+            "saturation_rps": passed,
+            "slo_p99_ms": self.slo_p99_ms,
+            "max_error_rate": self.max_error_rate,
+            "runs": runs,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=TARGETS, default="endpoint")
+    parser.add_argument("--endpoint", help="A URL do /invocations.")
+    parser.add_argument(
+        "--source",
+        default="synthetic",
+        help="'predictions', 'synthetic' ou o caminho de um CSV.",
+    )
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--rows-per-request", type=int)
+    parser.add_argument("--duration", type=float)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, help="Modo fechado.")
+    mode.add_argument("--rate", type=float, help="Modo aberto, em req/s.")
+    mode.add_argument(
+        "--saturation",
+        action="store_true",
+        help="Procura a maior taxa que cumpre o SLO.",
+    )
+    parser.add_argument("--output", help="Grava o relatório em JSON.")
+    args = parser.parse_args()
+
+    load_test = LoadTest(
+        target=args.target,
+        endpoint=args.endpoint,
+        source=args.source,
+        n_rows=args.rows,
+        rows_per_request=args.rows_per_request,
+        duration=args.duration,
+    )
+    if args.rate:
+        result = load_test.open_loop(args.rate)
+    elif args.saturation:
+        result = load_test.find_saturation()
+    else:
+        result = load_test.closed_loop(args.concurrency)
+
+    output = args.output or get_project_path(
+        load_config_file().get(
+            "path_load_test_results", "benchmarks/load_test.json"
+        )
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"Relatório gravado em {output}.")
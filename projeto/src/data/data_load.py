@@ -3,6 +3,7 @@ import sys
 
 import pandas as pd
 import structlog
+from utils.instrumentation import instrument
 from utils.utils import load_config_file
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
@@ -20,6 +21,7 @@ class DataLoad:
     def __init__(self) -> None:
         pass
 
+    @instrument()
     def load_data(self, dataset_name: str) -> pd.DataFrame:
         """Carrega os dados a partir do nome do dataser fornecido
 
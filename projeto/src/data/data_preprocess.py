@@ -6,6 +6,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
 import pandas as pd
 import structlog
 from sklearn.pipeline import Pipeline
+from utils.instrumentation import instrument
 from utils.utils import load_config_file
 
 logger = structlog.getLogger()
@@ -37,6 +38,7 @@ class DataPreprocess:
         self.pipe = pipe
         self.trained_pipe = None
 
+    @instrument()
     def train(self, dataframe: pd.DataFrame):
         """
         Treina o pipeline de pré-processamento com os dados fornecidos.
@@ -48,6 +50,7 @@ class DataPreprocess:
         self.trained_pipe = self.pipe.fit(dataframe)
         logger.info("pré-processamento terminou")
 
+    @instrument()
     def transform(self, dataframe: pd.DataFrame):
         """
         Aplica o pipeline treinado aos dados fornecidos.
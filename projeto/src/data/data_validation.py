@@ -6,6 +6,7 @@ import pandas as pd
 import pandera
 import structlog
 from pandera import Check, Column, DataFrameSchema
+from utils.instrumentation import instrument
 from utils.utils import load_config_file
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
@@ -179,6 +180,7 @@ class DataValidation:
             checks=checks,
         )
 
+    @instrument()
     def run(self, dataframe: pd.DataFrame) -> bool:
         """
         Executa as validações da estrutura e das colunas do DataFrame.
@@ -0,0 +1,421 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Union
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import structlog
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+
+def sample_column(
+    spec: Dict[str, Any], n_rows: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Sorteia os valores de uma variável a partir da sua especificação.
+
+    As distribuições aceitas são `beta` (a, b), `normal` (mean, std),
+    `lognormal` (mean, sigma), `poisson` (lam) e `negative_binomial`
+    (n, p). Com `outlier_rate`, essa fração das linhas é substituída por uma
+    log-normal (`outlier_mean`, `outlier_sigma`), formando a cauda longa de
+    variáveis como a utilização do crédito. `min` e `max` limitam os valores.
+
+    Args:
+        spec (Dict[str, Any]): O bloco `synthetic` da coluna no config.yaml.
+        n_rows (int): A quantidade de valores.
+        rng (np.random.Generator): O gerador aleatório.
+
+    Returns:
+        np.ndarray: Os valores sorteados.
+
+    Raises:
+        ValueError: Se a distribuição não for suportada.
+    """
+
+    distribution = spec["distribution"]
+    if distribution == "beta":
+        values = rng.beta(spec["a"], spec["b"], n_rows)
+    elif distribution == "normal":
+        values = rng.normal(spec["mean"], spec["std"], n_rows)
+    elif distribution == "lognormal":
+        values = rng.lognormal(spec["mean"], spec["sigma"], n_rows)
+    elif distribution == "poisson":
+        values = rng.poisson(spec["lam"], n_rows).astype("float64")
+    elif distribution == "negative_binomial":
+        values = rng.negative_binomial(spec["n"], spec["p"], n_rows).astype(
+            "float64"
+        )
+    else:
+        raise ValueError(f"Distribuição não suportada: {distribution}")
+
+    if spec.get("outlier_rate"):
+        outliers = rng.random(n_rows) < spec["outlier_rate"]
+        values[outliers] = rng.lognormal(
+            spec["outlier_mean"], spec["outlier_sigma"], outliers.sum()
+        )
+    return np.clip(values, spec.get("min", -np.inf), spec.get("max", np.inf))
+
+
+def _generate_chunk(task: Dict[str, Any]) -> Union[bytes, pa.Table]:
+    """
+    Gera e serializa um bloco de linhas no processo do pool.
+
+    A serialização também roda no pool, então o processo principal só grava
+    os blocos prontos.
+
+    Args:
+        task (Dict[str, Any]): O gerador, a primeira linha, o tamanho do
+            bloco e o formato de saída.
+
+    Returns:
+        O bloco em CSV (bytes, com cabeçalho só no primeiro bloco) ou como
+            tabela Arrow.
+    """
+
+    chunk = task["generator"].generate(
+        task["n_rows"], start=task["start"], total_rows=task["total_rows"]
+    )
+    if task["parquet"]:
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+    return chunk.to_csv(header=task["start"] == 0, index=False).encode()
+
+
+class SyntheticDataGenerator:
+    """
+    Classe para gerar dados sintéticos fiéis ao schema do config.yaml.
+
+    Os tipos e a nulidade vêm da lista `columns` do config.yaml, e a
+    distribuição de cada variável vem do seu bloco `synthetic` (ver
+    `sample_column`). O alvo segue uma regressão logística nas variáveis,
+    com o coeficiente `effect` de cada uma aplicado a `log1p(valor)` e o
+    intercepto ajustado para a taxa de maus `target_rate`. As ausências são
+    sorteadas depois do alvo, na taxa `missing` de cada variável.
+
+    Cada bloco de `chunk_rows` linhas tem sua própria semente, derivada da
+    semente principal e da posição do bloco, então o mesmo arquivo é gerado
+    com qualquer quantidade de processos. Arquivos de qualquer tamanho são
+    gravados bloco a bloco, sem manter o conjunto inteiro na memória.
+
+    O drift é injetado por variável com `shift` (soma), `scale`
+    (multiplicação) e `missing` (taxa de ausentes). Com `ramp`, a
+    intensidade cresce linearmente da primeira à última linha do arquivo,
+    simulando um drift gradual. Como o alvo é calculado depois do drift, a
+    relação entre as variáveis e o alvo não muda (covariate shift).
+
+    Attributes:
+        columns (List[Dict[str, Any]]): O schema das colunas.
+        target_name (str): O nome do alvo.
+        target_rate (float): A taxa de maus.
+        drift (Dict[str, Dict[str, float]]): O drift de cada variável.
+        ramp (bool): Se o drift é gradual.
+        seed (int): A semente principal.
+        chunk_rows (int): As linhas de cada bloco.
+        n_jobs (int): A quantidade de processos.
+        intercept (float): O intercepto calibrado do alvo.
+
+    Methods:
+        generate: Gera um bloco de linhas.
+        write: Grava um arquivo CSV ou Parquet.
+    """
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        target_rate: Optional[float] = None,
+        drift: Optional[Dict[str, Dict[str, float]]] = None,
+        ramp: bool = False,
+        chunk_rows: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe SyntheticDataGenerator.
+
+        Args:
+            seed (int, opcional): A semente principal. Padrão é o
+                `random_state` do config.yaml.
+            target_rate (float, opcional): A taxa de maus. Padrão é o
+                `synthetic_target_rate` do config.yaml.
+            drift (Dict[str, Dict[str, float]], opcional): O drift de cada
+                variável, como `{"RendaMensal": {"scale": 0.8}}`.
+            ramp (bool, opcional): Torna o drift gradual ao longo do arquivo.
+                Padrão é False.
+            chunk_rows (int, opcional): As linhas de cada bloco. Padrão é o
+                `synthetic_chunk_rows` do config.yaml.
+            n_jobs (int, opcional): A quantidade de processos. Padrão é o
+                `synthetic_n_jobs` do config.yaml ou a quantidade de CPUs.
+
+        Raises:
+            ValueError: Se o drift citar uma variável fora do schema.
+        """
+
+        config = load_config_file()
+        self.columns = [
+            column
+            for column in config.get("columns")
+            if column["name"] in config.get("columns_to_use")
+        ]
+        self.target_name = config.get("target_name")
+        self.target_rate = target_rate or config.get(
+            "synthetic_target_rate", 0.067
+        )
+        self.drift = drift or {}
+        self.ramp = ramp
+        self.seed = seed if seed is not None else config.get("random_state")
+        self.chunk_rows = chunk_rows or config.get(
+            "synthetic_chunk_rows", 500000
+        )
+        self.n_jobs = (
+            n_jobs or config.get("synthetic_n_jobs") or os.cpu_count()
+        )
+
+        names = {column["name"] for column in self.columns}
+        unknown = set(self.drift) - names
+        if unknown:
+            raise ValueError(f"Drift em variáveis fora do schema: {unknown}")
+        self.intercept = self._calibrate_intercept()
+
+    def _features(
+        self, n_rows: int, rng: np.random.Generator
+    ) -> Dict[str, np.ndarray]:
+        """
+        Sorteia as variáveis, sem drift e sem ausências.
+
+        Args:
+            n_rows (int): A quantidade de linhas.
+            rng (np.random.Generator): O gerador aleatório.
+
+        Returns:
+            Dict[str, np.ndarray]: Os valores de cada variável.
+        """
+
+        return {
+            column["name"]: sample_column(column["synthetic"], n_rows, rng)
+            for column in self.columns
+            if "synthetic" in column
+        }
+
+    def _logit(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Calcula o log-odds do alvo, sem o intercepto.
+
+        Args:
+            features (Dict[str, np.ndarray]): Os valores de cada variável.
+
+        Returns:
+            np.ndarray: O log-odds de cada linha.
+        """
+
+        logit = 0.0
+        for column in self.columns:
+            effect = column.get("synthetic", {}).get("effect")
+            if effect:
+                values = np.maximum(features[column["name"]], 0)
+                logit = logit + effect * np.log1p(values)
+        return logit
+
+    def _calibrate_intercept(self, n_rows: int = 200000) -> float:
+        """
+        Ajusta o intercepto para que a taxa de maus seja `target_rate`.
+
+        Usa uma amostra piloto de semente fixa e busca binária, já que a
+        taxa média cresce com o intercepto.
+
+        Args:
+            n_rows (int, opcional): O tamanho da amostra piloto.
+
+        Returns:
+            float: O intercepto calibrado.
+        """
+
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed))
+        logit = self._logit(self._features(n_rows, rng))
+        low, high = -30.0, 30.0
+        for _ in range(60):
+            intercept = (low + high) / 2
+            rate = np.mean(1 / (1 + np.exp(-(intercept + logit))))
+            if rate < self.target_rate:
+                low = intercept
+            else:
+                high = intercept
+        return (low + high) / 2
+
+    def _apply_drift(
+        self, features: Dict[str, np.ndarray], intensity: np.ndarray
+    ) -> None:
+        """
+        Aplica o drift de deslocamento e escala às variáveis.
+
+        Args:
+            features (Dict[str, np.ndarray]): Os valores de cada variável,
+                alterados no lugar.
+            intensity (np.ndarray): A intensidade do drift em cada linha,
+                entre 0 e 1.
+        """
+
+        for name, spec in self.drift.items():
+            scale = 1 + (spec.get("scale", 1.0) - 1) * intensity
+            features[name] = features[name] * scale + (
+                spec.get("shift", 0.0) * intensity
+            )
+
+    def generate(
+        self, n_rows: int, start: int = 0, total_rows: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Gera um bloco de linhas.
+
+        Args:
+            n_rows (int): A quantidade de linhas.
+            start (int, opcional): A posição da primeira linha no arquivo,
+                que define a semente do bloco. Padrão é 0.
+            total_rows (int, opcional): O tamanho do arquivo, usado pelo
+                drift gradual. Padrão é `start + n_rows`.
+
+        Returns:
+            pd.DataFrame: As colunas de `columns_to_use`, com os tipos do
+                schema.
+        """
+
+        total_rows = total_rows or start + n_rows
+        rng = np.random.default_rng(
+            np.random.SeedSequence(self.seed, spawn_key=(start,))
+        )
+        features = self._features(n_rows, rng)
+
+        if self.ramp:
+            intensity = (start + np.arange(n_rows)) / max(total_rows - 1, 1)
+        else:
+            intensity = np.ones(n_rows)
+        self._apply_drift(features, intensity)
+
+        logit = self.intercept + self._logit(features)
+        features[self.target_name] = rng.random(n_rows) < 1 / (
+            1 + np.exp(-logit)
+        )
+
+        df_synthetic = pd.DataFrame(index=pd.RangeIndex(n_rows))
+        for column in self.columns:
+            name = column["name"]
+            values = pd.Series(features[name])
+            missing = np.full(
+                n_rows, column.get("synthetic", {}).get("missing", 0.0)
+            )
+            if "missing" in self.drift.get(name, {}):
+                missing += (self.drift[name]["missing"] - missing) * intensity
+            if column.get("nullable", True) and missing.any():
+                values[rng.random(n_rows) < missing] = np.nan
+            if column["type"] == "int":
+                values = values.round().astype(
+                    "Int64" if column.get("nullable", True) else "int64"
+                )
+            df_synthetic[name] = values
+        return df_synthetic
+
+    def write(self, path: str, n_rows: int) -> int:
+        """
+        Grava um arquivo CSV ou Parquet, conforme a extensão.
+
+        Os blocos são gerados em paralelo e gravados na ordem, com no máximo
+        dois blocos por processo na memória.
+
+        Args:
+            path (str): O arquivo de saída (`.csv` ou `.parquet`).
+            n_rows (int): A quantidade de linhas.
+
+        Returns:
+            int: A quantidade de linhas gravadas.
+        """
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        parquet = path.endswith(".parquet")
+        tasks = (
+            {
+                "generator": self,
+                "n_rows": min(self.chunk_rows, n_rows - start),
+                "start": start,
+                "total_rows": n_rows,
+                "parquet": parquet,
+            }
+            for start in range(0, n_rows, self.chunk_rows)
+        )
+        logger.info(f"Gerando {n_rows} linhas sintéticas em {path}.")
+
+        writer = None
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+            pending = deque()
+            for task in tasks:
+                pending.append(executor.submit(_generate_chunk, task))
+                if len(pending) >= 2 * self.n_jobs:
+                    chunk = pending.popleft().result()
+                    writer = self._write_chunk(path, writer, chunk)
+            while pending:
+                chunk = pending.popleft().result()
+                writer = self._write_chunk(path, writer, chunk)
+        if writer is not None:
+            writer.close()
+
+        logger.info(f"{n_rows} linhas sintéticas gravadas.")
+        return n_rows
+
+    @staticmethod
+    def _write_chunk(
+        path: str, writer: Any, chunk: Union[bytes, pa.Table]
+    ) -> Any:
+        """
+        Acrescenta um bloco serializado ao arquivo de saída.
+
+        Args:
+            path (str): O arquivo de saída.
+            writer: O arquivo aberto, ou None no primeiro bloco.
+            chunk (Union[bytes, pa.Table]): O bloco serializado.
+
+        Returns:
+            O arquivo aberto: um ParquetWriter ou o arquivo CSV.
+        """
+
+        if isinstance(chunk, pa.Table):
+            writer = writer or pq.ParquetWriter(path, chunk.schema)
+            writer.write_table(chunk)
+            return writer
+
+        writer = writer or open(path, "wb")
+        writer.write(chunk)
+        return writer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="O arquivo de saída, CSV ou Parquet.")
+    parser.add_argument(
+        "--rows", type=int, required=True, help="A quantidade de linhas."
+    )
+    parser.add_argument("--seed", type=int, help="A semente principal.")
+    parser.add_argument("--target-rate", type=float, help="A taxa de maus.")
+    parser.add_argument(
+        "--drift",
+        type=json.loads,
+        help='O drift em JSON, como \'{"RendaMensal": {"scale": 0.8}}\'.',
+    )
+    parser.add_argument(
+        "--ramp", action="store_true", help="Torna o drift gradual."
+    )
+    parser.add_argument("--n-jobs", type=int, help="Quantidade de processos.")
+    args = parser.parse_args()
+
+    SyntheticDataGenerator(
+        seed=args.seed,
+        target_rate=args.target_rate,
+        drift=args.drift,
+        ramp=args.ramp,
+        n_jobs=args.n_jobs,
+    ).write(args.path, args.rows)
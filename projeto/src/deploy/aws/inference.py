@@ -1,7 +1,11 @@
-import json
+import os
+import sys
 
-import boto3
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../src"))
+
+import numpy as np
 import pandas as pd
+from deploy.backends import SageMakerBackend
 
 
 class Inference:
@@ -11,7 +15,7 @@ class Inference:
     Attributes:
         app_name (str): O nome do aplicativo SageMaker a ser consultado para inferência.
         region (str): A região AWS onde o aplicativo SageMaker está hospedado.
-        df_test (pd.DataFrame): O DataFrame de teste a ser usado para inferência.
+        backend (SageMakerBackend): O cliente do endpoint, criado uma única vez.
 
     Methods:
         query: Consulta o endpoint SageMaker para obter previsões com base nos dados de entrada.
@@ -19,48 +23,36 @@ class Inference:
 
     def __init__(self) -> None:
         """
-        Inicializa a classe de inferência.
-        Carrega o DataFrame de teste a partir de um arquivo CSV local.
+        Inicializa a classe de inferência e o cliente do endpoint.
         """
 
         self.app_name = "prob-loan-sagemaker"
         self.region = "us-east-1"
-        self.df_test = pd.read_csv("projeto/data/raw/test.csv")
+        self.backend = SageMakerBackend(self.app_name, self.region)
 
-    def query(self, input_json: json) -> json:
+    def query(self, dataframe: pd.DataFrame) -> np.ndarray:
         """
         Consulta o endpoint SageMaker para obter previsões com base nos dados de entrada.
 
+        Os dados são enviados em lotes paralelos, reaproveitando o mesmo cliente.
+
         Args:
-            input_json (json): Dados de entrada em formato JSON a serem enviados para o endpoint SageMaker.
+            dataframe (pd.DataFrame): Os dados de entrada a serem enviados para o endpoint SageMaker.
 
         Returns:
-            json: As previsões retornadas pelo modelo hospedado no SageMaker.
+            np.ndarray: As previsões retornadas pelo modelo hospedado no SageMaker.
         """
 
-        client = boto3.session.Session().client(
-            "sagemaker-runtime", self.region
-        )
-        response = client.invoke_endpoint(
-            EndpointName=self.app_name,
-            Body=input_json,
-            ContentType="application/json",
-        )
-        preds = response["Body"].read().decode("ascii")
-        preds = json.loads(preds)
+        preds = self.backend.predict(dataframe)
         print(f"Resposta recebida: {preds}")
         return preds
 
 
 if __name__ == "__main__":
     inference = Inference()
-    # manipulacao
-    data = {
-        "dataframe_split": inference.df_test.iloc[[0]].to_dict(orient="split")
-    }
-    byte_data = json.dumps(data).encode("utf-8")
+    df_test = pd.read_csv("projeto/data/raw/test.csv", nrows=1)
 
-    output = inference.query(byte_data)
+    output = inference.query(df_test)
 
-    resp = pd.DataFrame([output])
+    resp = pd.DataFrame(output)
     print(resp)
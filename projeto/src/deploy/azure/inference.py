@@ -1,9 +1,10 @@
-import json
+import os
+import sys
 
-import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../src"))
 
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential
+import pandas as pd
+from deploy.backends import AzureBackend
 
 workspace_name = "prob-loan-ws"
 workspace_location = "East US"
@@ -11,19 +12,12 @@ resource_group = "azure-mlops"
 subscription_id = "SUBSCRIPTION_ID"
 endpoint_name = "prob-loan-endpoint"
 
-ml_client = MLClient(
-    DefaultAzureCredential(), subscription_id, resource_group, workspace_name
+backend = AzureBackend(
+    endpoint_name, subscription_id, resource_group, workspace_name
 )
 
-df_test = pd.read_csv("projeto/data/raw/test.csv")
-data = {"input_data": df_test.iloc[[0]].to_dict(orient="split")}
-print(data)
+df_test = pd.read_csv("projeto/data/raw/test.csv", nrows=1)
 
-with open("file.json", "w") as f:
-    json.dump(data, f)
-
-response = ml_client.online_endpoints.invoke(
-    endpoint_name=endpoint_name, request_file="file.json"
-)
+response = backend.predict(df_test)
 
 print(response)
@@ -0,0 +1,426 @@
+import json
+import os
+import random
+import sys
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import requests
+import structlog
+from requests.adapters import HTTPAdapter
+from utils.instrumentation import span
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """
+    Erro transitório do endpoint, que pode ser repetido com segurança.
+    """
+
+
+class InferenceBackend(ABC):
+    """
+    Classe base dos clientes de endpoints de inferência.
+
+    O cliente é criado uma única vez e reaproveita suas conexões. Um
+    DataFrame grande é dividido em lotes de `batch_size` linhas, serializados
+    em memória e enviados em paralelo por um pool de `max_workers` threads.
+    Falhas transitórias são repetidas com backoff exponencial e jitter, e as
+    predições voltam na ordem das linhas de entrada.
+
+    Attributes:
+        batch_size (int): O máximo de linhas por chamada ao endpoint.
+        max_workers (int): O máximo de chamadas simultâneas.
+        max_retries (int): Quantas vezes repetir uma chamada com falha.
+        backoff_seconds (float): A espera base entre as tentativas.
+        timeout_seconds (float): O tempo máximo de cada chamada.
+        payload_key (str): A chave do payload esperada pelo endpoint.
+
+    Methods:
+        predict: Pontua um DataFrame no endpoint.
+        close: Libera as conexões e o pool de threads.
+    """
+
+    payload_key = "dataframe_split"
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        timeout_seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe InferenceBackend.
+
+        Args:
+            batch_size (int, opcional): O máximo de linhas por chamada.
+                Padrão é o `inference_batch_size` do config.yaml.
+            max_workers (int, opcional): O máximo de chamadas simultâneas.
+                Padrão é o `inference_max_workers` do config.yaml.
+            max_retries (int, opcional): Quantas vezes repetir uma chamada.
+                Padrão é o `inference_max_retries` do config.yaml.
+            backoff_seconds (float, opcional): A espera base entre as
+                tentativas. Padrão é o `inference_backoff_seconds` do
+                config.yaml.
+            timeout_seconds (float, opcional): O tempo máximo de cada
+                chamada. Padrão é o `inference_timeout_seconds` do
+                config.yaml.
+        """
+
+        config = load_config_file()
+        self.batch_size = batch_size or config.get("inference_batch_size", 500)
+        self.max_workers = max_workers or config.get(
+            "inference_max_workers", 8
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else config.get("inference_max_retries", 3)
+        )
+        self.backoff_seconds = backoff_seconds or config.get(
+            "inference_backoff_seconds", 0.5
+        )
+        self.timeout_seconds = timeout_seconds or config.get(
+            "inference_timeout_seconds", 60
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    @abstractmethod
+    def _invoke(self, payload: bytes) -> Any:
+        """
+        Envia um payload ao endpoint e retorna a resposta decodificada.
+
+        Deve levantar RetryableError para falhas transitórias.
+
+        Args:
+            payload (bytes): O corpo JSON da chamada.
+
+        Returns:
+            A resposta JSON decodificada.
+        """
+
+    def _serialize(self, dataframe: pd.DataFrame) -> bytes:
+        """
+        Serializa um lote no formato `split` do MLflow, em memória.
+
+        Args:
+            dataframe (pd.DataFrame): O lote.
+
+        Returns:
+            bytes: O corpo JSON da chamada.
+        """
+
+        split = dataframe.to_json(
+            orient="split", index=False, double_precision=15
+        )
+        return f'{{"{self.payload_key}": {split}}}'.encode()
+
+    @staticmethod
+    def _parse(response: Any) -> np.ndarray:
+        """
+        Extrai as predições da resposta do endpoint.
+
+        Args:
+            response: A resposta JSON decodificada.
+
+        Returns:
+            np.ndarray: As predições.
+        """
+
+        if isinstance(response, dict):
+            response = response["predictions"]
+        return np.asarray(response)
+
+    def _invoke_with_retries(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Pontua um lote, repetindo as falhas transitórias com backoff.
+
+        Args:
+            dataframe (pd.DataFrame): O lote.
+
+        Returns:
+            np.ndarray: As predições do lote.
+        """
+
+        payload = self._serialize(dataframe)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._parse(self._invoke(payload))
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = self.backoff_seconds * 2**attempt
+                wait *= random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"Falha transitória ({e}), nova tentativa em {wait:.2f}s."
+                )
+                time.sleep(wait)
+
+    def predict(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Pontua um DataFrame no endpoint.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a serem pontuados.
+
+        Returns:
+            np.ndarray: As predições, na ordem das linhas de entrada.
+        """
+
+        if dataframe.empty:
+            return np.empty((0,))
+
+        batches: List[pd.DataFrame] = [
+            dataframe.iloc[start : start + self.batch_size]
+            for start in range(0, len(dataframe), self.batch_size)
+        ]
+        logger.info(
+            f"Pontuando {len(dataframe)} linhas em {len(batches)} lotes."
+        )
+        return np.concatenate(
+            list(self._executor.map(self._invoke_with_retries, batches))
+        )
+
+    def close(self) -> None:
+        """
+        Libera as conexões e o pool de threads.
+        """
+
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "InferenceBackend":
+        """
+        Permite usar o backend em um bloco `with`.
+        """
+
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """
+        Libera os recursos ao final do bloco `with`.
+        """
+
+        self.close()
+
+
+class LocalBackend(InferenceBackend):
+    """
+    Cliente de um endpoint HTTP compatível com o `/invocations` do MLflow.
+
+    Atende o `mlflow models serve`, o InferenceServer do projeto ou qualquer
+    servidor com o mesmo contrato. Usa uma única sessão HTTP com pool de
+    conexões do tamanho do pool de threads.
+
+    Attributes:
+        endpoint (str): A URL do endpoint.
+        session (requests.Session): A sessão HTTP compartilhada.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = "http://127.0.0.1:5001/invocations",
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Inicializa uma instância da classe LocalBackend.
+
+        Args:
+            endpoint (str, opcional): A URL do endpoint.
+            headers (Dict[str, str], opcional): Cabeçalhos extras das
+                chamadas, como autenticação.
+            **kwargs: Os parâmetros de InferenceBackend.
+        """
+
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.max_workers
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {"Content-Type": "application/json", **(headers or {})}
+        )
+
+    def _invoke(self, payload: bytes) -> Any:
+        """
+        Envia um payload ao endpoint HTTP.
+
+        Args:
+            payload (bytes): O corpo JSON da chamada.
+
+        Returns:
+            A resposta JSON decodificada.
+        """
+
+        with span("LocalBackend.invoke", bytes_out=len(payload)) as current:
+            try:
+                response = self.session.post(
+                    self.endpoint, data=payload, timeout=self.timeout_seconds
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                raise RetryableError(str(e)) from e
+
+            current.bytes_in = len(response.content)
+            current.fields["status"] = response.status_code
+            if response.status_code in RETRYABLE_STATUS:
+                raise RetryableError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            return json.loads(response.content)
+
+    def close(self) -> None:
+        """
+        Libera a sessão HTTP e o pool de threads.
+        """
+
+        super().close()
+        self.session.close()
+
+
+class AzureBackend(LocalBackend):
+    """
+    Cliente de um endpoint online do Azure Machine Learning.
+
+    A URL de pontuação e a chave do endpoint são obtidas uma única vez pelo
+    MLClient, e as chamadas vão direto para a URL com o payload em memória,
+    sem gravar arquivos de requisição.
+    """
+
+    payload_key = "input_data"
+
+    def __init__(
+        self,
+        endpoint_name: str,
+        subscription_id: str,
+        resource_group: str,
+        workspace_name: str,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Inicializa uma instância da classe AzureBackend.
+
+        Args:
+            endpoint_name (str): O nome do endpoint online.
+            subscription_id (str): A assinatura do Azure.
+            resource_group (str): O grupo de recursos.
+            workspace_name (str): O workspace do Azure ML.
+            **kwargs: Os parâmetros de InferenceBackend.
+        """
+
+        from azure.ai.ml import MLClient
+        from azure.identity import DefaultAzureCredential
+
+        ml_client = MLClient(
+            DefaultAzureCredential(),
+            subscription_id,
+            resource_group,
+            workspace_name,
+        )
+        endpoint = ml_client.online_endpoints.get(endpoint_name)
+        key = ml_client.online_endpoints.get_keys(endpoint_name).primary_key
+        super().__init__(
+            endpoint.scoring_uri,
+            headers={"Authorization": f"Bearer {key}"},
+            **kwargs,
+        )
+
+
+class SageMakerBackend(InferenceBackend):
+    """
+    Cliente de um endpoint do Amazon SageMaker.
+
+    Um único cliente `sagemaker-runtime`, seguro entre threads, é criado com
+    um pool de conexões do tamanho do pool de threads. As repetições ficam a
+    cargo do backend, então as do botocore são desligadas.
+
+    Attributes:
+        endpoint_name (str): O nome do endpoint.
+        region (str): A região AWS do endpoint.
+    """
+
+    retryable_codes = {
+        "ThrottlingException",
+        "ServiceUnavailable",
+        "InternalFailure",
+        "ModelNotReadyException",
+    }
+
+    def __init__(
+        self,
+        endpoint_name: str = "prob-loan-sagemaker",
+        region: str = "us-east-1",
+        **kwargs: Any,
+    ) -> None:
+        """
+        Inicializa uma instância da classe SageMakerBackend.
+
+        Args:
+            endpoint_name (str, opcional): O nome do endpoint.
+            region (str, opcional): A região AWS do endpoint.
+            **kwargs: Os parâmetros de InferenceBackend.
+        """
+
+        import boto3
+        from botocore.config import Config
+
+        super().__init__(**kwargs)
+        self.endpoint_name = endpoint_name
+        self.region = region
+        self._client = boto3.session.Session().client(
+            "sagemaker-runtime",
+            region,
+            config=Config(
+                max_pool_connections=self.max_workers,
+                read_timeout=self.timeout_seconds,
+                retries={"max_attempts": 0},
+            ),
+        )
+
+    def _invoke(self, payload: bytes) -> Any:
+        """
+        Envia um payload ao endpoint do SageMaker.
+
+        Args:
+            payload (bytes): O corpo JSON da chamada.
+
+        Returns:
+            A resposta JSON decodificada.
+        """
+
+        from botocore.exceptions import (
+            ClientError,
+            ConnectionError,
+            ReadTimeoutError,
+        )
+
+        try:
+            response = self._client.invoke_endpoint(
+                EndpointName=self.endpoint_name,
+                Body=payload,
+                ContentType="application/json",
+            )
+        except (ConnectionError, ReadTimeoutError) as e:
+            raise RetryableError(str(e)) from e
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            status = e.response.get("ResponseMetadata", {}).get(
+                "HTTPStatusCode", 0
+            )
+            if error.get("Code") in self.retryable_codes or status >= 500:
+                raise RetryableError(error.get("Message", str(e))) from e
+            raise
+        return json.loads(response["Body"].read())
@@ -5,8 +5,10 @@ from typing import Any, List
 import numpy as np
 import pandas as pd
 import structlog
+from evaluation.fast_metrics import FastEvaluation
 from sklearn.metrics import roc_auc_score
 from sklearn.model_selection import StratifiedKFold, cross_val_score
+from utils.instrumentation import instrument
 from utils.utils import load_config_file
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
@@ -30,6 +32,7 @@ class ModelEvaluation:
         cross_val_evaluate: Avalia as predições do modelo usando a métrica AUC-ROC.
         evaluate_predictions: Avalia as predições do modelo usando a métrica AUC-ROC.
         roc_auc_scorer: Calcula a métrica AUC-ROC para o modelo dado os dados de entrada e saída.
+        evaluate_with_intervals: Calcula AUC, KS, Gini e Brier com intervalos de confiança.
 
     """
 
@@ -51,6 +54,7 @@ class ModelEvaluation:
         self.y = y
         self.n_splits = n_splits
 
+    @instrument()
     def cross_val_evaluate(self) -> List[float]:
         """
         Realiza a validação cruzada do modelo.
@@ -92,6 +96,7 @@ class ModelEvaluation:
         return roc_auc_score(y, y_pred)
 
     @staticmethod
+    @instrument()
     def evaluate_predictions(
         y_true: pd.DataFrame, y_pred_proba: pd.DataFrame
     ) -> float:
@@ -108,3 +113,24 @@ class ModelEvaluation:
 
         logger.info("Iniciou a validação do modelo.")
         return roc_auc_score(y_true, y_pred_proba)
+
+    @staticmethod
+    @instrument()
+    def evaluate_with_intervals(
+        y_true: pd.DataFrame, y_pred_proba: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Calcula AUC, KS, Gini e Brier com intervalos de confiança por bootstrap.
+
+        Args:
+            y_true (pd.DataFrame): O array contendo os rótulos alvo verdadeiros.
+            y_pred_proba (pd.DataFrame): O array contendo as probabilidades preditas para as classes positivas.
+
+        Returns:
+            pd.DataFrame: A estimativa e os limites do intervalo de cada métrica.
+        """
+
+        logger.info("Iniciou o bootstrap das métricas.")
+        return FastEvaluation().bootstrap(
+            np.ravel(y_true), np.ravel(y_pred_proba)
+        )
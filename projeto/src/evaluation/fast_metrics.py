@@ -0,0 +1,283 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import mlflow
+import numpy as np
+import pandas as pd
+import structlog
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+METRICS = ("auc", "ks", "gini", "brier")
+
+# dados ordenados compartilhados com os processos do pool
+_RANKED: Dict[str, np.ndarray] = {}
+
+
+def rank(y_true: np.ndarray, y_score: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Ordena as predições uma única vez e agrupa os empates.
+
+    Args:
+        y_true (np.ndarray): Os rótulos 0/1.
+        y_score (np.ndarray): As probabilidades preditas.
+
+    Returns:
+        Dict[str, np.ndarray]: Os rótulos e as probabilidades ordenados por
+            probabilidade e o início de cada grupo de empates.
+    """
+
+    y_true = np.asarray(y_true, dtype="float64")
+    y_score = np.asarray(y_score, dtype="float64")
+    order = np.argsort(y_score, kind="mergesort")
+    y_true, y_score = y_true[order], y_score[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(y_score) != 0])
+    return {"y_true": y_true, "y_score": y_score, "starts": starts}
+
+
+def weighted_metrics(
+    ranked: Dict[str, np.ndarray], weights: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula AUC, KS, Gini e Brier para vários pesos de uma vez.
+
+    Cada linha de `weights` é uma réplica (os pesos de cada observação).
+    Com as observações já ordenadas, as contagens ponderadas de positivos e
+    negativos por grupo de empate dão a AUC (Mann-Whitney, com meio ponto
+    para empates) e o KS pelas somas acumuladas, sem reordenar.
+
+    Args:
+        ranked (Dict[str, np.ndarray]): O resultado de `rank`.
+        weights (np.ndarray): Os pesos, com forma (réplicas, observações).
+
+    Returns:
+        Dict[str, np.ndarray]: Cada métrica, uma posição por réplica.
+    """
+
+    y_true, y_score = ranked["y_true"], ranked["y_score"]
+    pos = np.add.reduceat(weights * y_true, ranked["starts"], axis=1)
+    neg = np.add.reduceat(weights, ranked["starts"], axis=1) - pos
+    n_pos = pos.sum(axis=1)
+    n_neg = neg.sum(axis=1)
+
+    neg_below = np.cumsum(neg, axis=1) - neg
+    auc = (pos * (neg_below + 0.5 * neg)).sum(axis=1) / (n_pos * n_neg)
+
+    ks = np.max(
+        np.abs(
+            np.cumsum(pos, axis=1) / n_pos[:, None]
+            - np.cumsum(neg, axis=1) / n_neg[:, None]
+        ),
+        axis=1,
+    )
+    brier = weights @ (y_score - y_true) ** 2 / weights.sum(axis=1)
+    return {"auc": auc, "ks": ks, "gini": 2 * auc - 1, "brier": brier}
+
+
+def _init_worker(ranked: Dict[str, np.ndarray]) -> None:
+    """
+    Recebe os dados ordenados no processo do pool.
+
+    Args:
+        ranked (Dict[str, np.ndarray]): O resultado de `rank`.
+    """
+
+    _RANKED.update(ranked)
+
+
+def _bootstrap_chunk(task: Tuple[int, np.random.SeedSequence]) -> np.ndarray:
+    """
+    Calcula um bloco de réplicas bootstrap.
+
+    Os pesos de cada réplica seguem uma multinomial (n, 1/n), equivalente a
+    reamostrar as observações com reposição.
+
+    Args:
+        task (Tuple[int, np.random.SeedSequence]): A quantidade de réplicas
+            do bloco e a semente.
+
+    Returns:
+        np.ndarray: As métricas, com forma (réplicas, métricas).
+    """
+
+    n_replicates, seed = task
+    n = _RANKED["y_true"].size
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(n, np.full(n, 1 / n), size=n_replicates).astype(
+        "float64"
+    )
+    metrics = weighted_metrics(_RANKED, weights)
+    return np.column_stack([metrics[name] for name in METRICS])
+
+
+class FastEvaluation:
+    """
+    Classe para avaliar probabilidades com intervalos de confiança.
+
+    As predições são ordenadas uma única vez. As réplicas bootstrap são
+    pesos multinomiais aplicados às observações já ordenadas, então milhares
+    de réplicas são calculadas como operações matriciais, sem reordenar nem
+    chamar o sklearn em laço. As réplicas são divididas em blocos que cabem
+    em `memory_mb` e distribuídas entre processos.
+
+    Attributes:
+        n_bootstrap (int): A quantidade de réplicas.
+        alpha (float): O nível de significância dos intervalos.
+        memory_mb (int): A memória máxima de cada bloco de réplicas.
+        n_jobs (int): A quantidade de processos.
+        random_state (int): A semente das réplicas.
+
+    Methods:
+        metrics: Calcula AUC, KS, Gini e Brier.
+        bootstrap: Calcula as métricas e seus intervalos de confiança.
+        log_to_mlflow: Registra as métricas e os intervalos no MLflow.
+    """
+
+    def __init__(
+        self,
+        n_bootstrap: Optional[int] = None,
+        alpha: Optional[float] = None,
+        memory_mb: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        random_state: Optional[int] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe FastEvaluation.
+
+        Args:
+            n_bootstrap (int, opcional): A quantidade de réplicas. Padrão é
+                o `bootstrap_replicates` do config.yaml.
+            alpha (float, opcional): O nível de significância. Padrão é o
+                `bootstrap_alpha` do config.yaml.
+            memory_mb (int, opcional): A memória de cada bloco. Padrão é o
+                `bootstrap_memory_mb` do config.yaml.
+            n_jobs (int, opcional): A quantidade de processos. Padrão é o
+                `bootstrap_n_jobs` do config.yaml ou a quantidade de CPUs.
+            random_state (int, opcional): A semente. Padrão é o
+                `random_state` do config.yaml.
+        """
+
+        config = load_config_file()
+        self.n_bootstrap = n_bootstrap or config.get(
+            "bootstrap_replicates", 2000
+        )
+        self.alpha = alpha or config.get("bootstrap_alpha", 0.05)
+        self.memory_mb = memory_mb or config.get("bootstrap_memory_mb", 256)
+        self.n_jobs = (
+            n_jobs or config.get("bootstrap_n_jobs") or os.cpu_count()
+        )
+        self.random_state = (
+            random_state
+            if random_state is not None
+            else config.get("random_state")
+        )
+
+    def metrics(
+        self, y_true: np.ndarray, y_score: np.ndarray
+    ) -> Dict[str, float]:
+        """
+        Calcula AUC, KS, Gini e Brier.
+
+        Args:
+            y_true (np.ndarray): Os rótulos 0/1.
+            y_score (np.ndarray): As probabilidades preditas.
+
+        Returns:
+            Dict[str, float]: O valor de cada métrica.
+        """
+
+        ranked = rank(y_true, y_score)
+        weights = np.ones((1, ranked["y_true"].size))
+        return {
+            name: float(values[0])
+            for name, values in weighted_metrics(ranked, weights).items()
+        }
+
+    def _chunk_size(self, n: int) -> int:
+        """
+        Calcula quantas réplicas cabem em um bloco.
+
+        Cada réplica ocupa cerca de seis vetores float64 do tamanho da
+        amostra (pesos, contagens por grupo e somas acumuladas).
+
+        Args:
+            n (int): O tamanho da amostra.
+
+        Returns:
+            int: A quantidade de réplicas por bloco.
+        """
+
+        return max(1, int(self.memory_mb * 1024**2 // (6 * 8 * n)))
+
+    def bootstrap(
+        self, y_true: np.ndarray, y_score: np.ndarray
+    ) -> pd.DataFrame:
+        """
+        Calcula as métricas e seus intervalos de confiança por bootstrap.
+
+        Args:
+            y_true (np.ndarray): Os rótulos 0/1.
+            y_score (np.ndarray): As probabilidades preditas.
+
+        Returns:
+            pd.DataFrame: A estimativa, o limite inferior, o limite superior
+                e o erro padrão de cada métrica.
+        """
+
+        ranked = rank(y_true, y_score)
+        n = ranked["y_true"].size
+        chunk = self._chunk_size(n)
+        sizes = [
+            min(chunk, self.n_bootstrap - start)
+            for start in range(0, self.n_bootstrap, chunk)
+        ]
+        seeds = np.random.SeedSequence(self.random_state).spawn(len(sizes))
+        logger.info(
+            f"Bootstrap: {self.n_bootstrap} réplicas de {n} observações em "
+            f"{len(sizes)} blocos."
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=min(self.n_jobs, len(sizes)),
+            initializer=_init_worker,
+            initargs=(ranked,),
+        ) as executor:
+            replicates = np.vstack(
+                list(executor.map(_bootstrap_chunk, zip(sizes, seeds)))
+            )
+
+        point = weighted_metrics(ranked, np.ones((1, n)))
+        low, high = np.nanquantile(
+            replicates, [self.alpha / 2, 1 - self.alpha / 2], axis=0
+        )
+        return pd.DataFrame(
+            {
+                "estimate": [float(point[name][0]) for name in METRICS],
+                "ci_low": low,
+                "ci_high": high,
+                "std_error": np.nanstd(replicates, axis=0, ddof=1),
+            },
+            index=pd.Index(METRICS, name="metric"),
+        )
+
+    @staticmethod
+    def log_to_mlflow(df_metrics: pd.DataFrame, prefix: str = "valid") -> None:
+        """
+        Registra as métricas e os intervalos no run ativo do MLflow.
+
+        Args:
+            df_metrics (pd.DataFrame): O resultado de `bootstrap`.
+            prefix (str, opcional): O prefixo das métricas. Padrão é 'valid'.
+        """
+
+        metrics = {}
+        for metric, row in df_metrics.iterrows():
+            metrics[f"{prefix}_{metric}"] = row["estimate"]
+            metrics[f"{prefix}_{metric}_ci_low"] = row["ci_low"]
+            metrics[f"{prefix}_{metric}_ci_high"] = row["ci_high"]
+        mlflow.log_metrics(metrics)
@@ -0,0 +1,331 @@
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import mlflow
+import numpy as np
+import pandas as pd
+import structlog
+from evaluation.fast_metrics import rank, weighted_metrics
+from sklearn.pipeline import Pipeline
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+# dados compartilhados com os processos do pool
+_DATA: Dict[str, Any] = {}
+
+
+def _auc(y_true: np.ndarray, y_score: np.ndarray) -> float:
+    """
+    Calcula a AUC com a ordenação única do `fast_metrics`.
+
+    Args:
+        y_true (np.ndarray): Os rótulos 0/1.
+        y_score (np.ndarray): As probabilidades preditas.
+
+    Returns:
+        float: A AUC.
+    """
+
+    ranked = rank(y_true, y_score)
+    weights = np.ones((1, ranked["y_true"].size))
+    return float(weighted_metrics(ranked, weights)["auc"][0])
+
+
+def separable_columns(
+    preprocess: Pipeline,
+    X: pd.DataFrame,
+    sample_rows: int = 500,
+    random_state: Optional[int] = None,
+) -> List[str]:
+    """
+    Identifica as variáveis em que o pré-processamento é separável.
+
+    Uma variável é separável quando embaralhar a coluna bruta e depois
+    pré-processar dá o mesmo resultado que embaralhar a coluna já
+    pré-processada de mesmo nome, sem alterar as demais. É o caso de
+    imputadores, discretizadores e escaladores que tratam cada coluna
+    isoladamente. A verificação é feita em uma amostra, com uma transformação
+    por variável.
+
+    Args:
+        preprocess (Pipeline): O pré-processamento já treinado.
+        X (pd.DataFrame): Os dados brutos.
+        sample_rows (int, opcional): O tamanho da amostra. Padrão é 500.
+        random_state (int, opcional): A semente da amostra.
+
+    Returns:
+        List[str]: As variáveis separáveis.
+    """
+
+    rng = np.random.default_rng(random_state)
+    sample = X.iloc[
+        rng.choice(len(X), min(sample_rows, len(X)), replace=False)
+    ].reset_index(drop=True)
+    processed = preprocess.transform(sample)
+    perm = rng.permutation(len(sample))
+
+    separable = []
+    for feature in X.columns.intersection(processed.columns):
+        permuted = sample.copy()
+        permuted[feature] = sample[feature].to_numpy()[perm]
+        expected = processed.copy()
+        expected[feature] = processed[feature].to_numpy()[perm]
+        result = preprocess.transform(permuted)
+        if list(result.columns) == list(expected.columns) and np.allclose(
+            result.to_numpy(dtype="float64"),
+            expected.to_numpy(dtype="float64"),
+            equal_nan=True,
+        ):
+            separable.append(feature)
+    return separable
+
+
+def _init_worker(data: Dict[str, Any]) -> None:
+    """
+    Recebe os dados e o modelo no processo do pool.
+
+    Args:
+        data (Dict[str, Any]): O modelo, o pipeline, os dados brutos e
+            pré-processados e o alvo.
+    """
+
+    _DATA.update(data)
+
+
+def _permuted_aucs(
+    task: Tuple[str, int, np.random.SeedSequence],
+) -> Tuple[str, np.ndarray]:
+    """
+    Calcula a AUC de um bloco de repetições com uma variável embaralhada.
+
+    As repetições são empilhadas em uma única matriz e preditas em uma só
+    chamada. Nas variáveis separáveis, embaralha-se a coluna da matriz
+    pré-processada e só o modelo é executado; nas demais, embaralha-se a
+    coluna bruta e o pipeline inteiro é executado.
+
+    Args:
+        task (Tuple[str, int, np.random.SeedSequence]): A variável, a
+            quantidade de repetições do bloco e a semente.
+
+    Returns:
+        Tuple[str, np.ndarray]: A variável e a AUC de cada repetição.
+    """
+
+    feature, n_repeats, seed = task
+    y_true = _DATA["y_true"]
+    n = y_true.size
+    rng = np.random.default_rng(seed)
+    perms = np.stack([rng.permutation(n) for _ in range(n_repeats)])
+
+    if feature in _DATA["separable"]:
+        processed = _DATA["processed"]
+        j = _DATA["columns"].index(feature)
+        stacked = np.tile(processed, (n_repeats, 1))
+        stacked[:, j] = processed[perms, j].ravel()
+        y_score = _DATA["model"].predict_proba(
+            pd.DataFrame(stacked, columns=_DATA["columns"], copy=False)
+        )[:, 1]
+    else:
+        X = _DATA["X"]
+        values = X[feature].to_numpy()
+        stacked = pd.concat(
+            [X.assign(**{feature: values[perm]}) for perm in perms],
+            ignore_index=True,
+        )
+        y_score = _DATA["pipe"].predict_proba(stacked)[:, 1]
+
+    y_score = y_score.reshape(n_repeats, n)
+    return feature, np.array([_auc(y_true, score) for score in y_score])
+
+
+class PermutationImportance:
+    """
+    Classe para calcular a importância das variáveis por permutação.
+
+    A importância de uma variável é a queda da AUC quando a coluna é
+    embaralhada. O pré-processamento é executado uma única vez: nas
+    variáveis em que ele é separável (`separable_columns`), embaralha-se a
+    coluna já pré-processada e apenas o modelo é executado de novo. As
+    repetições são empilhadas em matrizes que cabem em `memory_mb`, e os
+    blocos de variáveis e repetições são distribuídos entre processos. O
+    intervalo de confiança são os quantis das quedas entre as repetições.
+
+    Attributes:
+        n_repeats (int): A quantidade de repetições por variável.
+        alpha (float): O nível de significância dos intervalos.
+        memory_mb (int): A memória máxima de cada bloco de repetições.
+        n_jobs (int): A quantidade de processos.
+        random_state (int): A semente das permutações.
+
+    Methods:
+        run: Calcula a importância de cada variável.
+        log_to_mlflow: Registra as importâncias e os intervalos no MLflow.
+    """
+
+    def __init__(
+        self,
+        n_repeats: Optional[int] = None,
+        alpha: Optional[float] = None,
+        memory_mb: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        random_state: Optional[int] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe PermutationImportance.
+
+        Args:
+            n_repeats (int, opcional): A quantidade de repetições. Padrão é
+                o `importance_repeats` do config.yaml.
+            alpha (float, opcional): O nível de significância. Padrão é o
+                `importance_alpha` do config.yaml.
+            memory_mb (int, opcional): A memória de cada bloco. Padrão é o
+                `importance_memory_mb` do config.yaml.
+            n_jobs (int, opcional): A quantidade de processos. Padrão é o
+                `importance_n_jobs` do config.yaml ou a quantidade de CPUs.
+            random_state (int, opcional): A semente. Padrão é o
+                `random_state` do config.yaml.
+        """
+
+        config = load_config_file()
+        self.n_repeats = n_repeats or config.get("importance_repeats", 20)
+        self.alpha = alpha or config.get("importance_alpha", 0.05)
+        self.memory_mb = memory_mb or config.get("importance_memory_mb", 256)
+        self.n_jobs = (
+            n_jobs or config.get("importance_n_jobs") or os.cpu_count()
+        )
+        self.random_state = (
+            random_state
+            if random_state is not None
+            else config.get("random_state")
+        )
+
+    def _chunk_size(self, shape: Tuple[int, int]) -> int:
+        """
+        Calcula quantas repetições cabem em um bloco.
+
+        Cada repetição ocupa a matriz pré-processada empilhada e a cópia que
+        o modelo pode fazer ao validar a entrada, em float64.
+
+        Args:
+            shape (Tuple[int, int]): A forma da matriz pré-processada.
+
+        Returns:
+            int: A quantidade de repetições por bloco.
+        """
+
+        n, p = shape
+        return max(1, int(self.memory_mb * 1024**2 // (2 * 8 * n * p)))
+
+    def run(
+        self, pipe: Pipeline, X: pd.DataFrame, y: pd.Series
+    ) -> pd.DataFrame:
+        """
+        Calcula a importância de cada variável.
+
+        Args:
+            pipe (Pipeline): O pipeline treinado, com o modelo na última
+                etapa.
+            X (pd.DataFrame): Os dados brutos de avaliação.
+            y (pd.Series): O alvo de avaliação.
+
+        Returns:
+            pd.DataFrame: A queda média da AUC, o limite inferior, o limite
+                superior e o desvio padrão entre as repetições de cada
+                variável, e se a permutação usou a matriz pré-processada.
+        """
+
+        X = X.reset_index(drop=True)
+        y_true = np.asarray(y, dtype="float64")
+        preprocess, model = pipe[:-1], pipe[-1]
+        processed = preprocess.transform(X)
+        separable = separable_columns(
+            preprocess, X, random_state=self.random_state
+        )
+        baseline = _auc(y_true, model.predict_proba(processed)[:, 1])
+
+        chunk = self._chunk_size(processed.shape)
+        sizes = [
+            min(chunk, self.n_repeats - start)
+            for start in range(0, self.n_repeats, chunk)
+        ]
+        features = list(X.columns)
+        seeds = np.random.SeedSequence(self.random_state).spawn(
+            len(features) * len(sizes)
+        )
+        tasks = [
+            (feature, size, seeds[i * len(sizes) + k])
+            for i, feature in enumerate(features)
+            for k, size in enumerate(sizes)
+        ]
+        logger.info(
+            f"Importância por permutação: {len(features)} variáveis "
+            f"({len(separable)} sobre a matriz pré-processada), "
+            f"{self.n_repeats} repetições em {len(tasks)} blocos."
+        )
+
+        data = {
+            "model": model,
+            "pipe": pipe,
+            "X": X,
+            "processed": processed.to_numpy(dtype="float64"),
+            "columns": list(processed.columns),
+            "separable": separable,
+            "y_true": y_true,
+        }
+        with ProcessPoolExecutor(
+            max_workers=min(self.n_jobs, len(tasks)),
+            initializer=_init_worker,
+            initargs=(data,),
+        ) as executor:
+            aucs: Dict[str, List[np.ndarray]] = {}
+            for feature, values in executor.map(_permuted_aucs, tasks):
+                aucs.setdefault(feature, []).append(values)
+
+        drops = np.vstack(
+            [baseline - np.concatenate(aucs[feature]) for feature in features]
+        )
+        low, high = np.quantile(
+            drops, [self.alpha / 2, 1 - self.alpha / 2], axis=1
+        )
+        return pd.DataFrame(
+            {
+                "importance": drops.mean(axis=1),
+                "ci_low": low,
+                "ci_high": high,
+                "std": drops.std(axis=1, ddof=1) if self.n_repeats > 1 else 0,
+                "separable": [feature in separable for feature in features],
+            },
+            index=pd.Index(features, name="feature"),
+        ).sort_values("importance", ascending=False)
+
+    @staticmethod
+    def log_to_mlflow(
+        df_importance: pd.DataFrame, prefix: str = "importance"
+    ) -> None:
+        """
+        Registra as importâncias e os intervalos no run ativo do MLflow, como
+        métricas e como a tabela `permutation_importance.csv`.
+
+        Args:
+            df_importance (pd.DataFrame): O resultado de `run`.
+            prefix (str, opcional): O prefixo das métricas. Padrão é
+                'importance'.
+        """
+
+        metrics = {}
+        for feature, row in df_importance.iterrows():
+            metrics[f"{prefix}_{feature}"] = row["importance"]
+            metrics[f"{prefix}_{feature}_ci_low"] = row["ci_low"]
+            metrics[f"{prefix}_{feature}_ci_high"] = row["ci_high"]
+        mlflow.log_metrics(metrics)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "permutation_importance.csv")
+            df_importance.to_csv(path)
+            mlflow.log_artifact(path)
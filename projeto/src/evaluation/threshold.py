@@ -0,0 +1,467 @@
+import json
+import os
+import sys
+from typing import Any, Dict, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import mlflow
+import numpy as np
+import pandas as pd
+import structlog
+from evaluation.fast_metrics import rank
+from utils.artifact_cache import ArtifactCache
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+OUTCOMES = ("approved_good", "approved_bad", "rejected_good", "rejected_bad")
+
+
+def _costs(costs: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """
+    Resolve a matriz de custos, completando os desfechos ausentes com 0.
+
+    Args:
+        costs (Dict[str, float], opcional): O custo de cada desfecho. Padrão
+            é o `threshold_costs` do config.yaml.
+
+    Returns:
+        Dict[str, float]: O custo dos quatro desfechos.
+
+    Raises:
+        ValueError: Se houver um desfecho desconhecido.
+    """
+
+    costs = costs or load_config_file().get("threshold_costs") or {}
+    unknown = set(costs) - set(OUTCOMES)
+    if unknown:
+        raise ValueError(f"Desfechos desconhecidos na matriz: {unknown}")
+    return {outcome: float(costs.get(outcome, 0)) for outcome in OUTCOMES}
+
+
+def threshold_curve(
+    ranked: Dict[str, np.ndarray], costs: Dict[str, float]
+) -> pd.DataFrame:
+    """
+    Avalia todos os pontos de corte possíveis de uma vez.
+
+    A regra é aprovar quem tem probabilidade de default abaixo do corte.
+    Com as predições ordenadas, aprovar até o grupo de empate k é aprovar
+    as k primeiras posições, então as somas acumuladas de bons e maus por
+    grupo dão a matriz de confusão de cada corte sem nova ordenação. Há um
+    corte por valor distinto de probabilidade, mais um que aprova todos.
+
+    Args:
+        ranked (Dict[str, np.ndarray]): O resultado de `rank`.
+        costs (Dict[str, float]): O custo de cada desfecho.
+
+    Returns:
+        pd.DataFrame: O corte, a taxa de aprovação, a taxa de maus entre os
+            aprovados, as contagens de cada desfecho e a perda esperada por
+            proponente de cada corte.
+    """
+
+    y_true, y_score = ranked["y_true"], ranked["y_score"]
+    starts = ranked["starts"]
+    n = y_true.size
+    bad = np.add.reduceat(y_true, starts)
+    total = np.diff(np.r_[starts, n])
+
+    approved = np.r_[0, np.cumsum(total)]
+    approved_bad = np.r_[0, np.cumsum(bad)]
+    approved_good = approved - approved_bad
+    rejected_bad = approved_bad[-1] - approved_bad
+    rejected_good = approved_good[-1] - approved_good
+
+    expected_loss = (
+        costs["approved_good"] * approved_good
+        + costs["approved_bad"] * approved_bad
+        + costs["rejected_good"] * rejected_good
+        + costs["rejected_bad"] * rejected_bad
+    ) / n
+    return pd.DataFrame(
+        {
+            "threshold": np.r_[
+                y_score[starts], np.nextafter(y_score[-1], np.inf)
+            ],
+            "approval_rate": approved / n,
+            "bad_rate": np.divide(
+                approved_bad,
+                approved,
+                out=np.full(approved.size, np.nan),
+                where=approved > 0,
+            ),
+            "approved_good": approved_good,
+            "approved_bad": approved_bad,
+            "rejected_good": rejected_good,
+            "rejected_bad": rejected_bad,
+            "expected_loss": expected_loss,
+        }
+    )
+
+
+def best_threshold(
+    df_curve: pd.DataFrame,
+    min_approval_rate: Optional[float] = None,
+    max_approval_rate: Optional[float] = None,
+) -> pd.Series:
+    """
+    Escolhe o corte de menor perda esperada que respeita as restrições.
+
+    Args:
+        df_curve (pd.DataFrame): O resultado de `threshold_curve`.
+        min_approval_rate (float, opcional): A menor taxa de aprovação aceita.
+        max_approval_rate (float, opcional): A maior taxa de aprovação aceita.
+
+    Returns:
+        pd.Series: A linha da curva do corte escolhido.
+
+    Raises:
+        ValueError: Se nenhum corte respeitar as restrições.
+    """
+
+    rates = df_curve["approval_rate"]
+    feasible = rates.between(
+        min_approval_rate if min_approval_rate is not None else 0,
+        max_approval_rate if max_approval_rate is not None else 1,
+    )
+    if not feasible.any():
+        raise ValueError(
+            f"Nenhum corte com taxa de aprovação entre {min_approval_rate} e "
+            f"{max_approval_rate}."
+        )
+    return df_curve.loc[df_curve["expected_loss"].where(feasible).idxmin()]
+
+
+class DecisionThreshold:
+    """
+    Classe do ponto de corte de aprovação do modelo.
+
+    O corte é escolhido pela menor perda esperada sob uma matriz de custos
+    dos quatro desfechos (aprovar um bom, aprovar um mau, recusar um bom,
+    recusar um mau), respeitando uma faixa de taxa de aprovação. As
+    predições são ordenadas uma única vez e todos os cortes são avaliados
+    por somas acumuladas (`threshold_curve`), em O(n log n), sem chamar as
+    métricas do sklearn em laço.
+
+    Com uma variável de segmento, cada segmento recebe seu próprio corte,
+    com as restrições de aprovação aplicadas dentro do segmento. Segmentos
+    com menos de `min_segment_size` linhas, e os que aparecerem só na
+    predição, usam o corte geral. O corte é gravado em JSON junto ao modelo
+    registrado, como o perfil de referência.
+
+    Attributes:
+        threshold (float): O corte geral; aprova quem tem probabilidade de
+            default abaixo dele.
+        segment_column (str): A variável de segmento, se houver.
+        segment_thresholds (Dict[str, float]): O corte de cada segmento.
+        costs (Dict[str, float]): A matriz de custos usada.
+        constraints (Dict[str, Optional[float]]): As restrições de aprovação.
+        summary (Dict[str, float]): A taxa de aprovação, a taxa de maus e a
+            perda esperada do corte no conjunto de otimização.
+
+    Methods:
+        optimize: Escolhe os cortes a partir de rótulos e probabilidades.
+        decide: Aplica os cortes a novas probabilidades.
+        log_to_mlflow: Registra o corte e o resumo no run ativo do MLflow.
+        save: Grava os cortes em JSON.
+        load: Carrega os cortes de um arquivo JSON.
+        load_from_registry: Carrega os cortes de uma versão registrada.
+        load_latest: Carrega os cortes da versão do alias 'modelo' ou, sem
+            registro, os locais.
+    """
+
+    artifact_name = "decision_threshold.json"
+
+    def __init__(
+        self,
+        threshold: float,
+        segment_column: Optional[str] = None,
+        segment_thresholds: Optional[Dict[str, float]] = None,
+        costs: Optional[Dict[str, float]] = None,
+        constraints: Optional[Dict[str, Optional[float]]] = None,
+        summary: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe DecisionThreshold.
+
+        Args:
+            threshold (float): O corte geral.
+            segment_column (str, opcional): A variável de segmento.
+            segment_thresholds (Dict[str, float], opcional): O corte de cada
+                segmento.
+            costs (Dict[str, float], opcional): A matriz de custos usada.
+            constraints (Dict[str, Optional[float]], opcional): As
+                restrições de aprovação usadas.
+            summary (Dict[str, float], opcional): O resumo do corte geral.
+        """
+
+        self.threshold = threshold
+        self.segment_column = segment_column
+        self.segment_thresholds = segment_thresholds or {}
+        self.costs = costs or {}
+        self.constraints = constraints or {}
+        self.summary = summary or {}
+
+    @classmethod
+    def optimize(
+        cls,
+        y_true: np.ndarray,
+        y_score: np.ndarray,
+        segments: Optional[pd.Series] = None,
+        costs: Optional[Dict[str, float]] = None,
+        min_approval_rate: Optional[float] = None,
+        max_approval_rate: Optional[float] = None,
+        min_segment_size: Optional[int] = None,
+    ) -> "DecisionThreshold":
+        """
+        Escolhe os cortes de menor perda esperada.
+
+        Args:
+            y_true (np.ndarray): Os rótulos 0/1 (1 é default).
+            y_score (np.ndarray): As probabilidades de default.
+            segments (pd.Series, opcional): O segmento de cada linha. O nome
+                da Series é gravado como a variável de segmento.
+            costs (Dict[str, float], opcional): O custo de cada desfecho.
+                Padrão é o `threshold_costs` do config.yaml.
+            min_approval_rate (float, opcional): A menor taxa de aprovação.
+                Padrão é o `threshold_min_approval_rate` do config.yaml.
+            max_approval_rate (float, opcional): A maior taxa de aprovação.
+                Padrão é o `threshold_max_approval_rate` do config.yaml.
+            min_segment_size (int, opcional): O tamanho mínimo de um
+                segmento com corte próprio. Padrão é o
+                `threshold_min_segment_size` do config.yaml.
+
+        Returns:
+            DecisionThreshold: Os cortes escolhidos.
+
+        Raises:
+            ValueError: Se nenhum corte respeitar as restrições.
+        """
+
+        config = load_config_file()
+        costs = _costs(costs)
+        constraints = {
+            "min_approval_rate": (
+                min_approval_rate
+                if min_approval_rate is not None
+                else config.get("threshold_min_approval_rate")
+            ),
+            "max_approval_rate": (
+                max_approval_rate
+                if max_approval_rate is not None
+                else config.get("threshold_max_approval_rate")
+            ),
+        }
+        min_segment_size = min_segment_size or config.get(
+            "threshold_min_segment_size", 1000
+        )
+
+        ranked = rank(y_true, y_score)
+        best = best_threshold(threshold_curve(ranked, costs), **constraints)
+        summary = {
+            "approval_rate": float(best["approval_rate"]),
+            "bad_rate": float(best["bad_rate"]),
+            "expected_loss": float(best["expected_loss"]),
+        }
+
+        segment_thresholds = {}
+        if segments is not None:
+            order = np.argsort(
+                np.asarray(y_score, dtype="float64"), kind="mergesort"
+            )
+            labels = pd.Series(segments).astype(str).to_numpy()[order]
+            # os subconjuntos já estão ordenados, então o `rank` de cada
+            # segmento não reordena de fato (o mergesort é linear nesse caso)
+            for label in np.unique(labels):
+                mask = labels == label
+                if mask.sum() < min_segment_size:
+                    continue
+                segment_ranked = rank(
+                    ranked["y_true"][mask], ranked["y_score"][mask]
+                )
+                try:
+                    segment_best = best_threshold(
+                        threshold_curve(segment_ranked, costs), **constraints
+                    )
+                except ValueError:
+                    logger.warning(
+                        f"Segmento {label} sem corte viável, usando o geral."
+                    )
+                    continue
+                segment_thresholds[label] = float(segment_best["threshold"])
+
+        logger.info(
+            f"Corte escolhido: {best['threshold']:.4f}, aprovação "
+            f"{summary['approval_rate']:.1%}, maus entre os aprovados "
+            f"{summary['bad_rate']:.1%}, perda esperada "
+            f"{summary['expected_loss']:.4f}; {len(segment_thresholds)} "
+            "segmentos com corte próprio."
+        )
+        return cls(
+            float(best["threshold"]),
+            getattr(segments, "name", None),
+            segment_thresholds,
+            costs,
+            constraints,
+            summary,
+        )
+
+    def decide(
+        self, y_score: np.ndarray, segments: Optional[pd.Series] = None
+    ) -> np.ndarray:
+        """
+        Aplica os cortes a novas probabilidades.
+
+        Args:
+            y_score (np.ndarray): As probabilidades de default.
+            segments (pd.Series, opcional): O segmento de cada linha. Sem
+                ele, usa o corte geral.
+
+        Returns:
+            np.ndarray: True para as linhas aprovadas.
+        """
+
+        thresholds = np.full(len(y_score), self.threshold)
+        if segments is not None and self.segment_thresholds:
+            thresholds = (
+                pd.Series(segments)
+                .astype(str)
+                .map(self.segment_thresholds)
+                .fillna(self.threshold)
+                .to_numpy(dtype="float64")
+            )
+        return np.asarray(y_score, dtype="float64") < thresholds
+
+    def log_to_mlflow(self) -> str:
+        """
+        Registra o corte e o resumo no run ativo do MLflow e grava os cortes
+        como artefato.
+
+        Returns:
+            str: O caminho do arquivo gravado.
+        """
+
+        mlflow.log_metric("decision_threshold", self.threshold)
+        mlflow.log_metrics(
+            {f"decision_{name}": value for name, value in self.summary.items()}
+        )
+        path = self.save()
+        mlflow.log_artifact(path)
+        return path
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converte os cortes em um dicionário serializável.
+
+        Returns:
+            Dict[str, Any]: Os cortes, os custos, as restrições e o resumo.
+        """
+
+        return {
+            "threshold": self.threshold,
+            "segment_column": self.segment_column,
+            "segment_thresholds": self.segment_thresholds,
+            "costs": self.costs,
+            "constraints": self.constraints,
+            "summary": self.summary,
+        }
+
+    def save(self, path: Optional[str] = None) -> str:
+        """
+        Grava os cortes em JSON.
+
+        Args:
+            path (str, opcional): O caminho do arquivo. Padrão é o
+                `path_decision_threshold` do config.yaml.
+
+        Returns:
+            str: O caminho do arquivo gravado.
+        """
+
+        path = path or get_project_path(
+            load_config_file().get("path_decision_threshold")
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+        logger.info(f"Corte de decisão gravado em {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "DecisionThreshold":
+        """
+        Carrega os cortes de um arquivo JSON.
+
+        Args:
+            path (str, opcional): O caminho do arquivo. Padrão é o
+                `path_decision_threshold` do config.yaml.
+
+        Returns:
+            DecisionThreshold: Os cortes carregados.
+        """
+
+        path = path or get_project_path(
+            load_config_file().get("path_decision_threshold")
+        )
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    @classmethod
+    def load_from_registry(
+        cls,
+        model_name: Optional[str] = None,
+        alias: str = "modelo",
+        version: Optional[str] = None,
+    ) -> "DecisionThreshold":
+        """
+        Carrega os cortes gravados junto a uma versão do modelo registrado.
+
+        O arquivo é guardado no cache de artefatos por versão, então um corte
+        antigo nunca é usado com outra versão do modelo.
+
+        Args:
+            model_name (str, opcional): O nome do modelo registrado. Padrão é
+                o `model_name` do config.yaml.
+            alias (str, opcional): O alias da versão. Padrão é 'modelo'.
+            version (str, opcional): A versão. Quando informada, o alias é
+                ignorado.
+
+        Returns:
+            DecisionThreshold: Os cortes carregados.
+        """
+
+        model_name = model_name or load_config_file().get("model_name")
+        model_uri = (
+            f"models:/{model_name}/{version}"
+            if version is not None
+            else f"models:/{model_name}@{alias}"
+        )
+        path = ArtifactCache().get_artifact(model_uri, cls.artifact_name)
+        return cls.load(path)
+
+    @classmethod
+    def load_latest(cls) -> "DecisionThreshold":
+        """
+        Carrega os cortes da versão apontada pelo alias 'modelo' ou, se o
+        registro não tiver o modelo nem houver versão em cache, os locais.
+
+        Returns:
+            DecisionThreshold: Os cortes carregados.
+        """
+
+        try:
+            return cls.load_from_registry()
+        except Exception as e:
+            path = get_project_path(
+                load_config_file().get("path_decision_threshold")
+            )
+            if not os.path.exists(path):
+                raise
+            logger.warning(
+                f"Corte do modelo registrado indisponível ({e}), usando o "
+                f"arquivo local {path}."
+            )
+            return cls.load(path)
@@ -0,0 +1,162 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def quantile_bin_edges(values: np.ndarray, n_bins: int = 10) -> np.ndarray:
+    """
+    Calcula os limites dos bins a partir dos quantis dos dados.
+
+    Os limites externos são -inf e +inf, de modo que qualquer valor futuro
+    cai em algum bin. Quantis repetidos (comuns em contagens) são unidos.
+
+    Args:
+        values (np.ndarray): Os valores da variável, podendo conter NaN.
+        n_bins (int, opcional): A quantidade desejada de bins. Padrão é 10.
+
+    Returns:
+        np.ndarray: Os limites dos bins, em ordem crescente.
+    """
+
+    values = np.asarray(values, dtype="float64")
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.array([-np.inf, np.inf])
+
+    inner = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+    return np.concatenate([[-np.inf], inner, [np.inf]])
+
+
+def histogram(values: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Conta os valores de cada bin e os valores ausentes.
+
+    O bin `i` contém os valores em (edges[i], edges[i + 1]], igual ao
+    `pd.cut` usado pelos discretizadores do feature_engine.
+
+    Args:
+        values (np.ndarray): Os valores da variável, podendo conter NaN.
+        edges (np.ndarray): Os limites dos bins.
+
+    Returns:
+        Tuple[np.ndarray, int]: As contagens por bin e a quantidade de NaN.
+    """
+
+    values = np.asarray(values, dtype="float64")
+    missing = np.isnan(values)
+    index = np.searchsorted(edges, values[~missing], side="left") - 1
+    counts = np.bincount(
+        np.clip(index, 0, len(edges) - 2), minlength=len(edges) - 1
+    )
+    return counts.astype("int64"), int(missing.sum())
+
+
+def _proportions(counts: np.ndarray, eps: float = 0.0) -> np.ndarray:
+    """
+    Converte contagens em proporções.
+
+    Args:
+        counts (np.ndarray): As contagens por bin.
+        eps (float, opcional): Valor mínimo de cada proporção. Padrão é 0.
+
+    Returns:
+        np.ndarray: As proporções por bin.
+    """
+
+    counts = np.asarray(counts, dtype="float64")
+    total = counts.sum()
+    if total == 0:
+        return np.full(counts.shape, np.nan)
+    return np.maximum(counts / total, eps)
+
+
+def psi(
+    reference: np.ndarray, current: np.ndarray, eps: float = 1e-4
+) -> float:
+    """
+    Calcula o Population Stability Index entre dois histogramas.
+
+    Args:
+        reference (np.ndarray): As contagens por bin da referência.
+        current (np.ndarray): As contagens por bin dos dados atuais.
+        eps (float, opcional): Proporção mínima, evitando log(0).
+
+    Returns:
+        float: O PSI.
+    """
+
+    ref = _proportions(reference, eps)
+    cur = _proportions(current, eps)
+    return float(np.sum((cur - ref) * np.log(cur / ref)))
+
+
+def ks_statistic(reference: np.ndarray, current: np.ndarray) -> float:
+    """
+    Calcula a estatística de Kolmogorov-Smirnov entre dois histogramas.
+
+    É a maior distância entre as distribuições acumuladas avaliadas nos
+    limites dos bins, um limite inferior da estatística exata.
+
+    Args:
+        reference (np.ndarray): As contagens por bin da referência.
+        current (np.ndarray): As contagens por bin dos dados atuais.
+
+    Returns:
+        float: A estatística KS.
+    """
+
+    ref_cdf = np.cumsum(_proportions(reference))
+    cur_cdf = np.cumsum(_proportions(current))
+    return float(np.max(np.abs(ref_cdf - cur_cdf)))
+
+
+def wasserstein_distance(
+    reference: np.ndarray, current: np.ndarray, edges: np.ndarray
+) -> float:
+    """
+    Calcula a distância de Wasserstein entre dois histogramas.
+
+    Cada bin é representado pelo seu ponto médio; os bins abertos usam o
+    limite finito. A distância é a área entre as distribuições acumuladas.
+
+    Args:
+        reference (np.ndarray): As contagens por bin da referência.
+        current (np.ndarray): As contagens por bin dos dados atuais.
+        edges (np.ndarray): Os limites dos bins.
+
+    Returns:
+        float: A distância de Wasserstein na escala da variável.
+    """
+
+    if len(edges) <= 2:
+        return 0.0
+
+    finite = np.asarray(edges[1:-1], dtype="float64")
+    points = np.concatenate(
+        [finite[:1], (finite[:-1] + finite[1:]) / 2, finite[-1:]]
+    )
+    ref_cdf = np.cumsum(_proportions(reference))[:-1]
+    cur_cdf = np.cumsum(_proportions(current))[:-1]
+    return float(np.sum(np.abs(ref_cdf - cur_cdf) * np.diff(points)))
+
+
+def drift_metrics(
+    reference: np.ndarray, current: np.ndarray, edges: np.ndarray
+) -> Dict[str, float]:
+    """
+    Calcula PSI, KS e Wasserstein entre dois histogramas.
+
+    Args:
+        reference (np.ndarray): As contagens por bin da referência.
+        current (np.ndarray): As contagens por bin dos dados atuais.
+        edges (np.ndarray): Os limites dos bins.
+
+    Returns:
+        Dict[str, float]: As métricas de drift.
+    """
+
+    return {
+        "psi": psi(reference, current),
+        "ks": ks_statistic(reference, current),
+        "wasserstein": wasserstein_distance(reference, current, edges),
+    }
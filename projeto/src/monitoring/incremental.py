@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from data.data_load import DataLoad
+from monitoring.drift import drift_metrics, histogram
+from monitoring.reference_profile import ReferenceProfile
+from predict.prediction_archive import PredictionArchive
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+
+class IncrementalMonitoring:
+    """
+    Classe para monitoramento incremental de drift.
+
+    A cada execução, lê apenas as predições posteriores à marca d'água
+    (`prediction_id` da última predição processada), soma as contagens nos
+    histogramas por janela de tempo e calcula PSI, KS e Wasserstein a partir
+    desses resumos. O custo de cada execução depende apenas das predições
+    novas, não do histórico. O relatório HTML do Evidently fica sob demanda.
+
+    Attributes:
+        archive (PredictionArchive): O arquivo de predições.
+        name (str): O nome do monitor, usado como chave da marca d'água.
+        window (str): A frequência das janelas (ex.: '1D').
+        rolling_windows (int): Quantas janelas compõem os dados atuais.
+        n_bins (int): A quantidade de bins dos histogramas.
+        psi_threshold (float): O PSI a partir do qual há drift.
+
+    Methods:
+        get_reference: Obtém os histogramas do perfil de referência.
+        update: Processa as predições novas e atualiza os histogramas.
+        drift: Calcula o drift das últimas janelas contra a referência.
+        run: Atualiza os histogramas e calcula o drift.
+    """
+
+    def __init__(
+        self,
+        archive: Optional[PredictionArchive] = None,
+        name: str = "drift",
+    ) -> None:
+        """
+        Inicializa uma instância da classe IncrementalMonitoring.
+
+        Args:
+            archive (PredictionArchive, opcional): O arquivo de predições.
+            name (str, opcional): O nome do monitor. Padrão é 'drift'.
+        """
+
+        config = load_config_file()
+        self.archive = archive or PredictionArchive()
+        self.name = name
+        self.window = config.get("monitoring_window", "1D")
+        self.rolling_windows = config.get("monitoring_rolling_windows", 7)
+        self.n_bins = config.get("monitoring_bins", 10)
+        self.psi_threshold = config.get("drift_psi_threshold", 0.2)
+        self.features = self.archive.store.feature_columns
+        self._training_profile: Optional[ReferenceProfile] = None
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        """
+        Cria as tabelas de estado do monitor na base de predições.
+        """
+
+        conn = self.archive.store.connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS monitoring_watermark ("
+                "name TEXT PRIMARY KEY, "
+                "last_prediction_id INTEGER NOT NULL, "
+                "last_scored_at TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS monitoring_reference ("
+                "name TEXT PRIMARY KEY, "
+                "profile_id TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS monitoring_histograms ("
+                "window_start TEXT NOT NULL, "
+                "feature TEXT NOT NULL, "
+                "counts TEXT NOT NULL, "
+                "missing INTEGER NOT NULL, "
+                "PRIMARY KEY (window_start, feature))"
+            )
+        conn.close()
+
+    def get_watermark(self) -> int:
+        """
+        Obtém o id da última predição processada.
+
+        Returns:
+            int: O `prediction_id` da marca d'água, ou 0 se não houver.
+        """
+
+        conn = self.archive.store.connect()
+        row = conn.execute(
+            "SELECT last_prediction_id FROM monitoring_watermark "
+            "WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def get_reference_profile(self) -> ReferenceProfile:
+        """
+        Obtém o perfil de referência gravado no treinamento do modelo.
+
+        Sem perfil disponível, o perfil é calculado a partir dos dados de
+        treinamento e guardado apenas nesta instância, para não substituir o
+        perfil do modelo registrado quando ele voltar a estar disponível.
+
+        Returns:
+            ReferenceProfile: O perfil de referência.
+        """
+
+        try:
+            return ReferenceProfile.load_latest()
+        except Exception as e:
+            logger.warning(
+                f"Perfil de referência indisponível: {e}. "
+                "Calculando a partir dos dados de treinamento."
+            )
+
+        if self._training_profile is None:
+            df_train = DataLoad().load_data("train_dataset_name")
+            target_name = load_config_file().get("target_name")
+            self._training_profile = ReferenceProfile.from_training(
+                df_train.drop(target_name, axis=1),
+                df_train[target_name],
+                n_bins=self.n_bins,
+            )
+        return self._training_profile
+
+    def get_reference(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Obtém os histogramas de referência de cada variável.
+
+        Quando o perfil muda (retreino do modelo), os histogramas das janelas
+        são descartados, pois foram contados com os limites de bins antigos.
+
+        Returns:
+            Dict[str, Tuple[np.ndarray, np.ndarray]]: Os limites dos bins e as
+                contagens de referência de cada variável.
+        """
+
+        profile = self.get_reference_profile()
+
+        conn = self.archive.store.connect()
+        with conn:
+            row = conn.execute(
+                "SELECT profile_id FROM monitoring_reference WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            if row is None or row[0] != profile.profile_id:
+                if row is not None:
+                    logger.warning(
+                        "Perfil de referência mudou, reiniciando histogramas."
+                    )
+                conn.execute("DELETE FROM monitoring_histograms")
+                conn.execute(
+                    "INSERT OR REPLACE INTO monitoring_reference "
+                    "VALUES (?, ?)",
+                    (self.name, profile.profile_id),
+                )
+        conn.close()
+
+        return {
+            feature: (profile.edges(feature), profile.counts(feature))
+            for feature in self.features
+        }
+
+    def update(self) -> int:
+        """
+        Processa as predições novas e atualiza os histogramas por janela.
+
+        As contagens e a marca d'água são gravadas na mesma transação, então
+        cada predição é contada exatamente uma vez mesmo com falhas.
+
+        Returns:
+            int: A quantidade de predições processadas.
+        """
+
+        reference = self.get_reference()
+        watermark = self.get_watermark()
+        df_new = self.archive.read(
+            after_id=watermark,
+            columns=["prediction_id", "scored_at"] + self.features,
+        )
+        if df_new.empty:
+            logger.info("Nenhuma predição nova para monitorar.")
+            return 0
+
+        windows = (
+            pd.to_datetime(df_new["scored_at"])
+            .dt.floor(self.window)
+            .dt.strftime("%Y-%m-%d %H:%M:%S")
+        )
+
+        conn = self.archive.store.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for window_start, df_window in df_new.groupby(windows):
+                for feature in self.features:
+                    edges, _ = reference[feature]
+                    counts, missing = histogram(df_window[feature], edges)
+                    row = conn.execute(
+                        "SELECT counts, missing FROM monitoring_histograms "
+                        "WHERE window_start = ? AND feature = ?",
+                        (window_start, feature),
+                    ).fetchone()
+                    if row:
+                        counts = counts + np.array(json.loads(row[0]))
+                        missing += row[1]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO monitoring_histograms "
+                        "VALUES (?, ?, ?, ?)",
+                        (
+                            window_start,
+                            feature,
+                            json.dumps(counts.tolist()),
+                            int(missing),
+                        ),
+                    )
+
+            last = df_new.iloc[-1]
+            conn.execute(
+                "INSERT OR REPLACE INTO monitoring_watermark VALUES (?, ?, ?)",
+                (self.name, int(last["prediction_id"]), last["scored_at"]),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        logger.info(f"{len(df_new)} predições novas processadas.")
+        return len(df_new)
+
+    def drift(self, n_windows: Optional[int] = None) -> pd.DataFrame:
+        """
+        Calcula o drift das últimas janelas contra a referência.
+
+        Args:
+            n_windows (int, opcional): Quantas janelas recentes somar. Padrão
+                é o `monitoring_rolling_windows` do config.yaml.
+
+        Returns:
+            pd.DataFrame: PSI, KS, Wasserstein, taxa de ausentes e indicador
+                de drift por variável.
+        """
+
+        n_windows = n_windows or self.rolling_windows
+        reference = self.get_reference()
+
+        conn = self.archive.store.connect()
+        df_hist = pd.read_sql_query(
+            "SELECT * FROM monitoring_histograms WHERE window_start IN ("
+            "SELECT DISTINCT window_start FROM monitoring_histograms "
+            "ORDER BY window_start DESC LIMIT ?)",
+            conn,
+            params=(int(n_windows),),
+        )
+        conn.close()
+
+        results = []
+        for feature, df_feature in df_hist.groupby("feature"):
+            edges, ref_counts = reference[feature]
+            counts = np.sum(
+                [json.loads(counts) for counts in df_feature["counts"]],
+                axis=0,
+            )
+            missing = int(df_feature["missing"].sum())
+            metrics = drift_metrics(ref_counts, counts, edges)
+            metrics["feature"] = feature
+            metrics["n_rows"] = int(counts.sum()) + missing
+            metrics["missing_rate"] = missing / max(metrics["n_rows"], 1)
+            metrics["drift_detected"] = metrics["psi"] >= self.psi_threshold
+            results.append(metrics)
+
+        return pd.DataFrame(
+            results,
+            columns=[
+                "feature",
+                "n_rows",
+                "missing_rate",
+                "psi",
+                "ks",
+                "wasserstein",
+                "drift_detected",
+            ],
+        )
+
+    def run(self, report: bool = False) -> pd.DataFrame:
+        """
+        Atualiza os histogramas e calcula o drift.
+
+        Args:
+            report (bool, opcional): Gera também o relatório HTML do
+                Evidently para as janelas monitoradas. Padrão é False.
+
+        Returns:
+            pd.DataFrame: O drift por variável.
+        """
+
+        self.update()
+        df_drift = self.drift()
+
+        drifted = df_drift.loc[df_drift["drift_detected"], "feature"].tolist()
+        if drifted:
+            logger.warning(f"Drift detectado nas variáveis: {drifted}")
+        else:
+            logger.info("Nenhum drift detectado.")
+
+        if report:
+            from monitoring.monitor import ModelMonitoring
+
+            start = pd.Timestamp.now(tz="UTC").tz_localize(None).floor(
+                self.window
+            ) - pd.tseries.frequencies.to_offset(self.window) * (
+                self.rolling_windows - 1
+            )
+            ModelMonitoring().run(start=start.strftime("%Y-%m-%d %H:%M:%S"))
+
+        return df_drift
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Gera também o relatório HTML do Evidently.",
+    )
+    args = parser.parse_args()
+
+    monitor = IncrementalMonitoring()
+    print(monitor.run(report=args.report))
@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from predict.prediction_archive import PredictionArchive
+from predict.prediction_store import utc_now
+from utils.instrumentation import instrument
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+WINDOW_FORMAT = "%Y-%m-%d %H:%M:%S"
+HISTOGRAMS = ("pos", "neg", "prob_sum")
+
+
+def realized_metrics(histogram: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """
+    Calcula as métricas realizadas a partir dos histogramas por classe.
+
+    Os histogramas contam as probabilidades dos bons (`neg`) e dos maus
+    (`pos`) em faixas fixas de `preds_prob`, e `prob_sum` soma as
+    probabilidades de cada faixa. Todas as métricas custam O(faixas): a AUC
+    trata cada faixa como um grupo de empates, o KS é a maior distância entre
+    as distribuições acumuladas e o erro de calibração (ECE) compara a
+    probabilidade média e a taxa de maus em cada faixa.
+
+    Args:
+        histogram (Dict[str, np.ndarray]): Os histogramas `pos`, `neg` e
+            `prob_sum`.
+
+    Returns:
+        Dict[str, float]: As métricas realizadas.
+    """
+
+    pos, neg = histogram["pos"], histogram["neg"]
+    n_pos, n_neg = pos.sum(), neg.sum()
+    n_labels = n_pos + n_neg
+    metrics = {"n_labels": float(n_labels)}
+    if n_labels == 0:
+        return metrics
+
+    metrics["default_rate"] = n_pos / n_labels
+    metrics["preds_prob_mean"] = histogram["prob_sum"].sum() / n_labels
+    metrics["calibration_error"] = (
+        np.abs(histogram["prob_sum"] - pos).sum() / n_labels
+    )
+    if n_pos and n_neg:
+        neg_below = np.cumsum(neg) - neg
+        metrics["auc"] = (pos * (neg_below + 0.5 * neg)).sum() / (
+            n_pos * n_neg
+        )
+        metrics["ks"] = np.abs(
+            np.cumsum(pos) / n_pos - np.cumsum(neg) / n_neg
+        ).max()
+    return {name: float(value) for name, value in metrics.items()}
+
+
+class RealizedPerformance:
+    """
+    Classe para acompanhar a performance realizada com rótulos atrasados.
+
+    Os rótulos (inadimplência) chegam meses depois da pontuação, com o
+    `prediction_id` da predição. Cada lote é unido às predições pela chave
+    primária da tabela `predictions` ou, para predições já compactadas, pelo
+    `prediction_id` no arquivo Parquet, e gravado na tabela `outcomes`, que
+    ignora rótulos repetidos. As probabilidades rotuladas são somadas a
+    histogramas por classe da janela de pontuação (`label_histograms`), então
+    AUC, KS e calibração de uma janela são atualizados em O(faixas) a cada
+    lote, sem reler o histórico.
+
+    Attributes:
+        archive (PredictionArchive): O arquivo de predições.
+        window (str): A frequência das janelas (ex.: '1D').
+        bins (int): A quantidade de faixas dos histogramas.
+
+    Methods:
+        ingest: Une um lote de rótulos às predições e atualiza os
+            histogramas.
+        histogram: Lê os histogramas somados de um período.
+        window_metrics: Calcula as métricas realizadas de um período.
+    """
+
+    def __init__(
+        self,
+        archive: Optional[PredictionArchive] = None,
+        window: Optional[str] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe RealizedPerformance.
+
+        Args:
+            archive (PredictionArchive, opcional): O arquivo de predições.
+            window (str, opcional): A frequência das janelas. Padrão é o
+                `monitoring_window` do config.yaml.
+        """
+
+        config = load_config_file()
+        self.archive = archive or PredictionArchive()
+        self.window = window or config.get("monitoring_window", "1D")
+        self.bins = config.get("realized_bins", 100)
+        self.connect = self.archive.store.connect
+
+        conn = self.connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outcomes ("
+                "prediction_id INTEGER PRIMARY KEY, "
+                "label INTEGER NOT NULL, "
+                "labeled_at TEXT NOT NULL, "
+                "window_start TEXT NOT NULL, "
+                "preds_prob REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS label_histograms ("
+                "window_start TEXT PRIMARY KEY, "
+                "histogram TEXT NOT NULL)"
+            )
+        conn.close()
+
+    def _bin(self, df_labeled: pd.DataFrame) -> Dict[str, Dict[str, list]]:
+        """
+        Resume as predições rotuladas em histogramas por janela.
+
+        Args:
+            df_labeled (pd.DataFrame): Os rótulos com `window_start` e
+                `preds_prob`.
+
+        Returns:
+            Dict[str, Dict[str, list]]: Os histogramas de cada janela.
+        """
+
+        summaries = {}
+        for window_start, df_window in df_labeled.groupby("window_start"):
+            preds = df_window["preds_prob"].to_numpy(dtype="float64")
+            labels = df_window["label"].to_numpy(dtype="int64")
+            index = np.clip(
+                (preds * self.bins).astype("int64"), 0, self.bins - 1
+            )
+            summaries[window_start] = {
+                "pos": np.bincount(
+                    index[labels == 1], minlength=self.bins
+                ).tolist(),
+                "neg": np.bincount(
+                    index[labels == 0], minlength=self.bins
+                ).tolist(),
+                "prob_sum": np.bincount(
+                    index, weights=preds, minlength=self.bins
+                ).tolist(),
+            }
+        return summaries
+
+    @instrument()
+    def ingest(self, df_outcomes: pd.DataFrame) -> List[str]:
+        """
+        Une um lote de rótulos às predições e atualiza os histogramas.
+
+        Tudo acontece em uma única transação, então um lote interrompido não
+        deixa rótulos gravados sem histograma. Rótulos de predições já
+        rotuladas são ignorados; rótulos sem predição correspondente são
+        descartados com um aviso e podem ser reenviados depois.
+
+        Args:
+            df_outcomes (pd.DataFrame): As colunas `prediction_id`, `label`
+                e, opcionalmente, `labeled_at`.
+
+        Returns:
+            List[str]: O início das janelas atualizadas.
+        """
+
+        df_outcomes = df_outcomes.drop_duplicates("prediction_id", keep="last")
+        if "labeled_at" not in df_outcomes.columns:
+            df_outcomes = df_outcomes.assign(labeled_at=utc_now())
+
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS incoming ("
+                "prediction_id INTEGER PRIMARY KEY, "
+                "label INTEGER NOT NULL, "
+                "labeled_at TEXT NOT NULL)"
+            )
+            conn.execute("DELETE FROM incoming")
+            conn.executemany(
+                "INSERT INTO incoming VALUES (?, ?, ?)",
+                df_outcomes[["prediction_id", "label", "labeled_at"]]
+                .astype({"prediction_id": "int64", "label": "int64"})
+                .itertuples(index=False, name=None),
+            )
+            conn.execute(
+                "DELETE FROM incoming WHERE prediction_id IN "
+                "(SELECT prediction_id FROM outcomes)"
+            )
+            df_new = pd.read_sql_query(
+                "SELECT i.prediction_id, i.label, i.labeled_at, "
+                "p.scored_at, p.preds_prob FROM incoming i "
+                f"LEFT JOIN {self.archive.store.table} p "
+                "ON p.prediction_id = i.prediction_id",
+                conn,
+            )
+
+            # predições já compactadas são buscadas no arquivo Parquet
+            missing = df_new["scored_at"].isna()
+            if missing.any():
+                df_archived = self.archive.lookup(
+                    df_new.loc[missing, "prediction_id"].tolist(),
+                    columns=["scored_at", "preds_prob"],
+                ).set_index("prediction_id")
+                ids = df_new.loc[missing, "prediction_id"]
+                for column in ["scored_at", "preds_prob"]:
+                    df_new.loc[missing, column] = ids.map(df_archived[column])
+
+            unmatched = df_new["scored_at"].isna()
+            if unmatched.any():
+                logger.warning(
+                    f"{int(unmatched.sum())} rótulos sem predição "
+                    "correspondente foram descartados."
+                )
+            df_new = df_new[~unmatched].assign(
+                window_start=lambda df: pd.to_datetime(df["scored_at"])
+                .dt.floor(self.window)
+                .dt.strftime(WINDOW_FORMAT)
+            )
+
+            summaries = self._bin(df_new)
+            rows = []
+            for window_start, summary in summaries.items():
+                stored = conn.execute(
+                    "SELECT histogram FROM label_histograms "
+                    "WHERE window_start = ?",
+                    (window_start,),
+                ).fetchone()
+                if stored is not None:
+                    previous = json.loads(stored[0])
+                    summary = {
+                        name: np.add(previous[name], summary[name]).tolist()
+                        for name in HISTOGRAMS
+                    }
+                rows.append((window_start, json.dumps(summary)))
+            conn.executemany(
+                "INSERT OR REPLACE INTO label_histograms VALUES (?, ?)", rows
+            )
+            conn.executemany(
+                "INSERT INTO outcomes VALUES (?, ?, ?, ?, ?)",
+                df_new[
+                    [
+                        "prediction_id",
+                        "label",
+                        "labeled_at",
+                        "window_start",
+                        "preds_prob",
+                    ]
+                ].itertuples(index=False, name=None),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        logger.info(
+            f"{len(df_new)} rótulos ingeridos em {len(summaries)} janelas."
+        )
+        return sorted(summaries)
+
+    def histogram(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Lê os histogramas somados das janelas de um período.
+
+        Args:
+            start (str, opcional): Início do período (inclusivo).
+            end (str, opcional): Fim do período (exclusivo).
+
+        Returns:
+            Dict[str, np.ndarray]: Os histogramas `pos`, `neg` e `prob_sum`.
+        """
+
+        conn = self.connect()
+        rows = conn.execute(
+            "SELECT histogram FROM label_histograms "
+            "WHERE window_start >= ? AND window_start < ?",
+            (start or "", end or "9999"),
+        ).fetchall()
+        conn.close()
+
+        merged = {name: np.zeros(self.bins) for name in HISTOGRAMS}
+        for (stored,) in rows:
+            stored = json.loads(stored)
+            for name in HISTOGRAMS:
+                merged[name] += stored[name]
+        return merged
+
+    def window_metrics(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Calcula as métricas realizadas de um período.
+
+        Args:
+            start (str, opcional): Início do período (inclusivo).
+            end (str, opcional): Fim do período (exclusivo).
+
+        Returns:
+            pd.DataFrame: As métricas no formato (metric, feature, value),
+                com o prefixo `realized_`.
+        """
+
+        metrics = realized_metrics(self.histogram(start, end))
+        return pd.DataFrame(
+            [
+                (f"realized_{name}", "", value)
+                for name, value in metrics.items()
+            ],
+            columns=["metric", "feature", "value"],
+        )
+
+
+if __name__ == "__main__":
+    from monitoring.runner import MonitoringRunner
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "labels_path",
+        help="CSV com as colunas prediction_id, label e, opcionalmente, "
+        "labeled_at.",
+    )
+    args = parser.parse_args()
+
+    runner = MonitoringRunner()
+    runner.ingest_labels(pd.read_csv(args.labels_path))
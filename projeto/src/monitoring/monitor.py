@@ -3,15 +3,20 @@ import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
 
-import sqlite3
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 from data.data_load import DataLoad
 from evidently.metric_preset import DataDriftPreset
 from evidently.metrics import *
 from evidently.report import Report
 from evidently.test_preset import DataDriftTestPreset
-from utils.utils import load_config_file
+from monitoring.drift import drift_metrics, histogram
+from monitoring.parallel_drift import ALL_SEGMENTS, ParallelDrift
+from monitoring.reference_profile import ReferenceProfile
+from predict.prediction_archive import PredictionArchive
+from utils.utils import get_project_path, load_config_file
 
 
 class ModelMonitoring:
@@ -21,8 +26,12 @@ class ModelMonitoring:
     Esta classe carrega os dados de previsão e os dados de treinamento, calcula métricas de
     monitoramento de modelo, e gera um relatório de monitoramento.
 
+    A referência de treinamento é o perfil gravado junto ao modelo (ver
+    ReferenceProfile), então os dados de treinamento só são lidos quando o
+    drift é quebrado por segmento, o que o perfil não resume.
+
     Attributes:
-        query (str): A consulta SQL para recuperar os dados de previsão.
+        archive (PredictionArchive): O arquivo de predições (Parquet e SQLite).
     """
 
     def __init__(self):
@@ -30,20 +39,31 @@ class ModelMonitoring:
         Inicializa uma instância da classe ModelMonitoring.
         """
 
-        self.query = "SELECT * FROM predictions"
+        self.archive = PredictionArchive()
 
-    def get_pred_data(self) -> pd.DataFrame:
+    def get_pred_data(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
         """
-        Obtém os dados de previsão do banco de dados.
+        Obtém os dados de previsão de uma janela de tempo.
+
+        Args:
+            start (str, opcional): Início da janela (inclusivo).
+            end (str, opcional): Fim da janela (exclusivo).
+            columns (List[str], opcional): Colunas a retornar. Padrão são as
+                variáveis do modelo e a probabilidade predita.
 
         Returns:
             pd.DataFrame: O DataFrame contendo os dados de previsão.
         """
 
-        conn = sqlite3.connect("preds.db")
-        df_pred = pd.read_sql_query(self.query, conn)
-        conn.close()
-        return df_pred
+        columns = columns or self.archive.store.feature_columns + [
+            "preds_prob"
+        ]
+        return self.archive.read(start=start, end=end, columns=columns)
 
     def get_training_data(self) -> pd.DataFrame:
         """
@@ -57,18 +77,116 @@ class ModelMonitoring:
         df_train = dl.load_data("train_dataset_name")
         return df_train
 
-    def run(self) -> None:
+    def compute_drift(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        reference_start: Optional[str] = None,
+        reference_end: Optional[str] = None,
+        segment_column: Optional[str] = None,
+        n_jobs: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Calcula o drift por variável em paralelo, sem o Evidently.
+
+        A referência padrão é o perfil de treinamento: as contagens de cada
+        variável são comparadas com as do perfil (o KS é calculado sobre os
+        histogramas, sem p-valor). Com `segment_column`, a referência são os
+        dados de treinamento. Informando uma janela de referência, ela passa
+        a ser um período anterior de predições, e `preds_prob` também é
+        comparada.
+
+        Args:
+            start (str, opcional): Início da janela atual (inclusivo).
+            end (str, opcional): Fim da janela atual (exclusivo).
+            reference_start (str, opcional): Início da janela de referência.
+            reference_end (str, opcional): Fim da janela de referência.
+            segment_column (str, opcional): Variável para quebrar o drift
+                por segmento.
+            n_jobs (int, opcional): A quantidade de processos.
+
+        Returns:
+            pd.DataFrame: As métricas de drift por variável e segmento.
+        """
+
+        df_cur = self.get_pred_data(start, end)
+        if reference_start is not None or reference_end is not None:
+            df_ref = self.get_pred_data(reference_start, reference_end)
+        elif segment_column is None:
+            return self.profile_drift(df_cur, ReferenceProfile.load_latest())
+        else:
+            df_ref = self.get_training_data().drop(
+                load_config_file().get("target_name"), axis=1
+            )
+
+        return ParallelDrift(n_jobs).compute(
+            df_ref, df_cur, segment_column=segment_column
+        )
+
+    @staticmethod
+    def profile_drift(
+        df_cur: pd.DataFrame, profile: ReferenceProfile
+    ) -> pd.DataFrame:
+        """
+        Calcula o drift por variável contra o perfil de referência.
+
+        Args:
+            df_cur (pd.DataFrame): Os dados atuais.
+            profile (ReferenceProfile): O perfil de referência.
+
+        Returns:
+            pd.DataFrame: As métricas no formato do ParallelDrift, com o
+                segmento '__all__'.
+        """
+
+        psi_threshold = load_config_file().get("drift_psi_threshold", 0.2)
+        rows = []
+        for feature in profile.features:
+            if feature not in df_cur:
+                continue
+            edges = profile.edges(feature)
+            reference = profile.counts(feature)
+            current, _ = histogram(
+                df_cur[feature].to_numpy(dtype="float64"), edges
+            )
+            metrics = drift_metrics(reference, current, edges)
+            rows.append(
+                {
+                    "feature": feature,
+                    "segment": ALL_SEGMENTS,
+                    "n_reference": int(reference.sum()),
+                    "n_current": int(current.sum()),
+                    "ks": metrics["ks"],
+                    "ks_pvalue": np.nan,
+                    "psi": metrics["psi"],
+                    "wasserstein": metrics["wasserstein"],
+                    "drift_detected": metrics["psi"] >= psi_threshold,
+                }
+            )
+        return pd.DataFrame(rows)
+
+    def run(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        report_path: Optional[str] = None,
+    ) -> None:
         """
         Executa o monitoramento do modelo, calcula métricas e gera um relatório.
 
+        Args:
+            start (str, opcional): Início da janela de predições (inclusivo).
+            end (str, opcional): Fim da janela de predições (exclusivo).
+            report_path (str, opcional): Onde gravar o HTML. Padrão é
+                docs/model_monitoring_report.html.
+
         Returns:
             None
         """
 
-        df_cur = self.get_pred_data()  # dados atuais
-        df_ref = self.get_training_data().drop(
-            load_config_file().get("target_name"), axis=1
-        )  # dados referencia
+        df_cur = self.get_pred_data(start, end)  # dados atuais
+        # dados referencia, amostrados do perfil de treinamento
+        df_ref = ReferenceProfile.load_latest().sample()
 
         model_card = Report(
             metrics=[
@@ -79,8 +197,12 @@ class ModelMonitoring:
         )
 
         model_card.run(reference_data=df_ref, current_data=df_cur)
-        model_card.save_html("projeto/docs/model_monitoring_report.html")
+        model_card.save_html(
+            report_path
+            or get_project_path("docs", "model_monitoring_report.html")
+        )
 
 
-mm = ModelMonitoring()
-mm.run()
+if __name__ == "__main__":
+    mm = ModelMonitoring()
+    mm.run()
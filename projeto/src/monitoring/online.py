@@ -0,0 +1,132 @@
+import argparse
+import os
+import sys
+from typing import Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from monitoring.drift import ks_statistic, psi
+from monitoring.reference_profile import ReferenceProfile
+from monitoring.sketches import SketchStore, TDigest
+from predict.prediction_store import PredictionStore
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+
+class OnlineDriftMonitor:
+    """
+    Classe para checar o drift a partir dos sketches online.
+
+    A checagem mescla apenas os buckets da janela pedida e compara cada
+    t-digest com o histograma do perfil de referência: a CDF do sketch nos
+    limites dos bins dá as proporções atuais, usadas no PSI e no KS. Por ser
+    barata, pode rodar a cada minuto.
+
+    Attributes:
+        sketches (SketchStore): Os sketches gravados pelas predições.
+        window_minutes (int): O tamanho padrão da janela em minutos.
+        psi_threshold (float): O PSI a partir do qual há drift.
+
+    Methods:
+        check: Calcula o drift da janela mais recente.
+    """
+
+    def __init__(self, sketches: Optional[SketchStore] = None) -> None:
+        """
+        Inicializa uma instância da classe OnlineDriftMonitor.
+
+        Args:
+            sketches (SketchStore, opcional): Os sketches das predições.
+                Padrão são os da PredictionStore configurada.
+        """
+
+        config = load_config_file()
+        self.sketches = sketches or PredictionStore().sketches
+        self.window_minutes = config.get("online_drift_window_minutes", 60)
+        self.psi_threshold = config.get("drift_psi_threshold", 0.2)
+
+    def check(self, minutes: Optional[int] = None) -> pd.DataFrame:
+        """
+        Calcula o drift da janela mais recente.
+
+        Args:
+            minutes (int, opcional): O tamanho da janela em minutos. Padrão é
+                o `online_drift_window_minutes` do config.yaml.
+
+        Returns:
+            pd.DataFrame: Linhas, taxa de ausentes, PSI, KS e indicador de
+                drift por variável, e a média de `preds_prob` comparada à taxa
+                do alvo no treinamento.
+        """
+
+        minutes = minutes or self.window_minutes
+        start = pd.Timestamp.now(tz="UTC").tz_localize(None) - pd.Timedelta(
+            minutes=minutes
+        )
+        start = start.floor(self.sketches.bucket)
+        merged = self.sketches.read(start=start.strftime("%Y-%m-%d %H:%M:%S"))
+        profile = ReferenceProfile.load_latest()
+
+        results = []
+        for feature in self.sketches.features:
+            if feature not in merged:
+                continue
+            digest = TDigest.from_dict(merged[feature]["digest"])
+            missing = merged[feature]["missing"]
+            edges = profile.edges(feature)
+            ref_counts = profile.counts(feature)
+
+            cdf = np.r_[0.0, digest.cdf(edges[1:-1]), 1.0]
+            counts = np.diff(cdf) * digest.count
+            n_rows = digest.count + missing
+            psi_value = psi(ref_counts, counts)
+            results.append(
+                {
+                    "feature": feature,
+                    "n_rows": int(n_rows),
+                    "missing_rate": missing / max(n_rows, 1),
+                    "reference_missing_rate": profile.features[feature][
+                        "missing_rate"
+                    ],
+                    "psi": psi_value,
+                    "ks": ks_statistic(ref_counts, counts),
+                    "drift_detected": psi_value >= self.psi_threshold,
+                }
+            )
+
+        if "preds_prob" in merged:
+            preds = merged["preds_prob"]
+            n_preds = max(sum(preds["counts"]), 1)
+            results.append(
+                {
+                    "feature": "preds_prob",
+                    "n_rows": int(sum(preds["counts"]) + preds["missing"]),
+                    "mean": preds["sum"] / n_preds,
+                    "reference_mean": profile.target_rate,
+                }
+            )
+
+        df_drift = pd.DataFrame(results)
+        drifted = [
+            result["feature"]
+            for result in results
+            if result.get("drift_detected")
+        ]
+        if drifted:
+            logger.warning(f"Drift online detectado nas variáveis: {drifted}")
+        return df_drift
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--minutes", type=int, default=None, help="Tamanho da janela."
+    )
+    args = parser.parse_args()
+
+    monitor = OnlineDriftMonitor()
+    print(monitor.check(args.minutes))
@@ -0,0 +1,304 @@
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from monitoring.drift import psi, quantile_bin_edges
+from scipy.stats import kstwo
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+ALL_SEGMENTS = "__all__"
+
+
+def ks_sorted(
+    reference: np.ndarray, current: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Calcula o teste KS de duas amostras já ordenadas.
+
+    As distribuições acumuladas são avaliadas em todos os pontos das duas
+    amostras com uma única busca binária vetorizada por amostra, sem laços.
+
+    Args:
+        reference (np.ndarray): A amostra de referência ordenada, sem NaN.
+        current (np.ndarray): A amostra atual ordenada, sem NaN.
+
+    Returns:
+        Tuple[float, float]: A estatística KS e o p-valor (distribuição
+            assintótica de Kolmogorov).
+    """
+
+    n_ref, n_cur = reference.size, current.size
+    if n_ref == 0 or n_cur == 0:
+        return np.nan, np.nan
+
+    points = np.concatenate([reference, current])
+    ref_cdf = np.searchsorted(reference, points, side="right") / n_ref
+    cur_cdf = np.searchsorted(current, points, side="right") / n_cur
+    statistic = float(np.max(np.abs(ref_cdf - cur_cdf)))
+
+    effective_n = round(n_ref * n_cur / (n_ref + n_cur))
+    return statistic, float(kstwo.sf(statistic, max(effective_n, 1)))
+
+
+def wasserstein_sorted(reference: np.ndarray, current: np.ndarray) -> float:
+    """
+    Calcula a distância de Wasserstein de duas amostras já ordenadas.
+
+    Args:
+        reference (np.ndarray): A amostra de referência ordenada, sem NaN.
+        current (np.ndarray): A amostra atual ordenada, sem NaN.
+
+    Returns:
+        float: A área entre as distribuições acumuladas.
+    """
+
+    if reference.size == 0 or current.size == 0:
+        return np.nan
+
+    points = np.sort(np.concatenate([reference, current]), kind="mergesort")
+    ref_cdf = np.searchsorted(reference, points[:-1], side="right")
+    cur_cdf = np.searchsorted(current, points[:-1], side="right")
+    return float(
+        np.sum(
+            np.abs(ref_cdf / reference.size - cur_cdf / current.size)
+            * np.diff(points)
+        )
+    )
+
+
+def _column_metrics(
+    reference: np.ndarray, current: np.ndarray, edges: np.ndarray
+) -> Dict[str, float]:
+    """
+    Calcula as métricas de drift de uma coluna.
+
+    Args:
+        reference (np.ndarray): A amostra de referência ordenada, sem NaN.
+        current (np.ndarray): A amostra atual ordenada, sem NaN.
+        edges (np.ndarray): Os limites dos bins do PSI.
+
+    Returns:
+        Dict[str, float]: Tamanhos das amostras, KS, p-valor, PSI e
+            Wasserstein.
+    """
+
+    ks, p_value = ks_sorted(reference, current)
+    ref_counts = np.diff(np.searchsorted(reference, edges, side="right"))
+    cur_counts = np.diff(np.searchsorted(current, edges, side="right"))
+    return {
+        "n_reference": int(reference.size),
+        "n_current": int(current.size),
+        "ks": ks,
+        "ks_pvalue": p_value,
+        "psi": psi(ref_counts, cur_counts)
+        if reference.size and current.size
+        else np.nan,
+        "wasserstein": wasserstein_sorted(reference, current),
+    }
+
+
+def _feature_drift(task: Tuple[str, str, int]) -> List[Dict]:
+    """
+    Calcula o drift de uma variável, no total e por segmento.
+
+    Executado nos processos do pool: as colunas são abertas como arquivos
+    mapeados em memória, então nenhum dado é copiado entre processos.
+
+    Args:
+        task (Tuple[str, str, int]): O diretório dos buffers, a variável e a
+            quantidade de bins do PSI.
+
+    Returns:
+        List[Dict]: As métricas da variável, uma linha por segmento.
+    """
+
+    buffer_dir, feature, n_bins = task
+    reference = np.load(
+        os.path.join(buffer_dir, f"ref_{feature}.npy"), mmap_mode="r"
+    )
+    current = np.load(
+        os.path.join(buffer_dir, f"cur_{feature}.npy"), mmap_mode="r"
+    )
+
+    segments = {ALL_SEGMENTS: (slice(None), slice(None))}
+    segment_path = os.path.join(buffer_dir, "ref_segment.npy")
+    if os.path.exists(segment_path):
+        ref_codes = np.load(segment_path, mmap_mode="r")
+        cur_codes = np.load(
+            os.path.join(buffer_dir, "cur_segment.npy"), mmap_mode="r"
+        )
+        labels = np.load(
+            os.path.join(buffer_dir, "segment_labels.npy"), allow_pickle=True
+        )
+        for code, label in enumerate(labels):
+            segments[str(label)] = (ref_codes == code, cur_codes == code)
+
+    edges = quantile_bin_edges(np.asarray(reference), n_bins)
+    rows = []
+    for segment, (ref_mask, cur_mask) in segments.items():
+        ref_values = np.asarray(reference[ref_mask])
+        cur_values = np.asarray(current[cur_mask])
+        ref_sorted = np.sort(ref_values[~np.isnan(ref_values)])
+        cur_sorted = np.sort(cur_values[~np.isnan(cur_values)])
+
+        metrics = _column_metrics(ref_sorted, cur_sorted, edges)
+        metrics["feature"] = feature
+        metrics["segment"] = segment
+        rows.append(metrics)
+    return rows
+
+
+class ParallelDrift:
+    """
+    Classe para calcular o drift por variável em paralelo.
+
+    Cada coluna dos dados de referência e atuais é gravada uma única vez em um
+    buffer `.npy`, aberto pelos processos do pool como memória mapeada. Cada
+    processo calcula os testes de uma variável (KS exato por ranqueamento,
+    PSI e Wasserstein), no total e por segmento, e os resultados são unidos
+    em um único relatório.
+
+    Attributes:
+        n_jobs (int): A quantidade de processos do pool.
+        n_bins (int): A quantidade de bins do PSI.
+        psi_threshold (float): O PSI a partir do qual há drift.
+        max_segments (int): Acima desta quantidade de valores distintos, a
+            variável de segmento é dividida em quartis.
+
+    Methods:
+        compute: Calcula o relatório de drift.
+    """
+
+    def __init__(self, n_jobs: Optional[int] = None) -> None:
+        """
+        Inicializa uma instância da classe ParallelDrift.
+
+        Args:
+            n_jobs (int, opcional): A quantidade de processos. Padrão é o
+                `drift_n_jobs` do config.yaml ou a quantidade de CPUs.
+        """
+
+        config = load_config_file()
+        self.n_jobs = n_jobs or config.get("drift_n_jobs") or os.cpu_count()
+        self.n_bins = config.get("monitoring_bins", 10)
+        self.psi_threshold = config.get("drift_psi_threshold", 0.2)
+        self.max_segments = 20
+
+    def _segment_codes(
+        self, reference: pd.Series, current: pd.Series
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Codifica a variável de segmento das duas amostras.
+
+        Args:
+            reference (pd.Series): O segmento na referência.
+            current (pd.Series): O segmento nos dados atuais.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Os códigos da
+                referência, os códigos dos dados atuais e os rótulos.
+        """
+
+        if (
+            pd.api.types.is_numeric_dtype(reference)
+            and reference.nunique() > self.max_segments
+        ):
+            edges = np.unique(reference.quantile([0, 0.25, 0.5, 0.75, 1]))
+            edges[0], edges[-1] = -np.inf, np.inf
+            reference = pd.cut(reference, edges).astype(str)
+            current = pd.cut(current, edges).astype(str)
+
+        codes, labels = pd.factorize(
+            pd.concat([reference.astype(str), current.astype(str)]),
+            sort=True,
+        )
+        return codes[: len(reference)], codes[len(reference) :], labels
+
+    def compute(
+        self,
+        reference: pd.DataFrame,
+        current: pd.DataFrame,
+        features: Optional[List[str]] = None,
+        segment_column: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Calcula o relatório de drift.
+
+        Args:
+            reference (pd.DataFrame): Os dados de referência.
+            current (pd.DataFrame): Os dados atuais.
+            features (List[str], opcional): As variáveis comparadas. Padrão são
+                as colunas presentes nos dois conjuntos.
+            segment_column (str, opcional): A variável usada para quebrar o
+                drift por segmento.
+
+        Returns:
+            pd.DataFrame: KS, p-valor, PSI, Wasserstein e indicador de drift
+                por variável e segmento.
+        """
+
+        features = features or [
+            column for column in reference.columns if column in current
+        ]
+        logger.info(
+            f"Drift paralelo iniciou: {len(features)} variáveis, "
+            f"{self.n_jobs} processos."
+        )
+
+        with tempfile.TemporaryDirectory() as buffer_dir:
+            for feature in features:
+                np.save(
+                    os.path.join(buffer_dir, f"ref_{feature}.npy"),
+                    reference[feature].to_numpy(dtype="float64"),
+                )
+                np.save(
+                    os.path.join(buffer_dir, f"cur_{feature}.npy"),
+                    current[feature].to_numpy(dtype="float64"),
+                )
+
+            if segment_column is not None:
+                ref_codes, cur_codes, labels = self._segment_codes(
+                    reference[segment_column], current[segment_column]
+                )
+                np.save(os.path.join(buffer_dir, "ref_segment.npy"), ref_codes)
+                np.save(os.path.join(buffer_dir, "cur_segment.npy"), cur_codes)
+                np.save(
+                    os.path.join(buffer_dir, "segment_labels.npy"),
+                    np.asarray(labels, dtype=object),
+                )
+
+            tasks = [
+                (buffer_dir, feature, self.n_bins) for feature in features
+            ]
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                results = [
+                    row
+                    for rows in executor.map(_feature_drift, tasks)
+                    for row in rows
+                ]
+
+        df_drift = pd.DataFrame(results)
+        df_drift["drift_detected"] = df_drift["psi"] >= self.psi_threshold
+        logger.info("Drift paralelo terminou.")
+        return df_drift[
+            [
+                "feature",
+                "segment",
+                "n_reference",
+                "n_current",
+                "ks",
+                "ks_pvalue",
+                "psi",
+                "wasserstein",
+                "drift_detected",
+            ]
+        ]
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Dict, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from monitoring.drift import histogram, quantile_bin_edges
+from sklearn.pipeline import Pipeline
+from utils.artifact_cache import ArtifactCache
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+QUANTILES = np.linspace(0, 1, 101)
+
+
+class ReferenceProfile:
+    """
+    Classe do perfil de referência usado no monitoramento.
+
+    O perfil resume os dados de treinamento de um modelo: quantis, histograma,
+    taxa de ausentes de cada variável e a taxa do alvo. Os histogramas usam os
+    limites de bins do discretizador do pipeline treinado, e as variáveis não
+    discretizadas usam limites por quantil. O perfil é gravado em JSON junto
+    ao modelo registrado, de modo que o monitor não precisa recarregar os
+    dados de treinamento.
+
+    Attributes:
+        features (Dict[str, Dict[str, Any]]): O resumo de cada variável.
+        target_rate (float): A proporção da classe positiva no treinamento.
+        n_rows (int): A quantidade de linhas de treinamento.
+        profile_id (str): O hash do conteúdo do perfil.
+
+    Methods:
+        from_training: Calcula o perfil a partir dos dados de treinamento.
+        save: Grava o perfil em JSON.
+        load: Carrega o perfil de um arquivo JSON.
+        load_from_registry: Carrega o perfil de uma versão registrada.
+        load_latest: Carrega o perfil da versão do alias 'modelo' ou, sem
+            registro, o local.
+        sample: Gera uma amostra de referência a partir dos quantis.
+    """
+
+    artifact_name = "reference_profile.json"
+
+    def __init__(
+        self,
+        features: Dict[str, Dict[str, Any]],
+        target_rate: Optional[float],
+        n_rows: int,
+    ) -> None:
+        """
+        Inicializa uma instância da classe ReferenceProfile.
+
+        Args:
+            features (Dict[str, Dict[str, Any]]): O resumo de cada variável,
+                com as chaves 'quantiles', 'edges', 'counts' e 'missing'.
+            target_rate (float): A proporção da classe positiva.
+            n_rows (int): A quantidade de linhas de treinamento.
+        """
+
+        self.features = features
+        self.target_rate = target_rate
+        self.n_rows = n_rows
+        self.profile_id = hashlib.sha256(
+            json.dumps(self.to_dict(), sort_keys=True).encode()
+        ).hexdigest()
+
+    @classmethod
+    def from_training(
+        cls,
+        dataframe: pd.DataFrame,
+        target: Optional[pd.Series] = None,
+        pipe: Optional[Pipeline] = None,
+        n_bins: Optional[int] = None,
+    ) -> "ReferenceProfile":
+        """
+        Calcula o perfil a partir dos dados de treinamento.
+
+        Args:
+            dataframe (pd.DataFrame): As variáveis de entrada do treinamento.
+            target (pd.Series, opcional): O alvo do treinamento.
+            pipe (Pipeline, opcional): O pipeline treinado. Se tiver um passo
+                'discretizer', os limites dos bins dele são reutilizados.
+            n_bins (int, opcional): A quantidade de bins por quantil. Padrão é
+                o `monitoring_bins` do config.yaml.
+
+        Returns:
+            ReferenceProfile: O perfil calculado.
+        """
+
+        n_bins = n_bins or load_config_file().get("monitoring_bins", 10)
+        binner_dict = {}
+        if pipe is not None and "discretizer" in pipe.named_steps:
+            binner_dict = getattr(pipe["discretizer"], "binner_dict_", {})
+
+        features = {}
+        for feature in dataframe.columns:
+            values = dataframe[feature].to_numpy(dtype="float64")
+            if feature in binner_dict:
+                edges = np.asarray(binner_dict[feature], dtype="float64")
+            else:
+                edges = quantile_bin_edges(values, n_bins)
+            counts, missing = histogram(values, edges)
+
+            observed = values[~np.isnan(values)]
+            quantiles = (
+                np.quantile(observed, QUANTILES).tolist()
+                if observed.size
+                else []
+            )
+            features[feature] = {
+                "quantiles": quantiles,
+                "edges": edges.tolist(),
+                "counts": counts.tolist(),
+                "missing": missing,
+                "missing_rate": missing / max(len(values), 1),
+            }
+
+        target_rate = float(np.mean(target)) if target is not None else None
+        return cls(features, target_rate, len(dataframe))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converte o perfil em um dicionário serializável.
+
+        Returns:
+            Dict[str, Any]: O perfil como dicionário.
+        """
+
+        return {
+            "features": self.features,
+            "target_rate": self.target_rate,
+            "n_rows": self.n_rows,
+        }
+
+    def edges(self, feature: str) -> np.ndarray:
+        """
+        Retorna os limites dos bins de uma variável.
+
+        Args:
+            feature (str): O nome da variável.
+
+        Returns:
+            np.ndarray: Os limites dos bins.
+        """
+
+        return np.asarray(self.features[feature]["edges"], dtype="float64")
+
+    def counts(self, feature: str) -> np.ndarray:
+        """
+        Retorna as contagens de referência de uma variável.
+
+        Args:
+            feature (str): O nome da variável.
+
+        Returns:
+            np.ndarray: As contagens por bin.
+        """
+
+        return np.asarray(self.features[feature]["counts"], dtype="int64")
+
+    def save(self, path: Optional[str] = None) -> str:
+        """
+        Grava o perfil em JSON.
+
+        JSON não representa infinito, então os limites abertos são gravados
+        como null.
+
+        Args:
+            path (str, opcional): O caminho do arquivo. Padrão é o
+                `path_reference_profile` do config.yaml.
+
+        Returns:
+            str: O caminho do arquivo gravado.
+        """
+
+        path = path or get_project_path(
+            load_config_file().get("path_reference_profile")
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        profile = self.to_dict()
+        profile["features"] = {
+            feature: {
+                **summary,
+                "edges": [
+                    None if np.isinf(edge) else edge
+                    for edge in summary["edges"]
+                ],
+            }
+            for feature, summary in self.features.items()
+        }
+        with open(path, "w") as f:
+            json.dump(profile, f)
+
+        logger.info(f"Perfil de referência gravado em {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "ReferenceProfile":
+        """
+        Carrega o perfil de um arquivo JSON.
+
+        Args:
+            path (str, opcional): O caminho do arquivo. Padrão é o
+                `path_reference_profile` do config.yaml.
+
+        Returns:
+            ReferenceProfile: O perfil carregado.
+        """
+
+        path = path or get_project_path(
+            load_config_file().get("path_reference_profile")
+        )
+        with open(path) as f:
+            profile = json.load(f)
+
+        for summary in profile["features"].values():
+            edges = summary["edges"]
+            summary["edges"] = [
+                (-np.inf if i == 0 else np.inf) if edge is None else edge
+                for i, edge in enumerate(edges)
+            ]
+        return cls(
+            profile["features"], profile["target_rate"], profile["n_rows"]
+        )
+
+    @classmethod
+    def load_from_registry(
+        cls,
+        model_name: Optional[str] = None,
+        alias: str = "modelo",
+        version: Optional[str] = None,
+    ) -> "ReferenceProfile":
+        """
+        Carrega o perfil gravado junto a uma versão do modelo registrado.
+
+        O arquivo é guardado no cache de artefatos por versão, então o perfil
+        segue o alias depois de um novo treino ou de um rollback.
+
+        Args:
+            model_name (str, opcional): O nome do modelo registrado. Padrão é
+                o `model_name` do config.yaml.
+            alias (str, opcional): O alias da versão. Padrão é 'modelo'.
+            version (str, opcional): A versão. Quando informada, o alias é
+                ignorado.
+
+        Returns:
+            ReferenceProfile: O perfil carregado.
+        """
+
+        model_name = model_name or load_config_file().get("model_name")
+        model_uri = (
+            f"models:/{model_name}/{version}"
+            if version is not None
+            else f"models:/{model_name}@{alias}"
+        )
+        path = ArtifactCache().get_artifact(model_uri, cls.artifact_name)
+        return cls.load(path)
+
+    @classmethod
+    def load_latest(cls) -> "ReferenceProfile":
+        """
+        Carrega o perfil da versão apontada pelo alias 'modelo' ou, se o
+        registro não tiver o modelo nem houver versão em cache, o local.
+
+        Returns:
+            ReferenceProfile: O perfil carregado.
+        """
+
+        try:
+            return cls.load_from_registry()
+        except Exception as e:
+            path = get_project_path(
+                load_config_file().get("path_reference_profile")
+            )
+            if not os.path.exists(path):
+                raise
+            logger.warning(
+                f"Perfil do modelo registrado indisponível ({e}), usando o "
+                f"arquivo local {path}."
+            )
+            return cls.load(path)
+
+    def sample(
+        self, n_rows: Optional[int] = None, random_state: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Gera uma amostra de referência a partir dos quantis do perfil.
+
+        Cada variável é amostrada de forma independente pela inversa da
+        distribuição acumulada (interpolação entre os quantis), com a taxa
+        de ausentes do treino. Reproduz as distribuições marginais, o que
+        basta para relatórios de drift por variável.
+
+        Args:
+            n_rows (int, opcional): A quantidade de linhas. Padrão é a do
+                treinamento.
+            random_state (int, opcional): A semente. Padrão é o
+                `random_state` do config.yaml.
+
+        Returns:
+            pd.DataFrame: A amostra, com uma coluna por variável.
+        """
+
+        n_rows = n_rows or self.n_rows
+        if random_state is None:
+            random_state = load_config_file().get("random_state")
+        rng = np.random.default_rng(random_state)
+
+        columns = {}
+        for feature, summary in self.features.items():
+            values = np.full(n_rows, np.nan)
+            if summary["quantiles"]:
+                values = np.interp(
+                    rng.random(n_rows), QUANTILES, summary["quantiles"]
+                )
+                values[rng.random(n_rows) < summary["missing_rate"]] = np.nan
+            columns[feature] = values
+        return pd.DataFrame(columns)
@@ -0,0 +1,380 @@
+import argparse
+import os
+import sys
+import time
+from contextlib import nullcontext
+from typing import List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from monitoring.drift import drift_metrics, histogram
+from monitoring.labels import RealizedPerformance
+from monitoring.reference_profile import ReferenceProfile
+from predict.prediction_archive import PredictionArchive
+from utils.instrumentation import instrument
+from utils.profiler import Profiler
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+WINDOW_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class MonitoringRunner:
+    """
+    Classe para calcular as métricas de monitoramento por janela de tempo.
+
+    Cada janela encerrada é calculada uma única vez e gravada como linhas
+    (janela, métrica, variável, valor) na tabela `monitoring_metrics`, com
+    índice por métrica e variável. Dashboards e alertas consultam a série
+    histórica sem recalcular janelas antigas. O relatório HTML do Evidently é
+    um passo opcional, feito depois sobre a janela desejada.
+
+    As métricas realizadas (`realized_auc`, `realized_ks`, ...) ficam na
+    mesma tabela, ao lado do drift. Como os rótulos chegam meses depois,
+    elas são reescritas para as janelas afetadas a cada lote de rótulos
+    ingerido.
+
+    Attributes:
+        archive (PredictionArchive): O arquivo de predições.
+        window (str): A frequência das janelas (ex.: '1D').
+        interval (int): O intervalo, em segundos, entre as execuções.
+        psi_threshold (float): O PSI a partir do qual há drift.
+        realized (RealizedPerformance): Os histogramas dos rótulos.
+
+    Methods:
+        pending_windows: Lista as janelas encerradas ainda não calculadas.
+        compute_window: Calcula as métricas de uma janela.
+        run_pending: Calcula e grava todas as janelas pendentes.
+        ingest_labels: Ingere rótulos e atualiza as métricas realizadas.
+        query: Consulta a série histórica de uma métrica.
+        render_report: Gera o relatório HTML do Evidently de uma janela.
+        run_forever: Executa o runner periodicamente.
+    """
+
+    def __init__(self, archive: Optional[PredictionArchive] = None) -> None:
+        """
+        Inicializa uma instância da classe MonitoringRunner.
+
+        Args:
+            archive (PredictionArchive, opcional): O arquivo de predições.
+        """
+
+        config = load_config_file()
+        self.archive = archive or PredictionArchive()
+        self.window = config.get("monitoring_window", "1D")
+        self.interval = config.get("monitoring_interval_seconds", 3600)
+        self.psi_threshold = config.get("drift_psi_threshold", 0.2)
+        self.features = self.archive.store.feature_columns
+        self.realized = RealizedPerformance(self.archive, self.window)
+
+        conn = self.archive.store.connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS monitoring_metrics ("
+                "window_start TEXT NOT NULL, "
+                "window_end TEXT NOT NULL, "
+                "metric TEXT NOT NULL, "
+                "feature TEXT NOT NULL, "
+                "value REAL, "
+                "PRIMARY KEY (window_start, metric, feature))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_monitoring_metrics_metric "
+                "ON monitoring_metrics (metric, feature, window_start)"
+            )
+        conn.close()
+
+    def pending_windows(
+        self, now: Optional[pd.Timestamp] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Lista as janelas encerradas ainda não calculadas.
+
+        Args:
+            now (pd.Timestamp, opcional): O instante atual em UTC.
+
+        Returns:
+            List[Tuple[str, str]]: O início e o fim de cada janela pendente.
+        """
+
+        now = now or pd.Timestamp.now(tz="UTC").tz_localize(None)
+        last_closed = now.floor(self.window)
+
+        conn = self.archive.store.connect()
+        row = conn.execute(
+            "SELECT MAX(window_end) FROM monitoring_metrics "
+            "WHERE metric = 'n_rows'"
+        ).fetchone()
+        conn.close()
+
+        if row[0] is not None:
+            first = pd.Timestamp(row[0])
+        else:
+            oldest = self.archive.min_scored_at()
+            if oldest is None:
+                return []
+            first = pd.Timestamp(oldest).floor(self.window)
+
+        starts = pd.date_range(first, last_closed, freq=self.window)
+        starts = starts[starts < last_closed]
+        offset = pd.tseries.frequencies.to_offset(self.window)
+        return [
+            (
+                start.strftime(WINDOW_FORMAT),
+                (start + offset).strftime(WINDOW_FORMAT),
+            )
+            for start in starts
+        ]
+
+    @instrument()
+    def compute_window(
+        self, start: str, end: str, profile: ReferenceProfile
+    ) -> pd.DataFrame:
+        """
+        Calcula as métricas de uma janela.
+
+        São calculados o resumo do conjunto (linhas, média e quantis de
+        `preds_prob`), a taxa de ausentes por variável e o drift (PSI, KS e
+        Wasserstein) por variável contra o perfil de referência, além das
+        métricas realizadas dos rótulos já recebidos.
+
+        Args:
+            start (str): O início da janela (inclusivo).
+            end (str): O fim da janela (exclusivo).
+            profile (ReferenceProfile): O perfil de referência.
+
+        Returns:
+            pd.DataFrame: As métricas no formato (metric, feature, value).
+        """
+
+        df_cur = self.archive.read(
+            start=start, end=end, columns=self.features + ["preds_prob"]
+        )
+        rows = [("n_rows", "", float(len(df_cur)))]
+        if df_cur.empty:
+            return pd.DataFrame(rows, columns=["metric", "feature", "value"])
+
+        preds = df_cur["preds_prob"].astype("float64")
+        rows += [
+            ("preds_prob_mean", "", preds.mean()),
+            ("preds_prob_p50", "", preds.quantile(0.5)),
+            ("preds_prob_p90", "", preds.quantile(0.9)),
+        ]
+
+        missing = df_cur[self.features].isna()
+        rows.append(("dataset_missing_rate", "", missing.values.mean()))
+
+        drifted = 0
+        for feature in self.features:
+            values = df_cur[feature].to_numpy(dtype="float64")
+            counts, _ = histogram(values, profile.edges(feature))
+            metrics = drift_metrics(
+                profile.counts(feature), counts, profile.edges(feature)
+            )
+            drifted += metrics["psi"] >= self.psi_threshold
+
+            rows.append(("missing_rate", feature, missing[feature].mean()))
+            rows.append(("mean", feature, np.nanmean(values)))
+            rows += [(name, feature, value) for name, value in metrics.items()]
+
+        rows.append(("drift_share", "", drifted / len(self.features)))
+        return pd.concat(
+            [
+                pd.DataFrame(rows, columns=["metric", "feature", "value"]),
+                self.realized.window_metrics(start, end),
+            ],
+            ignore_index=True,
+        )
+
+    def run_pending(self, now: Optional[pd.Timestamp] = None) -> int:
+        """
+        Calcula e grava todas as janelas pendentes.
+
+        Cada janela é gravada em sua própria transação, então uma execução
+        interrompida continua da janela seguinte à última gravada.
+
+        Args:
+            now (pd.Timestamp, opcional): O instante atual em UTC.
+
+        Returns:
+            int: A quantidade de janelas calculadas.
+        """
+
+        windows = self.pending_windows(now)
+        if not windows:
+            logger.info("Nenhuma janela pendente de monitoramento.")
+            return 0
+
+        profile = ReferenceProfile.load_latest()
+        for start, end in windows:
+            logger.info(f"Calculando as métricas da janela {start} - {end}.")
+            df_metrics = self.compute_window(start, end, profile)
+            df_metrics.insert(0, "window_end", end)
+            df_metrics.insert(0, "window_start", start)
+
+            conn = self.archive.store.connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO monitoring_metrics "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    df_metrics.itertuples(index=False, name=None),
+                )
+            conn.close()
+
+        return len(windows)
+
+    @instrument()
+    def ingest_labels(self, df_outcomes: pd.DataFrame) -> List[str]:
+        """
+        Ingere um lote de rótulos e atualiza as métricas realizadas.
+
+        Apenas as janelas que receberam rótulos são recalculadas, a partir
+        dos seus histogramas.
+
+        Args:
+            df_outcomes (pd.DataFrame): As colunas `prediction_id`, `label`
+                e, opcionalmente, `labeled_at`.
+
+        Returns:
+            List[str]: O início das janelas atualizadas.
+        """
+
+        windows = self.realized.ingest(df_outcomes)
+        offset = pd.tseries.frequencies.to_offset(self.window)
+
+        conn = self.archive.store.connect()
+        with conn:
+            for start in windows:
+                end = (pd.Timestamp(start) + offset).strftime(WINDOW_FORMAT)
+                df_metrics = self.realized.window_metrics(start, end)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO monitoring_metrics "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (start, end, metric, feature, value)
+                        for metric, feature, value in df_metrics.itertuples(
+                            index=False, name=None
+                        )
+                    ],
+                )
+        conn.close()
+        return windows
+
+    def query(
+        self,
+        metric: str,
+        feature: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Consulta a série histórica de uma métrica.
+
+        Args:
+            metric (str): O nome da métrica (ex.: 'psi', 'n_rows').
+            feature (str, opcional): A variável. Padrão são todas.
+            start (str, opcional): Início do período (inclusivo).
+            end (str, opcional): Fim do período (exclusivo).
+
+        Returns:
+            pd.DataFrame: As linhas da métrica ordenadas por janela.
+        """
+
+        conditions, params = ["metric = ?"], [metric]
+        if feature is not None:
+            conditions.append("feature = ?")
+            params.append(feature)
+        if start is not None:
+            conditions.append("window_start >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("window_start < ?")
+            params.append(end)
+
+        conn = self.archive.store.connect()
+        df_metric = pd.read_sql_query(
+            "SELECT window_start, window_end, feature, value "
+            f"FROM monitoring_metrics WHERE {' AND '.join(conditions)} "
+            "ORDER BY window_start, feature",
+            conn,
+            params=params,
+        )
+        conn.close()
+        return df_metric
+
+    def render_report(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        report_path: Optional[str] = None,
+    ) -> None:
+        """
+        Gera o relatório HTML do Evidently de uma janela.
+
+        Args:
+            start (str, opcional): Início da janela (inclusivo).
+            end (str, opcional): Fim da janela (exclusivo).
+            report_path (str, opcional): Onde gravar o HTML.
+        """
+
+        from monitoring.monitor import ModelMonitoring
+
+        ModelMonitoring().run(start=start, end=end, report_path=report_path)
+
+    def run_forever(self) -> None:
+        """
+        Executa o runner periodicamente, a cada `interval` segundos.
+        """
+
+        logger.info(f"Monitoramento agendado a cada {self.interval}s.")
+        while True:
+            started = time.monotonic()
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Monitoramento falhou: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Calcula as janelas pendentes e termina.",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Gera o relatório HTML da última janela calculada.",
+    )
+    parser.add_argument(
+        "--labels",
+        help="CSV de rótulos (prediction_id, label) a ser ingerido.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Perfila a execução e grava o perfil em path_profiles.",
+    )
+    args = parser.parse_args()
+
+    runner = MonitoringRunner()
+    with Profiler("monitoring") if args.profile else nullcontext():
+        if args.labels:
+            runner.ingest_labels(pd.read_csv(args.labels))
+        elif args.once or args.report:
+            runner.run_pending()
+            if args.report:
+                last = runner.query("n_rows").tail(1)
+                if not last.empty:
+                    runner.render_report(
+                        last["window_start"].iloc[0],
+                        last["window_end"].iloc[0],
+                    )
+        else:
+            runner.run_forever()
@@ -0,0 +1,432 @@
+import json
+import os
+import sqlite3
+import sys
+from typing import Any, Callable, Dict, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+PREDS_EDGES = np.linspace(0, 1, 21)
+
+
+class TDigest:
+    """
+    Sketch de quantis t-digest, mesclável e serializável.
+
+    Os valores são agrupados em centroides (média e peso) cujo tamanho é
+    limitado pela função de escala k1, com centroides pequenos nas caudas e
+    maiores no centro da distribuição. A compressão é vetorizada: cada ponto
+    ordenado recebe o índice inteiro de k no seu quantil, e pontos com o
+    mesmo índice viram um centroide. Valores repetidos com massa relevante
+    formam centroides exatos, preservando variáveis discretas. Dois sketches
+    se mesclam concatenando os centroides e comprimindo de novo.
+
+    Attributes:
+        compression (float): O parâmetro delta; cerca de delta/2 centroides.
+        means (np.ndarray): As médias dos centroides, em ordem crescente.
+        weights (np.ndarray): Os pesos dos centroides.
+        atoms (np.ndarray): Indica os centroides de um único valor repetido.
+
+    Methods:
+        update: Adiciona valores ao sketch.
+        merge: Mescla outro sketch a este.
+        quantile: Estima o valor de um quantil.
+        cdf: Estima a proporção de valores menores ou iguais a x.
+    """
+
+    def __init__(
+        self,
+        compression: float = 200,
+        means: Optional[np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+        atoms: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe TDigest.
+
+        Args:
+            compression (float, opcional): O parâmetro delta. Padrão é 200.
+            means (np.ndarray, opcional): As médias dos centroides.
+            weights (np.ndarray, opcional): Os pesos dos centroides.
+            atoms (np.ndarray, opcional): Indica os centroides formados por um
+                único valor repetido.
+        """
+
+        self.compression = compression
+        self.means = np.asarray(
+            means if means is not None else [], dtype="float64"
+        )
+        self.weights = np.asarray(
+            weights if weights is not None else [], dtype="float64"
+        )
+        self.atoms = np.asarray(
+            atoms if atoms is not None else [False] * self.means.size,
+            dtype="bool",
+        )
+
+    @property
+    def count(self) -> float:
+        """
+        Retorna a quantidade de valores resumidos no sketch.
+
+        Returns:
+            float: A soma dos pesos dos centroides.
+        """
+
+        return float(self.weights.sum())
+
+    def _compress(
+        self, means: np.ndarray, weights: np.ndarray, atoms: np.ndarray
+    ) -> None:
+        """
+        Agrupa os centroides respeitando a função de escala k1.
+
+        Args:
+            means (np.ndarray): As médias dos centroides a agrupar.
+            weights (np.ndarray): Os pesos dos centroides a agrupar.
+            atoms (np.ndarray): Indica os centroides de um único valor.
+        """
+
+        if means.size == 0:
+            self.means, self.weights, self.atoms = means, weights, atoms
+            return
+
+        order = np.argsort(means, kind="mergesort")
+        means, weights, atoms = means[order], weights[order], atoms[order]
+
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        cluster = np.floor(k - k[0]).astype("int64")
+        boundary = np.r_[True, cluster[1:] != cluster[:-1]]
+
+        # um valor repetido com massa de pelo menos 1/delta (ex.: zero nas
+        # contagens de atraso) vira um centroide exato, sem misturar vizinhos
+        change = np.r_[True, means[1:] != means[:-1]]
+        run_starts = np.flatnonzero(change)
+        run = np.cumsum(change) - 1
+        run_weight = np.add.reduceat(weights, run_starts)
+        run_atom = np.logical_and.reduceat(atoms, run_starts)
+        heavy = (run_atom & (run_weight * self.compression >= total))[run]
+        boundary = (boundary & (change | ~heavy)) | (
+            change & (heavy | np.r_[False, heavy[:-1]])
+        )
+        starts = np.flatnonzero(boundary)
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+        changes = np.add.reduceat(change.astype("int64"), starts)
+        self.atoms = np.logical_and.reduceat(atoms, starts) & (
+            changes == change[starts]
+        )
+
+    def update(self, values: np.ndarray) -> "TDigest":
+        """
+        Adiciona valores ao sketch. Valores NaN são ignorados.
+
+        Args:
+            values (np.ndarray): Os valores a adicionar.
+
+        Returns:
+            TDigest: O próprio sketch.
+        """
+
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        self._compress(
+            np.concatenate([self.means, values]),
+            np.concatenate([self.weights, np.ones(values.size)]),
+            np.concatenate([self.atoms, np.ones(values.size, dtype="bool")]),
+        )
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """
+        Mescla outro sketch a este.
+
+        Args:
+            other (TDigest): O sketch a mesclar.
+
+        Returns:
+            TDigest: O próprio sketch.
+        """
+
+        self._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+            np.concatenate([self.atoms, other.atoms]),
+        )
+        return self
+
+    def quantile(self, q: np.ndarray) -> np.ndarray:
+        """
+        Estima o valor de um ou mais quantis.
+
+        Args:
+            q (np.ndarray): Os quantis, entre 0 e 1.
+
+        Returns:
+            np.ndarray: Os valores estimados.
+        """
+
+        if self.means.size == 0:
+            return np.full(np.shape(q), np.nan)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(np.asarray(q) * self.count, centers, self.means)
+
+    def cdf(self, x: np.ndarray) -> np.ndarray:
+        """
+        Estima a proporção de valores menores ou iguais a x.
+
+        A estimativa é uma função degrau sobre as médias dos centroides, o
+        que preserva a massa de variáveis discretas (ex.: contagens de
+        atraso).
+
+        Args:
+            x (np.ndarray): Os pontos de avaliação.
+
+        Returns:
+            np.ndarray: As proporções acumuladas.
+        """
+
+        if self.means.size == 0:
+            return np.full(np.shape(x), np.nan)
+        cumulative = np.r_[0.0, np.cumsum(self.weights)]
+        index = np.searchsorted(self.means, x, side="right")
+        return cumulative[index] / self.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converte o sketch em um dicionário serializável.
+
+        Returns:
+            Dict[str, Any]: As médias e os pesos dos centroides.
+        """
+
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "atoms": self.atoms.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        """
+        Cria um sketch a partir do dicionário de `to_dict`.
+
+        Args:
+            data (Dict[str, Any]): O sketch serializado.
+
+        Returns:
+            TDigest: O sketch.
+        """
+
+        return cls(
+            data["compression"], data["means"], data["weights"], data["atoms"]
+        )
+
+
+def summarize(dataframe: pd.DataFrame, features: list, compression: float):
+    """
+    Resume um bloco de predições em sketches mescláveis.
+
+    Args:
+        dataframe (pd.DataFrame): As variáveis de entrada e `preds_prob`.
+        features (list): As variáveis a resumir.
+        compression (float): O parâmetro delta dos t-digests.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: O sketch serializado de cada variável e o
+            histograma de `preds_prob`.
+    """
+
+    sketches = {}
+    for feature in features:
+        values = dataframe[feature].to_numpy(dtype="float64")
+        digest = TDigest(compression).update(values)
+        sketches[feature] = {
+            "digest": digest.to_dict(),
+            "missing": int(np.isnan(values).sum()),
+        }
+
+    preds = dataframe["preds_prob"].to_numpy(dtype="float64")
+    observed = preds[~np.isnan(preds)]
+    counts, _ = np.histogram(observed, bins=PREDS_EDGES)
+    sketches["preds_prob"] = {
+        "counts": counts.tolist(),
+        "sum": float(observed.sum()),
+        "missing": int(preds.size - observed.size),
+    }
+    return sketches
+
+
+def merge_sketches(
+    left: Dict[str, Any], right: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Mescla dois sketches serializados do mesmo tipo.
+
+    Args:
+        left (Dict[str, Any]): O primeiro sketch.
+        right (Dict[str, Any]): O segundo sketch.
+
+    Returns:
+        Dict[str, Any]: O sketch mesclado.
+    """
+
+    if "digest" in left:
+        digest = TDigest.from_dict(left["digest"]).merge(
+            TDigest.from_dict(right["digest"])
+        )
+        return {
+            "digest": digest.to_dict(),
+            "missing": left["missing"] + right["missing"],
+        }
+
+    return {
+        "counts": (
+            np.asarray(left["counts"]) + np.asarray(right["counts"])
+        ).tolist(),
+        "sum": left["sum"] + right["sum"],
+        "missing": left["missing"] + right["missing"],
+    }
+
+
+class SketchStore:
+    """
+    Classe dos sketches de drift atualizados na escrita das predições.
+
+    Cada lote gravado pela PredictionStore é resumido em t-digests por
+    variável, contadores de ausentes e um histograma de `preds_prob`, somados
+    ao bucket de tempo correspondente na tabela `prediction_sketches`. Como
+    os sketches são mescláveis, vários processos podem gravar no mesmo
+    bucket: a transação do SQLite serializa a leitura e a mescla.
+
+    Attributes:
+        connect (Callable[[], sqlite3.Connection]): Abre uma conexão.
+        features (list): As variáveis resumidas.
+        bucket (str): A frequência dos buckets (ex.: '1min').
+        compression (float): O parâmetro delta dos t-digests.
+
+    Methods:
+        update: Soma um lote de predições aos buckets.
+        read: Lê os sketches mesclados de uma janela.
+    """
+
+    def __init__(
+        self, connect: Callable[[], sqlite3.Connection], features: list
+    ) -> None:
+        """
+        Inicializa uma instância da classe SketchStore.
+
+        Args:
+            connect (Callable[[], sqlite3.Connection]): Abre uma conexão com a
+                base de predições.
+            features (list): As variáveis resumidas.
+        """
+
+        config = load_config_file()
+        self.connect = connect
+        self.features = features
+        self.bucket = config.get("sketch_bucket", "1min")
+        self.compression = config.get("sketch_compression", 200)
+
+        conn = self.connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_sketches ("
+                "bucket_start TEXT NOT NULL, "
+                "name TEXT NOT NULL, "
+                "sketch TEXT NOT NULL, "
+                "PRIMARY KEY (bucket_start, name))"
+            )
+        conn.close()
+
+    def update(self, dataframe: pd.DataFrame) -> None:
+        """
+        Soma um lote de predições aos buckets de tempo.
+
+        Args:
+            dataframe (pd.DataFrame): As predições, com `scored_at`.
+        """
+
+        buckets = (
+            pd.to_datetime(dataframe["scored_at"])
+            .dt.floor(self.bucket)
+            .dt.strftime("%Y-%m-%d %H:%M:%S")
+        )
+        summaries = {
+            bucket_start: summarize(df_bucket, self.features, self.compression)
+            for bucket_start, df_bucket in dataframe.groupby(buckets)
+        }
+
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for bucket_start, sketches in summaries.items():
+                stored = dict(
+                    conn.execute(
+                        "SELECT name, sketch FROM prediction_sketches "
+                        "WHERE bucket_start = ?",
+                        (bucket_start,),
+                    ).fetchall()
+                )
+                rows = []
+                for name, sketch in sketches.items():
+                    if name in stored:
+                        sketch = merge_sketches(
+                            json.loads(stored[name]), sketch
+                        )
+                    rows.append((bucket_start, name, json.dumps(sketch)))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO prediction_sketches "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def read(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Lê os sketches de uma janela, mesclando os buckets.
+
+        Args:
+            start (str, opcional): Início da janela (inclusivo).
+            end (str, opcional): Fim da janela (exclusivo).
+
+        Returns:
+            Dict[str, Dict[str, Any]]: O sketch mesclado de cada variável e de
+                `preds_prob`.
+        """
+
+        conn = self.connect()
+        rows = conn.execute(
+            "SELECT name, sketch FROM prediction_sketches "
+            "WHERE bucket_start >= ? AND bucket_start < ?",
+            (start or "", end or "9999"),
+        ).fetchall()
+        conn.close()
+
+        merged = {}
+        for name, sketch in rows:
+            sketch = json.loads(sketch)
+            merged[name] = (
+                merge_sketches(merged[name], sketch)
+                if name in merged
+                else sketch
+            )
+        return merged
@@ -0,0 +1,434 @@
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../src"))
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import structlog
+from predict.prediction_store import PredictionStore
+from utils.artifact_cache import ArtifactCache
+from utils.fingerprint import file_fingerprint
+from utils.instrumentation import instrument
+from utils.profiler import Profiler
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+# modelo carregado uma única vez em cada processo do pool
+_MODEL: Dict[str, Any] = {}
+
+
+def shard_offsets(path: str, shard_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Divide um CSV em faixas de bytes alinhadas ao fim das linhas.
+
+    Cada faixa começa logo após uma quebra de linha, então nenhuma linha é
+    dividida entre shards. Supõe que os campos não contêm quebras de linha.
+
+    Args:
+        path (str): O arquivo CSV.
+        shard_bytes (int): O tamanho aproximado de cada shard.
+
+    Returns:
+        List[Tuple[int, int]]: O início e o fim (exclusivo) de cada shard,
+            sem o cabeçalho.
+    """
+
+    size = os.path.getsize(path)
+    offsets = []
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + shard_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+
+def _init_worker(model_path: str) -> None:
+    """
+    Carrega o pipeline no processo do pool.
+
+    Args:
+        model_path (str): O diretório local do modelo.
+    """
+
+    import mlflow.sklearn
+
+    _MODEL["pipe"] = mlflow.sklearn.load_model(model_path)
+
+
+def _score_shard(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pontua um shard e grava o resultado em Parquet.
+
+    O arquivo do shard é gravado com um nome temporário e renomeado, e só
+    então o checkpoint é criado, então um shard interrompido é refeito por
+    inteiro na retomada. Com a captura ligada, as predições do shard são
+    gravadas na base de predições com a chave `<job>/<shard>` e a saída
+    recebe o `prediction_id` de cada linha. A chave é gravada na mesma
+    transação das predições, então um shard interrompido depois da gravação
+    reaproveita os ids já gravados na retomada, sem duplicar as linhas.
+
+    Args:
+        task (Dict[str, Any]): O shard, o arquivo de entrada, o cabeçalho,
+            as variáveis, os diretórios de saída, se as predições são
+            capturadas e o id do job.
+
+    Returns:
+        Dict[str, Any]: O shard, a quantidade de linhas e o tempo gasto.
+    """
+
+    started = time.perf_counter()
+    with open(task["input_path"], "rb") as f:
+        f.seek(task["start"])
+        chunk = f.read(task["end"] - task["start"])
+    # tipos fixos, para que as colunas mantidas tenham o mesmo tipo em
+    # todos os shards em vez do inferido em cada um
+    df_shard = pd.read_csv(
+        io.BytesIO(task["header"] + chunk),
+        dtype={
+            **{column: str for column in task["keep_columns"]},
+            **{column: "float64" for column in task["features"]},
+        },
+    )
+
+    probabilities = _MODEL["pipe"].predict_proba(df_shard[task["features"]])
+    df_scores = df_shard[task["keep_columns"]].copy()
+    df_scores.insert(0, "row", range(len(df_shard)))
+    df_scores["preds_prob"] = probabilities[:, 1]
+    if task["capture"]:
+        df_scores.insert(
+            1,
+            "prediction_id",
+            PredictionStore().append(
+                df_shard[task["features"]].assign(
+                    preds_prob=probabilities[:, 1]
+                ),
+                batch_key=f"{task['job_id']}/{task['shard']}",
+            ),
+        )
+
+    shard_dir = os.path.join(task["output_dir"], f"shard={task['shard']:05d}")
+    os.makedirs(shard_dir, exist_ok=True)
+    tmp_path = os.path.join(shard_dir, ".part-0.parquet.tmp")
+    pq.write_table(
+        pa.Table.from_pandas(df_scores, preserve_index=False), tmp_path
+    )
+    os.replace(tmp_path, os.path.join(shard_dir, "part-0.parquet"))
+
+    result = {
+        "shard": task["shard"],
+        "rows": len(df_shard),
+        "seconds": time.perf_counter() - started,
+    }
+    with open(task["checkpoint"], "w") as f:
+        json.dump(result, f)
+    return result
+
+
+class BatchScorer:
+    """
+    Classe para pontuar arquivos CSV grandes em lote.
+
+    O arquivo é dividido em shards por faixa de bytes, sem ser carregado
+    inteiro na memória. Os shards são pontuados por um pool de processos, cada
+    um com o pipeline carregado uma única vez, e as probabilidades são
+    gravadas em Parquet particionado por shard (`shard=NNNNN`), na ordem do
+    arquivo. Cada shard concluído deixa um checkpoint, então um job
+    interrompido continua dos shards pendentes.
+
+    Attributes:
+        input_path (str): O CSV de entrada.
+        output_dir (str): O diretório do Parquet de saída.
+        model_uri (str): O URI do modelo no registro.
+        shard_bytes (int): O tamanho aproximado de cada shard.
+        n_jobs (int): A quantidade de processos.
+        keep_columns (List[str]): Colunas de entrada copiadas para a saída.
+        capture (bool): Se as predições são gravadas na base de predições.
+        resolved_uri (str): O URI da versão do modelo fixada no plano.
+
+    Methods:
+        plan: Calcula ou recupera a divisão do arquivo em shards.
+        run: Pontua os shards pendentes.
+        read: Lê as probabilidades gravadas, na ordem do arquivo.
+    """
+
+    def __init__(
+        self,
+        input_path: str,
+        output_dir: Optional[str] = None,
+        model_uri: Optional[str] = None,
+        shard_bytes: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        keep_columns: Optional[List[str]] = None,
+        capture: bool = False,
+    ) -> None:
+        """
+        Inicializa uma instância da classe BatchScorer.
+
+        Args:
+            input_path (str): O CSV de entrada.
+            output_dir (str, opcional): O diretório de saída. Padrão é o
+                `path_batch_scores` do config.yaml, com o nome do arquivo.
+            model_uri (str, opcional): O URI do modelo. Padrão é a versão
+                apontada pelo alias 'modelo'.
+            shard_bytes (int, opcional): O tamanho de cada shard. Padrão é o
+                `batch_score_shard_mb` do config.yaml.
+            n_jobs (int, opcional): A quantidade de processos. Padrão é o
+                `batch_score_n_jobs` do config.yaml ou a quantidade de CPUs.
+            keep_columns (List[str], opcional): Colunas de entrada copiadas
+                para a saída, como identificadores de clientes.
+            capture (bool, opcional): Grava as predições na base de
+                predições e o `prediction_id` de cada linha na saída, para a
+                ingestão dos rótulos. Padrão é False.
+        """
+
+        config = load_config_file()
+        self.input_path = os.path.abspath(input_path)
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        self.output_dir = output_dir or get_project_path(
+            config.get("path_batch_scores", "data/scores"), name
+        )
+        self.model_uri = (
+            model_uri or f"models:/{config.get('model_name')}@modelo"
+        )
+        self.shard_bytes = shard_bytes or (
+            config.get("batch_score_shard_mb", 64) * 1024**2
+        )
+        self.n_jobs = (
+            n_jobs or config.get("batch_score_n_jobs") or os.cpu_count()
+        )
+        self.keep_columns = keep_columns or []
+        self.capture = capture
+        self.features = [
+            column
+            for column in config.get("columns_to_use")
+            if column != config.get("target_name")
+        ]
+        self.resolved_uri: Optional[str] = None
+        self._job_id: Optional[str] = None
+        self._checkpoint_dir = os.path.join(self.output_dir, "_checkpoints")
+
+    def plan(self, restart: bool = False) -> List[Tuple[int, int]]:
+        """
+        Calcula ou recupera a divisão do arquivo em shards.
+
+        O plano é gravado junto à saída, com a versão do modelo resolvida a
+        partir do alias na criação do plano. Numa retomada, ele só é
+        reutilizado se o conteúdo do arquivo de entrada (ver
+        `file_fingerprint`), o tamanho dos shards e a captura forem os
+        mesmos, e os shards pendentes são pontuados pela versão gravada no
+        plano, mesmo que o alias tenha mudado. O alias só é resolvido de
+        novo com `restart=True`.
+
+        Args:
+            restart (bool, opcional): Descarta o plano e os checkpoints
+                anteriores. Padrão é False.
+
+        Returns:
+            List[Tuple[int, int]]: O início e o fim de cada shard.
+
+        Raises:
+            ValueError: Se houver um job anterior com outro arquivo, outro
+                tamanho de shard ou outra captura.
+        """
+
+        os.makedirs(self._checkpoint_dir, exist_ok=True)
+        plan_path = os.path.join(self.output_dir, "_plan.json")
+        source = {
+            "input_path": self.input_path,
+            "size": os.path.getsize(self.input_path),
+            "fingerprint": file_fingerprint(self.input_path),
+            "shard_bytes": self.shard_bytes,
+            "capture": self.capture,
+        }
+
+        if os.path.exists(plan_path) and not restart:
+            with open(plan_path) as f:
+                plan = json.load(f)
+            stored = dict(plan["source"])
+            model_uri = stored.pop("model_uri", None)
+            if stored != source or model_uri is None or "job_id" not in plan:
+                raise ValueError(
+                    f"{self.output_dir} tem um job de outro arquivo ou "
+                    "configuração. Use restart=True para descartá-lo."
+                )
+            self.resolved_uri = model_uri
+            self._job_id = plan["job_id"]
+            return [tuple(offsets) for offsets in plan["offsets"]]
+
+        name, version = ArtifactCache().resolve(self.model_uri)
+        self.resolved_uri = f"models:/{name}/{version}"
+        self._job_id = uuid.uuid4().hex
+
+        shutil.rmtree(self._checkpoint_dir)
+        os.makedirs(self._checkpoint_dir)
+        for name in os.listdir(self.output_dir):
+            if name.startswith("shard="):
+                shutil.rmtree(os.path.join(self.output_dir, name))
+        offsets = shard_offsets(self.input_path, self.shard_bytes)
+        with open(plan_path, "w") as f:
+            json.dump(
+                {
+                    "source": {**source, "model_uri": self.resolved_uri},
+                    "job_id": self._job_id,
+                    "offsets": offsets,
+                },
+                f,
+            )
+        return offsets
+
+    @instrument()
+    def run(self, restart: bool = False) -> Dict[str, float]:
+        """
+        Pontua os shards pendentes.
+
+        Args:
+            restart (bool, opcional): Descarta o progresso anterior e pontua
+                o arquivo inteiro. Padrão é False.
+
+        Returns:
+            Dict[str, float]: Shards e linhas pontuados, o tempo total e as
+                linhas por segundo.
+        """
+
+        offsets = self.plan(restart=restart)
+        with open(self.input_path, "rb") as f:
+            header = f.readline()
+
+        tasks = []
+        for shard, (start, end) in enumerate(offsets):
+            checkpoint = os.path.join(
+                self._checkpoint_dir, f"shard-{shard:05d}.done"
+            )
+            if os.path.exists(checkpoint):
+                continue
+            tasks.append(
+                {
+                    "shard": shard,
+                    "start": start,
+                    "end": end,
+                    "header": header,
+                    "input_path": self.input_path,
+                    "features": self.features,
+                    "keep_columns": self.keep_columns,
+                    "capture": self.capture,
+                    "job_id": self._job_id,
+                    "output_dir": self.output_dir,
+                    "checkpoint": checkpoint,
+                }
+            )
+
+        logger.info(
+            f"{len(offsets) - len(tasks)} de {len(offsets)} shards já "
+            f"pontuados, {len(tasks)} pendentes."
+        )
+        if not tasks:
+            return {"shards": 0, "rows": 0, "seconds": 0.0, "rows_per_s": 0.0}
+
+        model_path = ArtifactCache().get(self.resolved_uri)
+        started = time.perf_counter()
+        rows = 0
+        with ProcessPoolExecutor(
+            max_workers=self.n_jobs,
+            initializer=_init_worker,
+            initargs=(model_path,),
+        ) as executor:
+            futures = [executor.submit(_score_shard, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows += future.result()["rows"]
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"Shard {done}/{len(tasks)}: {rows} linhas, "
+                    f"{rows / elapsed:,.0f} linhas/s."
+                )
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "shards": len(tasks),
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_s": rows / elapsed,
+        }
+        logger.info(f"Pontuação em lote terminou: {summary}")
+        return summary
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Lê as probabilidades gravadas, na ordem do arquivo de entrada.
+
+        Args:
+            columns (List[str], opcional): As colunas lidas. Padrão são
+                todas.
+
+        Returns:
+            pd.DataFrame: As probabilidades e as colunas mantidas.
+        """
+
+        dataset = ds.dataset(
+            self.output_dir, format="parquet", partitioning="hive"
+        )
+        df_scores = dataset.to_table().to_pandas()
+        df_scores = df_scores.sort_values(["shard", "row"], ignore_index=True)
+        return df_scores[columns] if columns else df_scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", help="O CSV a ser pontuado.")
+    parser.add_argument("--output-dir", help="O diretório de saída.")
+    parser.add_argument("--model-uri", help="O URI do modelo no registro.")
+    parser.add_argument("--n-jobs", type=int, help="Quantidade de processos.")
+    parser.add_argument(
+        "--shard-mb", type=int, help="Tamanho aproximado de cada shard."
+    )
+    parser.add_argument(
+        "--keep-columns",
+        nargs="*",
+        help="Colunas de entrada copiadas para a saída.",
+    )
+    parser.add_argument(
+        "--capture",
+        action="store_true",
+        help="Grava as predições na base de predições.",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Descarta o progresso anterior.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Perfila a pontuação e grava o perfil em path_profiles.",
+    )
+    args = parser.parse_args()
+
+    scorer = BatchScorer(
+        args.input_path,
+        output_dir=args.output_dir,
+        model_uri=args.model_uri,
+        shard_bytes=args.shard_mb * 1024**2 if args.shard_mb else None,
+        n_jobs=args.n_jobs,
+        keep_columns=args.keep_columns,
+        capture=args.capture,
+    )
+    with Profiler("batch_score") if args.profile else nullcontext():
+        scorer.run(restart=args.restart)
@@ -0,0 +1,217 @@
+import os
+import sys
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+logger = structlog.getLogger()
+
+
+class PipelineExplainer:
+    """
+    Classe para explicar as predições do pipeline linear em forma fechada.
+
+    Para um modelo linear, o valor SHAP (intervencional) de cada variável em
+    log-odds é o coeficiente vezes a variável transformada centrada na média
+    do fundo: `phi = coef * (z - E[z])`. Como os passos de imputação,
+    discretização e padronização transformam cada variável isoladamente, a
+    contribuição da coluna transformada é a contribuição da variável
+    original. O lote inteiro é explicado com uma única operação matricial.
+
+    Quando o último passo de pré-processamento é um StandardScaler ajustado
+    em todas as variáveis, a média de treino das colunas transformadas é
+    zero e nenhum dado de fundo é necessário.
+
+    Attributes:
+        pipe (Pipeline): O pipeline treinado.
+        features (List[str]): As variáveis explicadas.
+        coef (np.ndarray): Os coeficientes do modelo.
+        center (np.ndarray): A média das variáveis transformadas no fundo.
+        expected_value (float): O log-odds médio no fundo.
+
+    Methods:
+        contributions: Calcula as contribuições de cada variável.
+        reason_codes: Lista as variáveis que mais aumentam o risco.
+        explain: Calcula contribuições e reason codes.
+        validate: Compara as contribuições com o LinearExplainer do shap.
+    """
+
+    def __init__(
+        self, pipe: Pipeline, background: Optional[pd.DataFrame] = None
+    ) -> None:
+        """
+        Inicializa uma instância da classe PipelineExplainer.
+
+        Args:
+            pipe (Pipeline): O pipeline treinado, com um modelo linear no
+                último passo.
+            background (pd.DataFrame, opcional): Os dados de fundo, nas
+                variáveis originais. Padrão é a média de treino implícita na
+                padronização.
+
+        Raises:
+            ValueError: Se o fundo não for informado e não puder ser
+                deduzido do pipeline.
+        """
+
+        self.pipe = pipe
+        self._preprocess = pipe[:-1]
+        model = pipe.steps[-1][1]
+        self.coef = np.ravel(model.coef_)
+        self.features = list(
+            getattr(model, "feature_names_in_", pipe.feature_names_in_)
+        )
+
+        if background is not None:
+            self.center = self._transform(background).mean(axis=0)
+        elif self._is_standardized():
+            self.center = np.zeros_like(self.coef)
+        else:
+            raise ValueError(
+                "O pipeline não termina em uma padronização de todas as "
+                "variáveis: informe os dados de fundo."
+            )
+        self.expected_value = float(
+            np.ravel(model.intercept_)[0] + self.coef @ self.center
+        )
+
+    def _is_standardized(self) -> bool:
+        """
+        Verifica se o último pré-processamento padroniza todas as variáveis.
+
+        Returns:
+            bool: Se as variáveis transformadas têm média de treino zero.
+        """
+
+        if not len(self._preprocess):
+            return False
+        scaler = self._preprocess.steps[-1][1]
+        transformer = getattr(scaler, "transformer_", scaler)
+        variables = getattr(scaler, "variables_", self.features)
+        return (
+            isinstance(transformer, StandardScaler)
+            and transformer.with_mean
+            and set(self.features) <= set(variables)
+        )
+
+    def _transform(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Aplica o pré-processamento e ordena as colunas como no modelo.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados originais.
+
+        Returns:
+            np.ndarray: As variáveis transformadas.
+        """
+
+        transformed = self._preprocess.transform(dataframe)
+        if isinstance(transformed, pd.DataFrame):
+            transformed = transformed[self.features]
+        return np.asarray(transformed, dtype="float64")
+
+    def contributions(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calcula a contribuição de cada variável para o log-odds.
+
+        A soma das contribuições de uma linha mais `expected_value` é o
+        log-odds previsto pelo modelo.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados originais.
+
+        Returns:
+            pd.DataFrame: As contribuições, uma coluna por variável.
+        """
+
+        values = (self._transform(dataframe) - self.center) * self.coef
+        return pd.DataFrame(
+            values, columns=self.features, index=dataframe.index
+        )
+
+    def reason_codes(
+        self, df_contributions: pd.DataFrame, n_reasons: int = 3
+    ) -> pd.DataFrame:
+        """
+        Lista as variáveis que mais aumentam o risco de cada linha.
+
+        Apenas contribuições positivas viram reason codes, então uma linha
+        com poucas variáveis desfavoráveis tem menos motivos.
+
+        Args:
+            df_contributions (pd.DataFrame): O resultado de `contributions`.
+            n_reasons (int, opcional): Quantos motivos por linha. Padrão é 3.
+
+        Returns:
+            pd.DataFrame: As colunas `reason_1` a `reason_n`.
+        """
+
+        values = df_contributions.to_numpy()
+        n_reasons = min(n_reasons, values.shape[1])
+        order = np.argsort(-values, axis=1)[:, :n_reasons]
+        names = np.asarray(df_contributions.columns, dtype=object)[order]
+        positive = np.take_along_axis(values, order, axis=1) > 0
+        names = np.where(positive, names, None)
+        return pd.DataFrame(
+            names,
+            columns=[f"reason_{i + 1}" for i in range(n_reasons)],
+            index=df_contributions.index,
+        )
+
+    def explain(
+        self, dataframe: pd.DataFrame, n_reasons: int = 3
+    ) -> pd.DataFrame:
+        """
+        Calcula as contribuições e os reason codes de um lote.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados originais.
+            n_reasons (int, opcional): Quantos motivos por linha. Padrão é 3.
+
+        Returns:
+            pd.DataFrame: As colunas `contrib_<variável>` e `reason_<i>`.
+        """
+
+        df_contributions = self.contributions(dataframe)
+        return pd.concat(
+            [
+                df_contributions.add_prefix("contrib_"),
+                self.reason_codes(df_contributions, n_reasons),
+            ],
+            axis=1,
+        )
+
+    def validate(
+        self, dataframe: pd.DataFrame, background: pd.DataFrame
+    ) -> float:
+        """
+        Compara as contribuições com o LinearExplainer do shap.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a explicar.
+            background (pd.DataFrame): Os dados de fundo usados no shap.
+
+        Returns:
+            float: A maior diferença absoluta entre as contribuições.
+        """
+
+        import shap
+
+        transformed = self._transform(background)
+        # sem max_samples, o masker do shap usa só 100 linhas do fundo
+        masker = shap.maskers.Independent(
+            transformed, max_samples=len(transformed)
+        )
+        explainer = shap.LinearExplainer(self.pipe.steps[-1][1], masker)
+        expected = explainer.shap_values(self._transform(dataframe))
+        centered = PipelineExplainer(self.pipe, background)
+        diff = np.abs(centered.contributions(dataframe).to_numpy() - expected)
+        max_diff = float(diff.max())
+        logger.info(f"Diferença máxima para o shap: {max_diff:.2e}")
+        return max_diff
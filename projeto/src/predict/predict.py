@@ -1,20 +1,68 @@
-import json
-import sqlite3
-from typing import Any, Dict
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
 
-import mlflow
-import mlflow.pyfunc
 import numpy as np
 import pandas as pd
-import requests
 import structlog
+from deploy.backends import InferenceBackend, LocalBackend
+from evaluation.threshold import DecisionThreshold
+from predict.explain import PipelineExplainer
+from predict.prediction_store import PredictionStore, utc_now
+from utils.artifact_cache import ArtifactCache
+from utils.instrumentation import instrument
+from utils.utils import load_config_file
 
-conn = sqlite3.connect("../../preds.db")
-cursor = conn.cursor()
 logger = structlog.getLogger()
 
-mlflow.set_tracking_uri("http://127.0.0.1:5000")
-mlflow.set_experiment("prob_loan")
+# clientes de longa duração, um por endpoint, compartilhados pelo processo
+_BACKENDS: Dict[str, InferenceBackend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+# explainers por versão do modelo, construídos uma única vez
+_EXPLAINERS: Dict[str, PipelineExplainer] = {}
+_EXPLAINERS_LOCK = threading.Lock()
+
+
+def get_backend(endpoint: str) -> InferenceBackend:
+    """
+    Retorna o cliente compartilhado de um endpoint, criando-o na primeira vez.
+
+    A sessão HTTP e o pool de threads do cliente são reaproveitados por todas
+    as chamadas do processo, em vez de recriados a cada predição.
+
+    Args:
+        endpoint (str): A URL do endpoint.
+
+    Returns:
+        InferenceBackend: O cliente do endpoint.
+    """
+
+    with _BACKENDS_LOCK:
+        if endpoint not in _BACKENDS:
+            _BACKENDS[endpoint] = LocalBackend(endpoint)
+        return _BACKENDS[endpoint]
+
+
+def get_explainer(model_uri: str) -> PipelineExplainer:
+    """
+    Retorna o explainer de uma versão do modelo, criando-o na primeira vez.
+
+    Args:
+        model_uri (str): O URI 'models:/<nome>/<versão>' do modelo.
+
+    Returns:
+        PipelineExplainer: O explainer do pipeline da versão.
+    """
+
+    with _EXPLAINERS_LOCK:
+        if model_uri not in _EXPLAINERS:
+            pipe = ArtifactCache().load_model(model_uri)
+            _EXPLAINERS[model_uri] = PipelineExplainer(pipe)
+        return _EXPLAINERS[model_uri]
 
 
 class Predict:
@@ -24,78 +72,147 @@ class Predict:
     Esta classe envia os dados para um endpoint do mlflow, obtém as predições e salva os resultados
     na base de dados.
 
+    Com explicações, a versão do alias 'modelo' é fixada na criação e o mesmo
+    pipeline calcula as probabilidades, as contribuições e o corte de
+    decisão, sem passar pelo endpoint, para que todos descrevam o mesmo
+    modelo.
+
     Attributes:
         dataframe (pd.DataFrame): O DataFrame contendo os dados a serem preditos.
+        explain (bool): Se as contribuições e os reason codes de cada linha são retornados.
+        apply_threshold (bool): Se a decisão de aprovação de cada linha é retornada.
+        endpoint (str): A URL do endpoint.
+        backend (InferenceBackend): O cliente do endpoint.
+        store (PredictionStore): A base onde as predições são gravadas.
+        capture (bool): Se as predições são gravadas pelo cliente.
+        model_version (str): A versão fixada do modelo, ou None sem
+            explicações.
+        explainer (PipelineExplainer): O explainer da versão fixada.
 
     Methods:
         run: Executa o processo de predição.
     """
 
-    def __init__(self, dataframe: pd.DataFrame):
+    def __init__(
+        self,
+        dataframe: pd.DataFrame,
+        explain: bool = False,
+        apply_threshold: bool = False,
+        endpoint: Optional[str] = None,
+        store: Optional[PredictionStore] = None,
+        backend: Optional[InferenceBackend] = None,
+        capture: bool = True,
+    ):
         """
         Inicializa uma instância da classe Predict.
 
         Args:
             dataframe (pd.DataFrame): O DataFrame contendo os dados a serem preditos.
+            explain (bool, opcional): Retorna também as contribuições de cada variável e
+                os reason codes, calculados com a versão do alias 'modelo'.
+                Padrão é False.
+            apply_threshold (bool, opcional): Retorna também a coluna `approved`, com
+                o corte de decisão gravado junto ao modelo. Padrão é False.
+            endpoint (str, opcional): A URL do endpoint. Padrão é o
+                servidor local na porta 5001.
+            store (PredictionStore, opcional): A base onde as predições são
+                gravadas. Padrão é a base do config.yaml.
+            backend (InferenceBackend, opcional): O cliente do endpoint.
+                Padrão é o cliente compartilhado de `endpoint`.
+            capture (bool, opcional): Grava as predições na base. Desligue
+                quando o servidor já as grava
+                (`serving_capture_predictions`), para que cada linha seja
+                gravada uma única vez. Padrão é True.
         """
 
         self.dataframe = dataframe
-        self.endpoint = "http://127.0.0.1:5001/invocations"
+        self.explain = explain
+        self.apply_threshold = apply_threshold
+        self.endpoint = endpoint or "http://127.0.0.1:5001/invocations"
+        self.store = store
+        self.backend = backend or get_backend(self.endpoint)
+        self.capture = capture
+        self.model_version = None
+        self.explainer = None
+        if explain:
+            model_name = load_config_file().get("model_name")
+            _, self.model_version = ArtifactCache().resolve(
+                f"models:/{model_name}@modelo"
+            )
+            self.explainer = get_explainer(
+                f"models:/{model_name}/{self.model_version}"
+            )
 
+    @instrument()
     def run(self) -> pd.DataFrame:
         """
         Executa o processo de predição.
 
-        Retorna um DataFrame contendo as probabilidades das predições.
+        Retorna um DataFrame contendo as probabilidades das predições e, com
+        a captura ligada, o `prediction_id` de cada linha na base, usado para
+        ingerir os rótulos.
 
         Returns:
             pd.DataFrame: Um DataFrame contendo as probabilidades das predições.
         """
 
         logger.info("inciando a predição.")
-        to_inderence = {
-            "dataframe_split": {
-                "columns": self.dataframe.columns.to_list(),
-                "data": self.dataframe.replace(np.nan, None).values.tolist(),
-            }
-        }
-        response = requests.post(self.endpoint, json=to_inderence)
+        if self.dataframe.empty:
+            probabilities = np.empty(0)
+        elif self.explainer is not None:
+            probabilities = self.explainer.pipe.predict_proba(self.dataframe)[
+                :, 1
+            ]
+        else:
+            probabilities = self.backend.predict(self.dataframe)[:, 1]
         logger.info("Predições finalizadas.")
 
-        probabilities = np.array(
-            json.loads(response.text).get("predictions", [])
-        )[:, 1]
-
         df_probs = self._results(probabilities)
-        self._capture_inputs_and_predictions(to_inderence, df_probs)
+        if self.capture:
+            df_probs.insert(
+                0,
+                "prediction_id",
+                self._capture_inputs_and_predictions(df_probs),
+            )
+
+        if self.apply_threshold:
+            df_probs["approved"] = self._decisions(probabilities)
+
+        if self.explain:
+            df_probs = pd.concat([df_probs, self._explanations()], axis=1)
 
         logger.info("Resultados salvo na base de dados.")
         return df_probs
 
     def _capture_inputs_and_predictions(
-        self, inputs: Dict[str, Dict[str, Any]], preds: pd.DataFrame
-    ) -> None:
+        self, preds: pd.DataFrame
+    ) -> List[int]:
         """
         Captura os inputs e as predições e salva na base de dados.
 
         Args:
-            inputs (Dict[str, Dict[str, Any]]): Dados de entrada para a predição.
             preds (pd.DataFrame): Probabilidades das predições.
 
         Returns:
-            None
+            List[int]: O `prediction_id` de cada linha.
         """
 
-        input_df = pd.DataFrame(
-            inputs["dataframe_split"]["data"],
-            columns=inputs["dataframe_split"]["columns"],
+        if preds.empty:
+            return []
+        if self.store is None:
+            self.store = PredictionStore()
+
+        # só as variáveis do modelo; identificadores e campos extras ficam fora
+        features = self.dataframe[self.store.feature_columns]
+        input_df = features.reset_index(drop=True).assign(
+            preds_prob=preds["probabilities_default"].to_numpy(),
+            scored_at=utc_now(),
         )
-        input_df["preds_prob"] = preds
 
         # armazena no database
-        self._store_in_database(input_df)
+        return self._store_in_database(input_df)
 
-    def _store_in_database(self, input_df: pd.DataFrame) -> None:
+    def _store_in_database(self, input_df: pd.DataFrame) -> List[int]:
         """
         Armazena os dados na base de dados.
 
@@ -103,12 +220,43 @@ class Predict:
             input_df (pd.DataFrame): DataFrame contendo os dados a serem armazenados.
 
         Returns:
-            None
+            List[int]: O `prediction_id` de cada linha.
+        """
+
+        return self.store.append(input_df)
+
+    def _explanations(self) -> pd.DataFrame:
+        """
+        Calcula as contribuições e os reason codes das predições.
+
+        Returns:
+            pd.DataFrame: As colunas `contrib_<variável>` e `reason_<i>`.
+        """
+
+        explanations = self.explainer.explain(self.dataframe)
+        return explanations.reset_index(drop=True)
+
+    def _decisions(self, probabilities: np.array) -> np.ndarray:
+        """
+        Aplica o corte de decisão do modelo às probabilidades.
+
+        Args:
+            probabilities (np.array): Array contendo as probabilidades das predições.
+
+        Returns:
+            np.ndarray: True para as linhas aprovadas.
         """
 
-        input_df.to_sql("predictions", conn, if_exists="append", index=False)
-        conn.commit()
-        conn.close()
+        if self.model_version is not None:
+            decision = DecisionThreshold.load_from_registry(
+                version=self.model_version
+            )
+        else:
+            decision = DecisionThreshold.load_latest()
+        segments = None
+        if decision.segment_column in self.dataframe.columns:
+            segments = self.dataframe[decision.segment_column]
+        return decision.decide(probabilities, segments)
 
     def _results(self, probabilities: np.array) -> pd.DataFrame:
         """
@@ -0,0 +1,304 @@
+import operator
+import os
+import sys
+from datetime import datetime, timezone
+from functools import reduce
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../src"))
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import structlog
+from predict.prediction_store import TIMESTAMP_FORMAT, PredictionStore
+from utils.instrumentation import instrument
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+
+class PredictionArchive:
+    """
+    Classe para arquivar as predições em Parquet particionado por data.
+
+    A compactação move os dias já encerrados da tabela `predictions` do SQLite
+    para arquivos `date=AAAA-MM-DD/part-<id>.parquet`. A leitura combina o
+    arquivo com as linhas ainda no SQLite, aplicando poda de partições e
+    projeção de colunas, de modo que o monitoramento e o retreino leem apenas
+    a janela e as variáveis necessárias.
+
+    Attributes:
+        store (PredictionStore): A base de predições no SQLite.
+        archive_path (str): O diretório raiz do arquivo Parquet.
+        chunksize (int): A quantidade de linhas lidas do SQLite por vez.
+
+    Methods:
+        compact: Move os dias encerrados do SQLite para o arquivo Parquet.
+        min_scored_at: Obtém o instante da predição mais antiga.
+        read: Lê as predições de uma janela de tempo.
+        lookup: Busca predições arquivadas pelo `prediction_id`.
+    """
+
+    def __init__(
+        self,
+        store: Optional[PredictionStore] = None,
+        archive_path: Optional[str] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe PredictionArchive.
+
+        Args:
+            store (PredictionStore, opcional): A base de predições no SQLite.
+            archive_path (str, opcional): O diretório raiz do arquivo Parquet.
+                Padrão é o `path_predictions_archive` do config.yaml.
+        """
+
+        config = load_config_file()
+        self.store = store or PredictionStore()
+        self.archive_path = archive_path or get_project_path(
+            config.get("path_predictions_archive")
+        )
+        self.chunksize = config.get("compaction_chunksize", 100000)
+
+    def _schema(self) -> pa.Schema:
+        """
+        Retorna o schema fixo dos arquivos Parquet.
+
+        Returns:
+            pa.Schema: O schema com id, instante, variáveis e probabilidade.
+        """
+
+        fields = [
+            pa.field("prediction_id", pa.int64()),
+            pa.field("scored_at", pa.string()),
+        ]
+        fields += [
+            pa.field(column, pa.float64())
+            for column in self.store.feature_columns
+        ]
+        fields.append(pa.field("preds_prob", pa.float64()))
+        return pa.schema(fields)
+
+    def _dataset(self) -> ds.Dataset:
+        """
+        Abre o arquivo Parquet como um dataset particionado por data.
+
+        Returns:
+            ds.Dataset: O dataset, com a coluna de partição `date`.
+        """
+
+        return ds.dataset(
+            self.archive_path,
+            format="parquet",
+            schema=self._schema().append(pa.field("date", pa.string())),
+            partitioning=ds.partitioning(
+                pa.schema([("date", pa.string())]), flavor="hive"
+            ),
+        )
+
+    def _write_partition(self, date: str, chunk: pd.DataFrame) -> None:
+        """
+        Grava um bloco de predições de um único dia.
+
+        O nome do arquivo usa o menor `prediction_id` do bloco, então repetir
+        uma compactação interrompida sobrescreve o arquivo em vez de duplicar
+        as linhas.
+
+        Args:
+            date (str): O dia das predições, no formato AAAA-MM-DD.
+            chunk (pd.DataFrame): As predições do dia.
+        """
+
+        partition_dir = os.path.join(self.archive_path, f"date={date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        file_name = f"part-{int(chunk['prediction_id'].min()):012d}.parquet"
+
+        table = pa.Table.from_pandas(
+            chunk, schema=self._schema(), preserve_index=False
+        )
+        pq.write_table(table, os.path.join(partition_dir, file_name))
+
+    @instrument()
+    def compact(self, before: Optional[str] = None) -> int:
+        """
+        Move os dias encerrados do SQLite para o arquivo Parquet.
+
+        Cada bloco é gravado em Parquet antes de ser removido do SQLite, de
+        modo que uma falha no meio da compactação não perde predições.
+
+        Args:
+            before (str, opcional): Compacta apenas predições anteriores a este
+                instante. Padrão é o início do dia atual (UTC).
+
+        Returns:
+            int: A quantidade de predições compactadas.
+        """
+
+        if before is None:
+            today = datetime.now(timezone.utc).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            before = today.strftime(TIMESTAMP_FORMAT)
+
+        logger.info(f"Compactação das predições anteriores a {before}.")
+        columns = self._schema().names
+        compacted = 0
+        last_id = None
+
+        while True:
+            chunk = self.store.read(
+                after_id=last_id,
+                end=before,
+                columns=columns,
+                limit=self.chunksize,
+            )
+            if chunk.empty:
+                break
+
+            chunk[self.store.feature_columns + ["preds_prob"]] = chunk[
+                self.store.feature_columns + ["preds_prob"]
+            ].astype("float64")
+            dates = chunk["scored_at"].str[:10]
+            for date, partition in chunk.groupby(dates):
+                self._write_partition(date, partition)
+
+            last_id = int(chunk["prediction_id"].max())
+            compacted += self.store.delete_until(last_id, before)
+
+        logger.info(f"Compactação terminou: {compacted} predições arquivadas.")
+        return compacted
+
+    def min_scored_at(self) -> Optional[str]:
+        """
+        Obtém o instante da predição mais antiga, arquivada ou no SQLite.
+
+        Returns:
+            str: O menor `scored_at`, ou None se não houver predições.
+        """
+
+        candidates = []
+        if os.path.isdir(self.archive_path):
+            partitions = sorted(
+                name
+                for name in os.listdir(self.archive_path)
+                if name.startswith("date=")
+            )
+            if partitions:
+                oldest = pq.read_table(
+                    os.path.join(self.archive_path, partitions[0]),
+                    columns=["scored_at"],
+                ).to_pandas()
+                candidates.append(oldest["scored_at"].min())
+
+        conn = self.store.connect()
+        row = conn.execute(
+            f"SELECT MIN(scored_at) FROM {self.store.table}"
+        ).fetchone()
+        conn.close()
+        if row[0] is not None:
+            candidates.append(row[0])
+
+        return min(candidates) if candidates else None
+
+    def read(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        after_id: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Lê as predições de uma janela de tempo.
+
+        Apenas as partições de data dentro da janela são abertas e apenas as
+        colunas pedidas são lidas. As linhas ainda não compactadas vêm do
+        SQLite.
+
+        Args:
+            start (str, opcional): Início da janela (inclusivo) em `scored_at`.
+            end (str, opcional): Fim da janela (exclusivo) em `scored_at`.
+            columns (List[str], opcional): Colunas a retornar. Padrão é todas.
+            after_id (int, opcional): Lê apenas ids maiores que este valor.
+
+        Returns:
+            pd.DataFrame: As predições da janela ordenadas por `prediction_id`.
+        """
+
+        columns = columns or self._schema().names
+        frames = []
+
+        if os.path.isdir(self.archive_path):
+            dataset = self._dataset()
+
+            filters = []
+            if after_id is not None:
+                filters.append(ds.field("prediction_id") > int(after_id))
+            if start is not None:
+                filters.append(ds.field("date") >= start[:10])
+                filters.append(ds.field("scored_at") >= start)
+            if end is not None:
+                filters.append(ds.field("date") <= end[:10])
+                filters.append(ds.field("scored_at") < end)
+            expression = reduce(operator.and_, filters) if filters else None
+
+            archived = dataset.to_table(
+                columns=list(dict.fromkeys(columns + ["prediction_id"])),
+                filter=expression,
+            ).to_pandas()
+            frames.append(archived)
+
+        store_columns = list(dict.fromkeys(columns + ["prediction_id"]))
+        frames.append(
+            self.store.read(
+                after_id=after_id,
+                start=start,
+                end=end,
+                columns=store_columns,
+            )
+        )
+
+        df_pred = pd.concat(
+            [frame for frame in frames if not frame.empty] or frames,
+            ignore_index=True,
+        )
+        return df_pred.sort_values("prediction_id", ignore_index=True)[columns]
+
+    def lookup(
+        self, prediction_ids: List[int], columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Busca predições arquivadas pelo `prediction_id`.
+
+        O filtro usa as estatísticas de mínimo e máximo do `prediction_id` de
+        cada arquivo, então só os arquivos que podem conter os ids são lidos.
+        As linhas ainda no SQLite não são consultadas.
+
+        Args:
+            prediction_ids (List[int]): Os ids buscados.
+            columns (List[str], opcional): Colunas a retornar. Padrão é todas.
+
+        Returns:
+            pd.DataFrame: As predições encontradas.
+        """
+
+        columns = columns or self._schema().names
+        columns = list(dict.fromkeys(["prediction_id"] + columns))
+        if not prediction_ids or not os.path.isdir(self.archive_path):
+            return pd.DataFrame(columns=columns)
+
+        dataset = self._dataset()
+        ids = pa.array(sorted(int(i) for i in prediction_ids), pa.int64())
+        field = ds.field("prediction_id")
+        expression = (
+            (field >= ids[0].as_py())
+            & (field <= ids[-1].as_py())
+            & field.isin(ids)
+        )
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+if __name__ == "__main__":
+    archive = PredictionArchive()
+    archive.compact()
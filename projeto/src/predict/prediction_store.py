@@ -0,0 +1,371 @@
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from typing import List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import pandas as pd
+import structlog
+from monitoring.sketches import SketchStore
+from utils.instrumentation import span
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def utc_now() -> str:
+    """
+    Retorna o instante atual em UTC no formato usado pela base de predições.
+
+    O formato ordena lexicograficamente, permitindo filtros por intervalo
+    diretamente no SQLite e nos arquivos Parquet.
+
+    Returns:
+        str: O instante atual formatado.
+    """
+
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+class PredictionStore:
+    """
+    Classe de acesso à tabela de predições no SQLite.
+
+    Cada linha recebe um `prediction_id` crescente (AUTOINCREMENT), que nunca
+    é reutilizado mesmo após a compactação apagar linhas antigas, e um
+    `scored_at` indexado para leituras por janela de tempo. Os lotes gravados
+    com chave (ver `append`) ficam registrados na tabela `captured_batches`.
+
+    Attributes:
+        db_path (str): O caminho do arquivo SQLite.
+        table (str): O nome da tabela de predições.
+        shadow_table (str): O nome da tabela das predições em shadow.
+        feature_columns (List[str]): As variáveis de entrada do modelo.
+        sketches (SketchStore): Os sketches de drift atualizados a cada
+            gravação, ou None se `online_sketches` estiver desligado.
+
+    Methods:
+        connect: Abre uma conexão com a base de predições.
+        append: Armazena um lote de predições.
+        append_shadow: Armazena as predições lado a lado dos modelos em
+            shadow.
+        read: Lê predições filtrando por id, janela de tempo e colunas.
+        delete_until: Remove as predições já compactadas.
+    """
+
+    def __init__(self, db_path: Optional[str] = None) -> None:
+        """
+        Inicializa uma instância da classe PredictionStore.
+
+        Args:
+            db_path (str, opcional): O caminho do arquivo SQLite. Padrão é o
+                `path_preds_db` do config.yaml.
+        """
+
+        config = load_config_file()
+        self.db_path = db_path or get_project_path(config.get("path_preds_db"))
+        self.table = "predictions"
+        self.shadow_table = "shadow_predictions"
+        self.feature_columns = [
+            column
+            for column in config.get("columns_to_use")
+            if column != config.get("target_name")
+        ]
+        self._create_table()
+        self.sketches = (
+            SketchStore(self.connect, self.feature_columns)
+            if config.get("online_sketches", True)
+            else None
+        )
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Abre uma conexão com a base de predições.
+
+        Returns:
+            sqlite3.Connection: A conexão aberta.
+        """
+
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _create_table(self) -> None:
+        """
+        Cria a tabela de predições e o índice de `scored_at` caso não existam.
+
+        Uma tabela no formato antigo, gravada pelo `to_sql` da classe Predict
+        sem `prediction_id` nem `scored_at`, é migrada (ver
+        `_migrate_legacy_table`).
+        """
+
+        features = ", ".join(
+            f'"{column}" REAL' for column in self.feature_columns
+        )
+        conn = self.connect()
+        with conn:
+            # a verificação e a migração acontecem em uma única transação,
+            # para que dois processos não migrem a mesma tabela
+            conn.execute("BEGIN IMMEDIATE")
+            columns = [
+                row[1]
+                for row in conn.execute(f"PRAGMA table_info({self.table})")
+            ]
+            legacy = bool(columns) and "prediction_id" not in columns
+            if legacy:
+                conn.execute(
+                    f"ALTER TABLE {self.table} RENAME TO {self.table}_legacy"
+                )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "prediction_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "scored_at TEXT NOT NULL, "
+                f"{features}, "
+                "preds_prob REAL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_scored_at "
+                f"ON {self.table} (scored_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS captured_batches ("
+                "batch_key TEXT PRIMARY KEY, "
+                "first_id INTEGER NOT NULL, "
+                "last_id INTEGER NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.shadow_table} ("
+                "shadow_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "scored_at TEXT NOT NULL, "
+                f"{features}, "
+                "champion_version TEXT, "
+                "challenger_version TEXT, "
+                "served TEXT, "
+                "preds_prob_champion REAL, "
+                "preds_prob_challenger REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS "
+                f"idx_{self.shadow_table}_scored_at "
+                f"ON {self.shadow_table} (scored_at)"
+            )
+            if legacy:
+                self._migrate_legacy_table(conn, columns)
+        conn.close()
+
+    def _migrate_legacy_table(
+        self, conn: sqlite3.Connection, columns: List[str]
+    ) -> None:
+        """
+        Copia as predições da tabela antiga para a tabela atual.
+
+        As linhas mantêm a ordem de gravação e recebem ids crescentes. Como a
+        tabela antiga não tem o instante da pontuação, `scored_at` recebe o
+        instante da migração. Variáveis ausentes ficam nulas e colunas fora
+        do esquema são descartadas.
+
+        Args:
+            conn (sqlite3.Connection): A conexão, dentro da transação que
+                renomeou a tabela antiga.
+            columns (List[str]): As colunas da tabela antiga.
+        """
+
+        kept = [
+            column
+            for column in self.feature_columns + ["preds_prob"]
+            if column in columns
+        ]
+        names = ", ".join(f'"{column}"' for column in kept)
+        n_rows = conn.execute(
+            f"INSERT INTO {self.table} (scored_at, {names}) "
+            f"SELECT ?, {names} FROM {self.table}_legacy ORDER BY rowid",
+            (utc_now(),),
+        ).rowcount
+        conn.execute(f"DROP TABLE {self.table}_legacy")
+        logger.warning(
+            f"{n_rows} predições migradas da tabela {self.table} no formato "
+            "antigo, com scored_at igual ao instante da migração."
+        )
+
+    def append(
+        self, dataframe: pd.DataFrame, batch_key: Optional[str] = None
+    ) -> List[int]:
+        """
+        Armazena um lote de predições e atualiza os sketches de drift.
+
+        Com `batch_key`, a chave e a faixa de ids do lote são gravadas na
+        tabela `captured_batches` na mesma transação das predições, e um lote
+        com uma chave já gravada não é gravado de novo: os ids gravados da
+        primeira vez são retornados. Assim um lote repetido numa retomada
+        não duplica as predições.
+
+        Args:
+            dataframe (pd.DataFrame): As variáveis de entrada, `preds_prob` e,
+                opcionalmente, `scored_at`. Sem `scored_at`, o lote recebe o
+                instante atual. As demais colunas são ignoradas.
+            batch_key (str, opcional): A chave única do lote.
+
+        Returns:
+            List[int]: O `prediction_id` de cada linha, na ordem do lote. É a
+                chave usada para ingerir os rótulos (ver RealizedPerformance).
+        """
+
+        if dataframe.empty:
+            return []
+        if "scored_at" not in dataframe.columns:
+            dataframe = dataframe.assign(scored_at=utc_now())
+        # só as colunas da tabela; identificadores e campos extras ficam fora
+        dataframe = dataframe[
+            self.feature_columns + ["preds_prob", "scored_at"]
+        ]
+
+        with span(
+            "PredictionStore.append",
+            rows=len(dataframe),
+            bytes_out=int(dataframe.memory_usage(index=False).sum()),
+        ):
+            columns = ", ".join(f'"{column}"' for column in dataframe.columns)
+            placeholders = ", ".join("?" * len(dataframe.columns))
+            conn = self.connect()
+            with conn:
+                # o lote entra em uma única transação, com a base travada
+                # para escrita, então os ids do lote são consecutivos
+                conn.execute("BEGIN IMMEDIATE")
+                captured = None
+                if batch_key is not None:
+                    captured = conn.execute(
+                        "SELECT first_id, last_id FROM captured_batches "
+                        "WHERE batch_key = ?",
+                        (batch_key,),
+                    ).fetchone()
+                if captured is None:
+                    conn.executemany(
+                        f"INSERT INTO {self.table} ({columns}) "
+                        f"VALUES ({placeholders})",
+                        dataframe.astype(object)
+                        .where(dataframe.notna(), None)
+                        .itertuples(index=False, name=None),
+                    )
+                    (last_id,) = conn.execute(
+                        "SELECT last_insert_rowid()"
+                    ).fetchone()
+                    first_id = last_id - len(dataframe) + 1
+                    if batch_key is not None:
+                        conn.execute(
+                            "INSERT INTO captured_batches VALUES (?, ?, ?)",
+                            (batch_key, first_id, last_id),
+                        )
+                else:
+                    first_id, last_id = captured
+            conn.close()
+
+        if captured is not None:
+            logger.info(f"Lote {batch_key} já armazenado, gravação ignorada.")
+            return list(range(first_id, last_id + 1))
+        if self.sketches is not None:
+            self.sketches.update(dataframe)
+        logger.info(f"{len(dataframe)} predições armazenadas.")
+        return list(range(first_id, last_id + 1))
+
+    def append_shadow(self, dataframe: pd.DataFrame) -> None:
+        """
+        Armazena as predições lado a lado do campeão e do desafiante.
+
+        Args:
+            dataframe (pd.DataFrame): As variáveis de entrada, as versões dos
+                modelos, o modelo servido e `preds_prob_champion` e
+                `preds_prob_challenger`.
+        """
+
+        if "scored_at" not in dataframe.columns:
+            dataframe = dataframe.assign(scored_at=utc_now())
+
+        with span(
+            "PredictionStore.append_shadow",
+            rows=len(dataframe),
+            bytes_out=int(dataframe.memory_usage(index=False).sum()),
+        ):
+            conn = self.connect()
+            with conn:
+                dataframe.to_sql(
+                    self.shadow_table, conn, if_exists="append", index=False
+                )
+            conn.close()
+        logger.info(f"{len(dataframe)} predições em shadow armazenadas.")
+
+    def read(
+        self,
+        after_id: Optional[int] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Lê predições filtrando por id, janela de tempo e colunas.
+
+        Args:
+            after_id (int, opcional): Lê apenas ids maiores que este valor.
+            start (str, opcional): Início da janela (inclusivo) em `scored_at`.
+            end (str, opcional): Fim da janela (exclusivo) em `scored_at`.
+            columns (List[str], opcional): Colunas a retornar. Padrão é todas.
+            limit (int, opcional): Quantidade máxima de linhas a retornar.
+
+        Returns:
+            pd.DataFrame: As predições ordenadas por `prediction_id`.
+        """
+
+        conditions, params = [], []
+        if after_id is not None:
+            conditions.append("prediction_id > ?")
+            params.append(int(after_id))
+        if start is not None:
+            conditions.append("scored_at >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("scored_at < ?")
+            params.append(end)
+
+        selected = (
+            ", ".join(f'"{column}"' for column in columns) if columns else "*"
+        )
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (
+            f"SELECT {selected} FROM {self.table}{where} "
+            "ORDER BY prediction_id"
+        )
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        with span("PredictionStore.read") as current:
+            conn = self.connect()
+            df_pred = pd.read_sql_query(query, conn, params=params)
+            conn.close()
+            current.rows = len(df_pred)
+            current.bytes_in = int(df_pred.memory_usage(index=False).sum())
+        return df_pred
+
+    def delete_until(self, prediction_id: int, before: str) -> int:
+        """
+        Remove as predições já compactadas.
+
+        Args:
+            prediction_id (int): O maior id a remover (inclusivo).
+            before (str): Remove apenas linhas com `scored_at` anterior a este
+                instante.
+
+        Returns:
+            int: A quantidade de linhas removidas.
+        """
+
+        conn = self.connect()
+        with conn:
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} "
+                "WHERE prediction_id <= ? AND scored_at < ?",
+                (int(prediction_id), before),
+            )
+        conn.close()
+        return cursor.rowcount
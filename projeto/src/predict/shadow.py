@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../src"))
+
+import joblib
+import numpy as np
+import pandas as pd
+import structlog
+from predict.prediction_store import PredictionStore, utc_now
+from sklearn.pipeline import Pipeline
+from utils.artifact_cache import ArtifactCache
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+ROLES = ("champion", "challenger")
+
+
+def stage_fingerprints(pipe: Pipeline) -> List[str]:
+    """
+    Calcula a impressão digital de cada prefixo de pré-processamento.
+
+    A impressão digital do passo `i` combina a do passo anterior com o hash
+    dos parâmetros ajustados do passo, então dois pipelines têm o mesmo
+    fingerprint no passo `i` apenas se todos os passos até ele são idênticos
+    e produzem a mesma saída para a mesma entrada.
+
+    Args:
+        pipe (Pipeline): O pipeline treinado.
+
+    Returns:
+        List[str]: O fingerprint de cada passo, exceto o modelo final.
+    """
+
+    fingerprints, parent = [], ""
+    for _, step in pipe.steps[:-1]:
+        parent = joblib.hash((parent, joblib.hash(step)))
+        fingerprints.append(parent)
+    return fingerprints
+
+
+class ShadowScorer:
+    """
+    Classe para pontuar o tráfego com o campeão e o desafiante ao mesmo tempo.
+
+    Os passos de pré-processamento idênticos nos dois pipelines (mesmo
+    fingerprint dos parâmetros ajustados, como a mesma imputação e
+    discretização) são calculados uma única vez por lote e reaproveitados,
+    e só os passos diferentes e os modelos finais rodam para cada versão.
+    O campeão responde as requisições e o desafiante roda em shadow, exceto
+    na fração `canary_fraction` das linhas, servida pelo desafiante. As duas
+    probabilidades são gravadas lado a lado na base de predições.
+
+    Attributes:
+        pipelines (Dict[str, Pipeline]): Os pipelines por papel.
+        versions (Dict[str, str]): As versões dos modelos por papel.
+        canary_fraction (float): A fração das linhas servida pelo
+            desafiante.
+        store (PredictionStore): A base de predições.
+        shared_stages (int): Quantos passos são compartilhados por lote.
+
+    Methods:
+        score: Pontua um lote com os dois modelos.
+        log: Grava as predições servidas e as lado a lado.
+        run: Pontua um lote e grava as predições.
+        warm_up: Pontua um lote de aquecimento sem gravar as predições.
+    """
+
+    def __init__(
+        self,
+        champion: Optional[str] = None,
+        challenger: Optional[str] = None,
+        canary_fraction: Optional[float] = None,
+        store: Optional[PredictionStore] = None,
+        pipelines: Optional[Dict[str, Pipeline]] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe ShadowScorer.
+
+        Args:
+            champion (str, opcional): O URI do campeão. Padrão é o alias
+                'modelo'.
+            challenger (str, opcional): O URI do desafiante. Padrão é o
+                `shadow_challenger_alias` do config.yaml.
+            canary_fraction (float, opcional): A fração das linhas servida
+                pelo desafiante. Padrão é o `canary_fraction` do config.yaml.
+            store (PredictionStore, opcional): A base de predições.
+            pipelines (Dict[str, Pipeline], opcional): Pipelines já
+                carregados, com as chaves 'champion' e 'challenger'.
+        """
+
+        config = load_config_file()
+        model_name = config.get("model_name")
+        uris = {
+            "champion": champion or f"models:/{model_name}@modelo",
+            "challenger": challenger
+            or (
+                f"models:/{model_name}@"
+                f"{config.get('shadow_challenger_alias', 'challenger')}"
+            ),
+        }
+
+        if pipelines is not None:
+            self.pipelines = pipelines
+            self.versions = {role: role for role in ROLES}
+        else:
+            cache = ArtifactCache()
+            self.pipelines, self.versions = {}, {}
+            for role in ROLES:
+                # carrega a versão resolvida, e não o alias de novo, para
+                # que a versão gravada seja a do modelo carregado
+                name, self.versions[role] = cache.resolve(uris[role])
+                self.pipelines[role] = cache.load_model(
+                    f"models:/{name}/{self.versions[role]}"
+                )
+
+        self.canary_fraction = (
+            canary_fraction
+            if canary_fraction is not None
+            else config.get("canary_fraction", 0.0)
+        )
+        self.store = store or PredictionStore()
+        self._rng = np.random.default_rng()
+
+        self._fingerprints = {
+            role: stage_fingerprints(pipe)
+            for role, pipe in self.pipelines.items()
+        }
+        champion_stages = set(self._fingerprints["champion"])
+        self.shared_stages = sum(
+            fingerprint in champion_stages
+            for fingerprint in self._fingerprints["challenger"]
+        )
+        logger.info(
+            f"Shadow: campeão {self.versions['champion']}, desafiante "
+            f"{self.versions['challenger']}, {self.shared_stages} passos de "
+            "pré-processamento compartilhados."
+        )
+
+    def score(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Pontua um lote com os dois modelos, compartilhando o pré-processamento.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a serem pontuados.
+
+        Returns:
+            pd.DataFrame: As probabilidades de cada modelo, o modelo servido
+                em cada linha e a probabilidade servida (`preds_prob`).
+        """
+
+        outputs: Dict[str, Any] = {}
+        df_scores = pd.DataFrame(index=dataframe.index)
+        for role in ROLES:
+            pipe = self.pipelines[role]
+            transformed = dataframe
+            for (_, step), fingerprint in zip(
+                pipe.steps[:-1], self._fingerprints[role]
+            ):
+                if fingerprint not in outputs:
+                    outputs[fingerprint] = step.transform(transformed)
+                transformed = outputs[fingerprint]
+            df_scores[f"preds_prob_{role}"] = pipe.steps[-1][1].predict_proba(
+                transformed
+            )[:, 1]
+
+        canary = self._rng.random(len(dataframe)) < self.canary_fraction
+        df_scores["served"] = np.where(canary, "challenger", "champion")
+        df_scores["preds_prob"] = np.where(
+            canary,
+            df_scores["preds_prob_challenger"],
+            df_scores["preds_prob_champion"],
+        )
+        return df_scores
+
+    def log(
+        self,
+        dataframe: pd.DataFrame,
+        df_scores: pd.DataFrame,
+        served: bool = True,
+    ) -> None:
+        """
+        Grava as predições servidas e as predições lado a lado.
+
+        As predições servidas vão para a tabela de predições, usada pelo
+        monitoramento, e as dos dois modelos para a tabela de shadow.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados pontuados.
+            df_scores (pd.DataFrame): O resultado de `score`.
+            served (bool, opcional): Grava também as predições servidas.
+                Padrão é True.
+        """
+
+        features = dataframe[self.store.feature_columns].reset_index(drop=True)
+        df_scores = df_scores.reset_index(drop=True)
+        scored_at = utc_now()
+
+        if served:
+            self.store.append(
+                features.assign(
+                    preds_prob=df_scores["preds_prob"], scored_at=scored_at
+                )
+            )
+        self.store.append_shadow(
+            features.assign(
+                scored_at=scored_at,
+                champion_version=self.versions["champion"],
+                challenger_version=self.versions["challenger"],
+                served=df_scores["served"],
+                preds_prob_champion=df_scores["preds_prob_champion"],
+                preds_prob_challenger=df_scores["preds_prob_challenger"],
+            )
+        )
+
+    def run(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Pontua um lote com os dois modelos e grava as predições.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a serem pontuados.
+
+        Returns:
+            pd.DataFrame: O resultado de `score`.
+        """
+
+        df_scores = self.score(dataframe)
+        self.log(dataframe, df_scores)
+        return df_scores
+
+    def warm_up(self, dataframe: pd.DataFrame) -> None:
+        """
+        Pontua um lote de aquecimento sem gravar as predições.
+
+        Args:
+            dataframe (pd.DataFrame): O lote de aquecimento.
+        """
+
+        self.score(dataframe)
+
+    @property
+    def feature_names_in_(self) -> np.ndarray:
+        """
+        As colunas usadas no treino do campeão, conferidas pelo servidor.
+        """
+
+        return self.pipelines["champion"].feature_names_in_
+
+    def predict_proba(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Pontua e grava um lote, no formato do `predict_proba` do sklearn.
+
+        Permite usar o ShadowScorer no lugar de um pipeline no servidor de
+        inferência. Só a tabela de shadow é gravada: as predições servidas
+        são gravadas uma única vez, pelo cliente (Predict) ou pela captura do
+        servidor.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a serem pontuados.
+
+        Returns:
+            np.ndarray: As probabilidades servidas de cada classe.
+        """
+
+        df_scores = self.score(dataframe)
+        self.log(dataframe, df_scores, served=False)
+        preds = df_scores["preds_prob"].to_numpy()
+        return np.column_stack([1 - preds, preds])
+
+
+def compare(store: Optional[PredictionStore] = None) -> Tuple[int, float]:
+    """
+    Resume a concordância entre o campeão e o desafiante já gravados.
+
+    Args:
+        store (PredictionStore, opcional): A base de predições.
+
+    Returns:
+        Tuple[int, float]: A quantidade de linhas e a diferença absoluta média
+            entre as probabilidades.
+    """
+
+    store = store or PredictionStore()
+    conn = store.connect()
+    n_rows, mean_diff = conn.execute(
+        "SELECT COUNT(*), "
+        "AVG(ABS(preds_prob_champion - preds_prob_challenger)) "
+        f"FROM {store.shadow_table}"
+    ).fetchone()
+    conn.close()
+    return n_rows, mean_diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_path", help="O CSV a ser pontuado em shadow.")
+    parser.add_argument("--challenger", help="O URI do desafiante.")
+    parser.add_argument(
+        "--canary-fraction",
+        type=float,
+        help="A fração das linhas servida pelo desafiante.",
+    )
+    args = parser.parse_args()
+
+    scorer = ShadowScorer(
+        challenger=args.challenger, canary_fraction=args.canary_fraction
+    )
+    scorer.run(pd.read_csv(args.input_path))
+    n_rows, mean_diff = compare(scorer.store)
+    logger.info(
+        f"{n_rows} linhas em shadow, diferença média de {mean_diff:.4f}."
+    )
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from utils.artifact_cache import ArtifactCache
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+
+class ModelManager:
+    """
+    Classe para manter os modelos servidos e trocá-los sem indisponibilidade.
+
+    O manager consulta periodicamente a versão apontada pelo alias no
+    registro do MLflow. Quando o alias muda, a nova versão é carregada em
+    segundo plano e aquecida com uma pontuação de teste, e só então passa a
+    ser a versão ativa, em uma troca atômica. Cada lote pontuado segura um
+    empréstimo (lease) da versão que usou, então os lotes em andamento na
+    versão antiga terminam nela. As últimas `keep_versions` versões continuam
+    carregadas para um rollback instantâneo, e as mais antigas são
+    descarregadas quando não têm mais lotes em andamento. Os modelos são
+    lidos pelo ArtifactCache, então um worker novo parte do disco local.
+
+    Attributes:
+        model_name (str): O nome do modelo registrado.
+        alias (str): O alias acompanhado.
+        keep_versions (int): Quantas versões manter carregadas.
+        poll_seconds (float): O intervalo entre as consultas ao alias.
+        warmup_rows (int): As linhas da pontuação de aquecimento.
+        current_version (str): A versão ativa.
+        cache (ArtifactCache): O cache local dos artefatos.
+
+    Methods:
+        acquire: Empresta o modelo ativo durante uma pontuação.
+        register: Aquece um modelo carregado e o torna ativo.
+        refresh: Carrega e ativa a versão apontada pelo alias, se mudou.
+        rollback: Volta para uma versão ainda carregada.
+        watch: Acompanha o alias continuamente.
+        status: Resume as versões carregadas.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        alias: str = "modelo",
+        keep_versions: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        cache: Optional[ArtifactCache] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe ModelManager.
+
+        Args:
+            model_name (str, opcional): O nome do modelo registrado. Padrão é
+                o `model_name` do config.yaml.
+            alias (str, opcional): O alias acompanhado. Padrão é 'modelo'.
+            keep_versions (int, opcional): Quantas versões manter
+                carregadas. Padrão é o `serving_resident_versions` do
+                config.yaml.
+            poll_seconds (float, opcional): O intervalo entre as consultas.
+                Padrão é o `serving_poll_seconds` do config.yaml.
+            cache (ArtifactCache, opcional): O cache local dos artefatos.
+        """
+
+        config = load_config_file()
+        self.model_name = model_name or config.get("model_name")
+        self.alias = alias
+        self.keep_versions = keep_versions or config.get(
+            "serving_resident_versions", 2
+        )
+        self.poll_seconds = poll_seconds or config.get(
+            "serving_poll_seconds", 30
+        )
+        self.warmup_rows = config.get("serving_max_batch_size", 256)
+        self.current_version: Optional[str] = None
+        self.cache = cache or ArtifactCache()
+
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._leases: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """
+        Empresta o modelo ativo durante uma pontuação.
+
+        A versão emprestada não é descarregada enquanto o empréstimo durar,
+        mesmo que uma troca aconteça no meio da pontuação.
+
+        Yields:
+            O pipeline da versão ativa.
+        """
+
+        with self._lock:
+            if self.current_version is None:
+                raise RuntimeError("Nenhum modelo carregado.")
+            version = self.current_version
+            model = self._models[version]
+            self._leases[version] += 1
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._leases[version] -= 1
+                self._evict()
+
+    def _warm_up(self, model: Any) -> None:
+        """
+        Pontua um lote de teste para aquecer o modelo antes da troca.
+
+        Args:
+            model: O pipeline a ser aquecido.
+        """
+
+        columns = getattr(model, "feature_names_in_", None)
+        if columns is None:
+            return
+        dataframe = pd.DataFrame(
+            np.zeros((self.warmup_rows, len(columns))), columns=columns
+        )
+        # modelos que gravam as predições (ShadowScorer) aquecem sem gravar
+        getattr(model, "warm_up", model.predict_proba)(dataframe)
+
+    def _evict(self) -> None:
+        """
+        Descarrega as versões excedentes que não têm lotes em andamento.
+
+        Deve ser chamado com o lock adquirido.
+        """
+
+        excess = len(self._models) - self.keep_versions
+        for version in list(self._models):
+            if excess <= 0:
+                break
+            if version != self.current_version and not self._leases[version]:
+                del self._models[version]
+                del self._leases[version]
+                excess -= 1
+                logger.info(f"Versão {version} descarregada.")
+
+    def register(self, version: str, model: Any) -> None:
+        """
+        Aquece um modelo carregado e o torna a versão ativa.
+
+        Args:
+            version (str): A versão do modelo.
+            model: O pipeline treinado.
+        """
+
+        self._warm_up(model)
+        with self._lock:
+            if version not in self._models:
+                self._leases[version] = 0
+            self._models[version] = model
+            self._models.move_to_end(version)
+            previous, self.current_version = self.current_version, version
+            self._evict()
+        logger.info(f"Versão ativa: {version} (anterior: {previous}).")
+
+    def refresh(self) -> bool:
+        """
+        Carrega e ativa a versão apontada pelo alias, se mudou.
+
+        Returns:
+            bool: Se houve troca de versão.
+        """
+
+        if not self._loading.acquire(blocking=False):
+            return False
+        try:
+            version = self._alias_version()
+            if version == self.current_version:
+                return False
+
+            with self._lock:
+                model = self._models.get(version)
+            if model is None:
+                logger.info(f"Carregando a versão {version} do modelo.")
+                model = self.cache.load_model(
+                    f"models:/{self.model_name}/{version}"
+                )
+            self.register(version, model)
+            return True
+        finally:
+            self._loading.release()
+
+    def rollback(self, version: Optional[str] = None) -> str:
+        """
+        Volta para uma versão ainda carregada, sem recarregar o modelo.
+
+        Enquanto o alias não mudar de novo, o `watch` não desfaz o rollback.
+
+        Args:
+            version (str, opcional): A versão desejada. Padrão é a versão
+                carregada anterior à ativa.
+
+        Returns:
+            str: A versão ativa após o rollback.
+
+        Raises:
+            ValueError: Se a versão não estiver carregada.
+        """
+
+        with self._lock:
+            versions = [v for v in self._models if v != self.current_version]
+            if version is None and versions:
+                version = versions[-1]
+            if version not in self._models:
+                raise ValueError(
+                    f"Versão {version} não está carregada: "
+                    f"{list(self._models)}"
+                )
+            self._models.move_to_end(version)
+            self.current_version = version
+        logger.warning(f"Rollback para a versão {version}.")
+        return version
+
+    async def watch(self) -> None:
+        """
+        Acompanha o alias continuamente, a cada `poll_seconds` segundos.
+
+        A consulta e o carregamento rodam em uma thread, então o event loop
+        continua atendendo as requisições durante a troca.
+        """
+
+        loop = asyncio.get_running_loop()
+        alias_version = self.current_version
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                version = await loop.run_in_executor(None, self._alias_version)
+                # só troca quando o alias muda, preservando um rollback manual
+                if version != alias_version:
+                    refreshed = await loop.run_in_executor(None, self.refresh)
+                    # sem troca (ex.: outro refresh em andamento), tenta de
+                    # novo na próxima consulta
+                    if refreshed or self.current_version == version:
+                        alias_version = version
+            except Exception as e:
+                logger.error(f"Falha ao atualizar o modelo: {e}")
+
+    def _alias_version(self) -> str:
+        """
+        Consulta a versão apontada pelo alias.
+
+        Sem acesso ao registro, é usada a última versão resolvida em cache.
+
+        Returns:
+            str: A versão do modelo.
+        """
+
+        _, version = self.cache.resolve(
+            f"models:/{self.model_name}@{self.alias}"
+        )
+        return version
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Resume as versões carregadas.
+
+        Returns:
+            Dict[str, Any]: A versão ativa, as versões carregadas e os lotes
+                em andamento em cada uma.
+        """
+
+        with self._lock:
+            resident: List[str] = list(self._models)
+            return {
+                "model_version": self.current_version,
+                "resident_versions": resident,
+                "in_flight": dict(self._leases),
+            }
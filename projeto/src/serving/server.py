@@ -0,0 +1,681 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from http import HTTPStatus
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from predict.prediction_store import PredictionStore
+from serving.model_manager import ModelManager
+from utils.instrumentation import instrument, prometheus_text
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+
+class LatencyTracker:
+    """
+    Classe para acompanhar latências e tamanhos de lote recentes.
+
+    Guarda as últimas `size` observações em buffers circulares, de modo que o
+    custo de memória é fixo e os percentis refletem a carga recente.
+
+    Attributes:
+        latencies (deque): As latências recentes das requisições, em ms.
+        batch_sizes (deque): Os tamanhos recentes dos lotes, em linhas.
+        requests (int): O total de requisições atendidas.
+        rejected (int): O total de requisições recusadas por fila cheia.
+        errors (int): O total de requisições com erro.
+
+    Methods:
+        observe: Registra a latência de uma requisição.
+        observe_batch: Registra o tamanho de um lote.
+        summary: Resume as métricas recentes.
+    """
+
+    def __init__(self, size: int = 10000) -> None:
+        """
+        Inicializa uma instância da classe LatencyTracker.
+
+        Args:
+            size (int, opcional): Quantas observações recentes manter.
+        """
+
+        self.latencies = deque(maxlen=size)
+        self.batch_sizes = deque(maxlen=size)
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def observe(self, latency_ms: float) -> None:
+        """
+        Registra a latência de uma requisição.
+
+        Args:
+            latency_ms (float): A latência em milissegundos.
+        """
+
+        self.requests += 1
+        self.latencies.append(latency_ms)
+
+    def observe_batch(self, n_rows: int) -> None:
+        """
+        Registra o tamanho de um lote pontuado.
+
+        Args:
+            n_rows (int): A quantidade de linhas do lote.
+        """
+
+        self.batch_sizes.append(n_rows)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Resume as métricas recentes.
+
+        Returns:
+            Dict[str, float]: Contadores, percentis de latência e o tamanho
+                médio dos lotes.
+        """
+
+        summary = {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "batches": len(self.batch_sizes),
+        }
+        if self.latencies:
+            p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99])
+            summary.update(
+                latency_p50_ms=float(p50),
+                latency_p95_ms=float(p95),
+                latency_p99_ms=float(p99),
+                latency_max_ms=float(max(self.latencies)),
+            )
+        if self.batch_sizes:
+            summary["batch_size_mean"] = float(np.mean(self.batch_sizes))
+        return summary
+
+
+class MicroBatcher:
+    """
+    Classe para agrupar requisições concorrentes em micro-lotes.
+
+    As requisições entram em uma fila limitada. Um único consumidor retira a
+    primeira requisição e espera até `max_wait_ms` por outras, até somar
+    `max_batch_size` linhas. O lote é pontuado com uma única chamada
+    vetorizada do pipeline em uma thread, fora do event loop, e o resultado é
+    dividido de volta entre as requisições. Se o lote falhar, cada requisição
+    é pontuada sozinha, de modo que um payload inválido não derruba as demais.
+    Com a fila cheia, a requisição é recusada na hora em vez de aumentar a
+    latência de todas.
+
+    Attributes:
+        predict_fn (Callable): A função que pontua um DataFrame.
+        max_batch_size (int): O máximo de linhas por lote.
+        max_wait_ms (float): A espera máxima para completar um lote.
+        max_queue (int): O máximo de requisições aguardando na fila.
+        tracker (LatencyTracker): As métricas do servidor.
+
+    Methods:
+        start: Inicia o consumidor da fila.
+        stop: Para o consumidor da fila.
+        submit: Enfileira um DataFrame e aguarda suas predições.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[pd.DataFrame], np.ndarray],
+        max_batch_size: int = 256,
+        max_wait_ms: float = 5,
+        max_queue: int = 1024,
+        tracker: Optional[LatencyTracker] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe MicroBatcher.
+
+        Args:
+            predict_fn (Callable): A função que pontua um DataFrame.
+            max_batch_size (int, opcional): O máximo de linhas por lote.
+            max_wait_ms (float, opcional): A espera máxima, em ms, para
+                completar um lote.
+            max_queue (int, opcional): O máximo de requisições na fila.
+            tracker (LatencyTracker, opcional): As métricas do servidor.
+        """
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue
+        self.tracker = tracker or LatencyTracker()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def queue_size(self) -> int:
+        """
+        A quantidade de requisições aguardando na fila.
+        """
+
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """
+        Inicia o consumidor da fila no event loop atual.
+        """
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.create_task(self._consume())
+
+    async def stop(self) -> None:
+        """
+        Para o consumidor da fila.
+        """
+
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+
+    async def submit(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Enfileira um DataFrame e aguarda suas predições.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a serem pontuados.
+
+        Returns:
+            np.ndarray: As predições, uma linha por linha de entrada.
+
+        Raises:
+            asyncio.QueueFull: Se a fila estiver cheia.
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((dataframe, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[pd.DataFrame, asyncio.Future]]:
+        """
+        Retira da fila as requisições de um lote.
+
+        Returns:
+            List[Tuple[pd.DataFrame, asyncio.Future]]: As requisições do lote.
+        """
+
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        n_rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait_ms / 1000
+
+        while n_rows < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    async def _consume(self) -> None:
+        """
+        Pontua os lotes da fila continuamente.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            frames = [dataframe for dataframe, _ in batch]
+            try:
+                df_batch = pd.concat(frames, ignore_index=True)
+                preds = await loop.run_in_executor(
+                    None, self.predict_fn, df_batch
+                )
+            except Exception as e:
+                if len(batch) == 1:
+                    if not batch[0][1].done():
+                        batch[0][1].set_exception(e)
+                else:
+                    await self._score_each(batch)
+                continue
+
+            self.tracker.observe_batch(len(df_batch))
+            offsets = np.cumsum([0] + [len(frame) for frame in frames])
+            for (_, future), start, end in zip(
+                batch, offsets[:-1], offsets[1:]
+            ):
+                if not future.done():
+                    future.set_result(preds[start:end])
+
+    async def _score_each(
+        self, batch: List[Tuple[pd.DataFrame, asyncio.Future]]
+    ) -> None:
+        """
+        Pontua cada requisição de um lote que falhou separadamente.
+
+        Args:
+            batch (List[Tuple[pd.DataFrame, asyncio.Future]]): As requisições
+                do lote.
+        """
+
+        loop = asyncio.get_running_loop()
+        for dataframe, future in batch:
+            try:
+                preds = await loop.run_in_executor(
+                    None, self.predict_fn, dataframe
+                )
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.tracker.observe_batch(len(dataframe))
+            if not future.done():
+                future.set_result(preds)
+
+
+class InferenceServer:
+    """
+    Classe do servidor de inferência com micro-lotes.
+
+    Servidor HTTP em asyncio compatível com o endpoint `/invocations` do
+    `mlflow models serve`: recebe o mesmo payload `dataframe_split` enviado
+    pela classe Predict e responde `{"predictions": ...}` com a saída do
+    `predict_proba` do pipeline. Também expõe `/health`, `/metrics`,
+    `/metrics/prometheus` (os spans do processo, ver instrumentation) e
+    `/rollback`. O modelo servido é trocado sem reiniciar o servidor quando
+    o alias do registro muda (ver ModelManager). Com a captura ligada, as
+    predições são gravadas na base de predições e a resposta traz também o
+    `prediction_ids` de cada linha.
+
+    Attributes:
+        manager (ModelManager): As versões do modelo carregadas.
+        store (PredictionStore): A base onde as predições são gravadas, ou
+            None se a captura estiver desligada.
+        host (str): O endereço do servidor.
+        port (int): A porta do servidor.
+        batcher (MicroBatcher): O agrupador de requisições.
+        tracker (LatencyTracker): As métricas do servidor.
+
+    Methods:
+        predict: Pontua um DataFrame com o pipeline.
+        check_columns: Confere as colunas de uma requisição com as do modelo.
+        handle: Responde a uma requisição HTTP.
+        serve: Executa o servidor até ser interrompido.
+    """
+
+    def __init__(
+        self,
+        model: Any = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        manager: Optional[ModelManager] = None,
+        capture: Optional[bool] = None,
+        store: Optional[PredictionStore] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe InferenceServer.
+
+        Args:
+            model (opcional): Um pipeline treinado servido de forma fixa, sem
+                acompanhar o alias. Padrão é a versão do modelo registrado
+                apontada pelo alias 'modelo'.
+            host (str, opcional): O endereço. Padrão é o `serving_host` do
+                config.yaml.
+            port (int, opcional): A porta. Padrão é o `serving_port` do
+                config.yaml.
+            manager (ModelManager, opcional): O gerenciador das versões.
+            capture (bool, opcional): Grava as predições servidas. Padrão é
+                o `serving_capture_predictions` do config.yaml.
+            store (PredictionStore, opcional): A base onde as predições são
+                gravadas. Padrão é a base do config.yaml.
+        """
+
+        config = load_config_file()
+        if capture is None:
+            capture = config.get("serving_capture_predictions", False)
+        self.store = (store or PredictionStore()) if capture else None
+        self.manager = manager or ModelManager()
+        self.watch_alias = model is None
+        if model is not None:
+            self.manager.register("local", model)
+        else:
+            self.manager.refresh()
+        self.host = host or config.get("serving_host", "127.0.0.1")
+        self.port = port or config.get("serving_port", 5001)
+        self.tracker = LatencyTracker()
+        self.batcher = MicroBatcher(
+            self.predict,
+            max_batch_size=config.get("serving_max_batch_size", 256),
+            max_wait_ms=config.get("serving_max_wait_ms", 5),
+            max_queue=config.get("serving_max_queue", 1024),
+            tracker=self.tracker,
+        )
+
+    @instrument()
+    def predict(self, dataframe: pd.DataFrame) -> np.ndarray:
+        """
+        Pontua um DataFrame com a versão ativa do pipeline.
+
+        O lote inteiro usa a mesma versão, mesmo que uma troca aconteça
+        durante a pontuação.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados a serem pontuados.
+
+        Returns:
+            np.ndarray: As probabilidades de cada classe.
+        """
+
+        with self.manager.acquire() as model:
+            return model.predict_proba(dataframe)
+
+    def check_columns(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Confere as colunas de uma requisição com as usadas no treino.
+
+        A conferência acontece antes de a requisição entrar no micro-lote,
+        para que colunas ausentes, a mais ou com outro nome resultem em erro
+        apenas para quem as enviou. As colunas são reordenadas como no treino,
+        já que o lote une requisições pelo nome das colunas.
+
+        Args:
+            dataframe (pd.DataFrame): Os dados da requisição.
+
+        Returns:
+            pd.DataFrame: Os dados com as colunas na ordem do treino.
+
+        Raises:
+            ValueError: Se as colunas não forem as do modelo.
+        """
+
+        try:
+            with self.manager.acquire() as model:
+                expected = getattr(model, "feature_names_in_", None)
+        except RuntimeError:
+            return dataframe
+        if expected is None:
+            return dataframe
+
+        missing = sorted(set(expected) - set(dataframe.columns))
+        extra = sorted(set(dataframe.columns) - set(expected))
+        if missing or extra:
+            raise ValueError(
+                f"Colunas ausentes: {missing}; colunas desconhecidas: {extra}."
+            )
+        return dataframe[list(expected)]
+
+    async def handle(
+        self, method: str, path: str, body: bytes
+    ) -> Tuple[HTTPStatus, Union[Dict[str, Any], str]]:
+        """
+        Responde a uma requisição HTTP.
+
+        Args:
+            method (str): O método HTTP.
+            path (str): O caminho da requisição.
+            body (bytes): O corpo da requisição.
+
+        Returns:
+            Tuple[HTTPStatus, Union[Dict[str, Any], str]]: O status e o
+                corpo da resposta, em JSON ou, no `/metrics/prometheus`, no
+                formato de texto do Prometheus.
+        """
+
+        if method == "GET" and path in ("/health", "/ping"):
+            version = self.manager.current_version
+            if version is None:
+                return HTTPStatus.SERVICE_UNAVAILABLE, {"status": "loading"}
+            return HTTPStatus.OK, {"status": "ok", "model_version": version}
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, {
+                **self.tracker.summary(),
+                **self.manager.status(),
+                "queue_size": self.batcher.queue_size,
+            }
+        if method == "GET" and path == "/metrics/prometheus":
+            return HTTPStatus.OK, prometheus_text()
+        if method == "POST" and path == "/rollback":
+            try:
+                version = json.loads(body or b"{}").get("version")
+                version = self.manager.rollback(version)
+            except ValueError as e:
+                return HTTPStatus.BAD_REQUEST, {"message": str(e)}
+            return HTTPStatus.OK, {"model_version": version}
+        if path != "/invocations":
+            return HTTPStatus.NOT_FOUND, {"message": f"{path} não existe."}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"message": "Use POST."}
+
+        started = time.perf_counter()
+        try:
+            payload = json.loads(body)["dataframe_split"]
+            dataframe = self.check_columns(
+                pd.DataFrame(
+                    payload["data"],
+                    columns=payload["columns"],
+                    dtype="float64",
+                )
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {
+                "error_code": "BAD_REQUEST",
+                "message": f"Payload inválido: {e}",
+            }
+
+        try:
+            preds = await self.batcher.submit(dataframe)
+        except asyncio.QueueFull:
+            self.tracker.rejected += 1
+            return HTTPStatus.SERVICE_UNAVAILABLE, {
+                "error_code": "QUEUE_FULL",
+                "message": "Fila de inferência cheia, tente novamente.",
+            }
+        except Exception as e:
+            self.tracker.errors += 1
+            logger.error(f"Falha na inferência: {e}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {
+                "error_code": "INTERNAL_ERROR",
+                "message": str(e),
+            }
+
+        response = {"predictions": preds.tolist()}
+        if self.store is not None:
+            try:
+                response["prediction_ids"] = await asyncio.to_thread(
+                    self.store.append,
+                    dataframe[self.store.feature_columns].assign(
+                        preds_prob=preds[:, 1]
+                    ),
+                )
+            except Exception as e:
+                logger.error(f"Falha ao gravar as predições: {e}")
+
+        self.tracker.observe((time.perf_counter() - started) * 1000)
+        return HTTPStatus.OK, response
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Atende as requisições de uma conexão, mantendo-a aberta (keep-alive).
+
+        Args:
+            reader (asyncio.StreamReader): O leitor da conexão.
+            writer (asyncio.StreamWriter): O escritor da conexão.
+        """
+
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                ):
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {
+                    name.strip().lower(): value.strip()
+                    for name, _, value in (
+                        line.partition(":") for line in lines[1:] if line
+                    )
+                }
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                status, content = await self.handle(
+                    method, target.split("?", 1)[0], body
+                )
+                if isinstance(content, str):
+                    data = content.encode()
+                    content_type = "text/plain; version=0.0.4"
+                else:
+                    data = json.dumps(content).encode()
+                    content_type = "application/json"
+                keep_alive = headers.get("connection", "").lower() != "close"
+                response_headers = [
+                    f"HTTP/1.1 {status.value} {status.phrase}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(data)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    response_headers.append("Retry-After: 1")
+                writer.write(
+                    ("\r\n".join(response_headers) + "\r\n\r\n").encode()
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Conexão encerrada: {e}")
+        finally:
+            writer.close()
+
+    async def _serve(self) -> None:
+        """
+        Inicia o agrupador e o servidor HTTP.
+        """
+
+        self.batcher.start()
+        watcher = (
+            asyncio.create_task(self.manager.watch())
+            if self.watch_alias
+            else None
+        )
+        server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        logger.info(
+            f"Servidor de inferência em http://{self.host}:{self.port}"
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            await self.batcher.stop()
+
+    def serve(self) -> None:
+        """
+        Executa o servidor até ser interrompido.
+        """
+
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            logger.info("Servidor de inferência encerrado.")
+
+
+def serve_in_thread(
+    model: Any = None,
+    host: str = "127.0.0.1",
+    port: Optional[int] = None,
+    timeout: float = 10.0,
+) -> str:
+    """
+    Inicia um InferenceServer em uma thread daemon do processo atual.
+
+    Usado pelo benchmark e pelo teste de carga para pontuar sem rede e sem
+    um servidor externo.
+
+    Args:
+        model (opcional): O pipeline servido. Padrão é o alias 'modelo'.
+        host (str, opcional): O endereço. Padrão é '127.0.0.1'.
+        port (int, opcional): A porta. Padrão é uma porta livre.
+        timeout (float, opcional): O tempo máximo, em segundos, para o
+            servidor aceitar conexões. Padrão é 10.
+
+    Returns:
+        str: A URL base do servidor.
+
+    Raises:
+        RuntimeError: Se o servidor não aceitar conexões a tempo.
+    """
+
+    if port is None:
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            port = sock.getsockname()[1]
+
+    server = InferenceServer(model=model, host=host, port=port)
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return f"http://{host}:{port}"
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("O servidor de inferência local não iniciou.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", help="O endereço do servidor.")
+    parser.add_argument("--port", type=int, help="A porta do servidor.")
+    parser.add_argument(
+        "--shadow",
+        action="store_true",
+        help="Pontua com o campeão e o desafiante (ver ShadowScorer).",
+    )
+    parser.add_argument(
+        "--capture",
+        action="store_true",
+        default=None,
+        help="Grava as predições servidas e responde os prediction_ids.",
+    )
+    args = parser.parse_args()
+
+    model = None
+    if args.shadow:
+        from predict.shadow import ShadowScorer
+
+        model = ShadowScorer()
+    InferenceServer(
+        model=model, host=args.host, port=args.port, capture=args.capture
+    ).serve()
@@ -1,6 +1,9 @@
+import argparse
 import os
 import sys
-from typing import Any, Dict, Tuple, Union
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import joblib
 import mlflow
@@ -23,7 +26,10 @@ from data.data_transformation import DataTransformation
 from data.data_validation import DataValidation
 from evaluation.classifier_eval import ModelEvaluation
 from train import TrainModels
-from utils.utils import load_config_file
+from utils.fingerprint import frame_fingerprint
+from utils.profiler import Profiler
+from utils.stage_runner import Stage, StageRunner
+from utils.utils import get_project_path, load_config_file
 
 
 def load_data() -> pd.DataFrame:
@@ -39,6 +45,27 @@ def load_data() -> pd.DataFrame:
     return dataFrame
 
 
+def validate_data(dataframe: pd.DataFrame) -> bool:
+    """
+    Valida o conjunto de dados de treinamento.
+
+    Args:
+        dataframe (pd.DataFrame): O conjunto de dados de entrada.
+
+    Returns:
+        bool: True se a validação passar.
+
+    Raises:
+        ValueError: Se a validação falhar, interrompendo o treino.
+    """
+
+    dv = DataValidation()
+    # a validação altera as colunas no lugar e roda junto com a divisão
+    if not dv.run(dataframe.copy()):
+        raise ValueError("Validação dos dados de treinamento falhou.")
+    return True
+
+
 def split_data(
     dataframe: pd.DataFrame,
 ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
@@ -52,10 +79,7 @@ def split_data(
         Os conjuntos de dados divididos e as variáveis alvo.
     """
 
-    dv = DataValidation()
-    is_valid = dv.run(df)
-
-    dt = DataTransformation(df)
+    dt = DataTransformation(dataframe)
     X_train, X_valid, y_train, y_valid = dt.train_test_spliting()
     return X_train, X_valid, y_train, y_valid
 
@@ -79,7 +103,7 @@ def define_pipeline() -> Pipeline:
             (
                 "discretizer",
                 EqualFrequencyDiscretiser(
-                    variables=load_config_file().get("vars_discretizer")
+                    variables=load_config_file().get("vars_discretize")
                 ),
             ),
             ("scaler", SklearnTransformerWrapper(StandardScaler())),
@@ -88,19 +112,35 @@ def define_pipeline() -> Pipeline:
     return pipe
 
 
-def objective(params: Dict[str, Any]) -> Dict[str, Union[float, int]]:
+def objective(
+    params: Dict[str, Any],
+    X_train: pd.DataFrame,
+    X_valid: pd.DataFrame,
+    y_train: pd.Series,
+    y_valid: pd.Series,
+    fingerprints: Dict[str, str],
+) -> Dict[str, Union[float, int]]:
     """
     Define a função objetivo para otimização de hiperparâmetros.
 
     Args:
         params (Dict[str, Any]): Os hiperparâmetros a serem otimizados.
+        X_train (pd.DataFrame): As variáveis de treinamento.
+        X_valid (pd.DataFrame): As variáveis de validação.
+        y_train (pd.Series): O alvo de treinamento.
+        y_valid (pd.Series): O alvo de validação.
+        fingerprints (Dict[str, str]): As impressões digitais dos dados de
+            treinamento e de validação, registradas como tags do run.
 
     Returns:
         Dict[str, Union[float, int]]: O resultado da avaliação.
     """
 
+    pipe = define_pipeline()
+
     with mlflow.start_run(run_name="with_discretizer_hyperopt"):
         mlflow.set_tag("model_name", "lr_hyperopt")
+        mlflow.set_tags(fingerprints)
         mlflow.log_params(params)
 
         preprocessdor = DataPreprocess(pipe)
@@ -176,10 +216,24 @@ def objective(params: Dict[str, Any]) -> Dict[str, Union[float, int]]:
         return {"loss": -roc_auc_scores.mean(), "status": STATUS_OK}
 
 
-def optimize_hyperparameters() -> Dict[str, Any]:
+def optimize_hyperparameters(
+    X_train: pd.DataFrame,
+    X_valid: pd.DataFrame,
+    y_train: pd.Series,
+    y_valid: pd.Series,
+    max_evals: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     Otimiza hiperparâmetros usando o algoritmo TPE.
 
+    Args:
+        X_train (pd.DataFrame): As variáveis de treinamento.
+        X_valid (pd.DataFrame): As variáveis de validação.
+        y_train (pd.Series): O alvo de treinamento.
+        y_valid (pd.Series): O alvo de validação.
+        max_evals (int, opcional): A quantidade de avaliações. Padrão é o
+            `hyperopt_max_evals` do config.yaml.
+
     Returns:
         Dict[str, Any]: Os melhores hiperparâmetros encontrados.
     """
@@ -195,29 +249,129 @@ def optimize_hyperparameters() -> Dict[str, Any]:
         "class_weight": hp.choice("class_weight", [None, "balanced"]),
     }
 
+    # calculadas uma única vez, e não em cada avaliação
+    fingerprints = {
+        "data_fingerprint": frame_fingerprint(X_train, y_train),
+        "valid_data_fingerprint": frame_fingerprint(X_valid, y_valid),
+    }
     best_result = fmin(
-        fn=objective, space=search_space, algo=tpe.suggest, max_evals=5
+        fn=partial(
+            objective,
+            X_train=X_train,
+            X_valid=X_valid,
+            y_train=y_train,
+            y_valid=y_valid,
+            fingerprints=fingerprints,
+        ),
+        space=search_space,
+        algo=tpe.suggest,
+        max_evals=max_evals or load_config_file().get("hyperopt_max_evals", 5),
     )
     return best_result
 
 
-def train(X_train: pd.DataFrame, X_valid: pd.DataFrame):
+def train(
+    X_train: pd.DataFrame,
+    X_valid: pd.DataFrame,
+    y_train: pd.Series,
+    y_valid: pd.Series,
+):
     """
-    Treina os modelos.
+    Treina os modelos e os avalia no conjunto de validação.
 
     Args:
         X_train: Dados de treinamento.
         X_valid: Dados de validação.
+        y_train: O alvo de treinamento.
+        y_valid: O alvo de validação.
     """
 
-    tm = TrainModels(X_train, X_valid)
+    tm = TrainModels(X_train, y_train, X_valid, y_valid)
     tm.run()
 
 
-if __name__ == "__main__":
-    df = load_data()
-    X_train, X_valid, y_train, y_valid = split_data(df)
-    pipe = define_pipeline()
-    best_hyperparameters = optimize_hyperparameters()
+def build_stages() -> List[Stage]:
+    """
+    Monta as etapas do treino.
+
+    A carga só executa de novo se o CSV ou as colunas mudarem; a validação
+    e a divisão executam em paralelo; a busca de hiperparâmetros só executa
+    de novo se os conjuntos divididos ou o espaço de busca mudarem. O treino
+    final, que registra o modelo, executa sempre.
+
+    Returns:
+        List[Stage]: As etapas.
+    """
+
+    config = load_config_file()
+    split_outputs = ["X_train", "X_valid", "y_train", "y_valid"]
+    return [
+        Stage(
+            "load",
+            load_data,
+            outputs=["dataframe"],
+            params={"columns": config.get("columns_to_use")},
+            sources=[
+                get_project_path(
+                    "data", "raw", config.get("train_dataset_name")
+                )
+            ],
+        ),
+        Stage("validate", validate_data, inputs=["dataframe"]),
+        Stage(
+            "split",
+            split_data,
+            inputs=["dataframe"],
+            outputs=split_outputs,
+            params={
+                "target_name": config.get("target_name"),
+                "test_size": config.get("test_size"),
+                "random_state": config.get("random_state"),
+            },
+        ),
+        Stage(
+            "search",
+            optimize_hyperparameters,
+            inputs=split_outputs,
+            outputs=["best_hyperparameters"],
+            params={
+                "max_evals": config.get("hyperopt_max_evals", 5),
+                "vars_imputer": config.get("vars_imputer"),
+                "vars_discretize": config.get("vars_discretize"),
+            },
+            after=["validate"],
+            helpers=[objective, define_pipeline],
+        ),
+        Stage(
+            "train",
+            train,
+            inputs=split_outputs,
+            outputs=["trained"],
+            after=["search"],
+            cache=False,
+        ),
+    ]
 
-    train(X_train, y_train)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Perfila o treino e registra o perfil no MLflow.",
+    )
+    parser.add_argument(
+        "--force",
+        nargs="+",
+        default=[],
+        help="Etapas executadas mesmo em cache (load, validate, split, "
+        "search).",
+    )
+    args = parser.parse_args()
+
+    with (
+        Profiler("train", log_to_mlflow=True)
+        if args.profile
+        else nullcontext()
+    ):
+        StageRunner(build_stages()).run(force=args.force)
@@ -1,6 +1,6 @@
 import os
 import sys
-from typing import Tuple
+from typing import Optional, Tuple
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
 
@@ -8,12 +8,19 @@ import mlflow
 import pandas as pd
 import structlog
 from evaluation.classifier_eval import ModelEvaluation
+from evaluation.fast_metrics import FastEvaluation
+from evaluation.permutation_importance import PermutationImportance
+from evaluation.threshold import DecisionThreshold
 from feature_engine.discretisation import EqualFrequencyDiscretiser
 from feature_engine.imputation import MeanMedianImputer
 from feature_engine.wrappers import SklearnTransformerWrapper
+from monitoring.reference_profile import ReferenceProfile
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
+from utils import instrumentation
+from utils.fingerprint import frame_fingerprint
+from utils.instrumentation import instrument, span
 from utils.utils import load_config_file
 
 mlflow.set_tracking_uri("http://127.0.0.1:5000")
@@ -32,23 +39,37 @@ class TrainModels:
     Attributes:
         dados_X (pd.DataFrame): O DataFrame contendo os recursos de entrada.
         dados_y (pd.DataFrame): O DataFrame contendo os rótulos alvo.
+        valid_X (pd.DataFrame): Os recursos de validação, usados nas métricas.
+        valid_y (pd.DataFrame): Os rótulos de validação.
 
     Methods:
         get_best_model: Obtém os melhores parâmetros e a métrica de desempenho do melhor modelo do MLflow.
         run: Executa o treinamento do modelo de Regressão Logística com os melhores parâmetros obtidos durante a busca do MLflow.
     """
 
-    def __init__(self, dados_X: pd.DataFrame, dados_y: pd.DataFrame):
+    def __init__(
+        self,
+        dados_X: pd.DataFrame,
+        dados_y: pd.DataFrame,
+        valid_X: Optional[pd.DataFrame] = None,
+        valid_y: Optional[pd.DataFrame] = None,
+    ):
         """
         Inicializa uma instância da classe TrainModels.
 
         Args:
             dados_X (pd.DataFrame): O DataFrame contendo os recursos de entrada.
             dados_y (pd.DataFrame): O DataFrame contendo os rótulos alvo.
+            valid_X (pd.DataFrame, opcional): Os recursos de validação. Sem
+                eles, as métricas são calculadas no treino e registradas com
+                o prefixo 'train'.
+            valid_y (pd.DataFrame, opcional): Os rótulos de validação.
         """
 
         self.dados_X = dados_X
         self.dados_y = dados_y
+        self.valid_X = valid_X
+        self.valid_y = valid_y
         self.model_name = load_config_file().get("model_name")
 
     def get_best_model(self) -> Tuple[float, pd.DataFrame]:
@@ -61,7 +82,9 @@ class TrainModels:
 
         logger.info("Obtendo o melhor modelo do MLFlow")
         df_mlflow = mlflow.search_runs(
-            filter_string="metrics.valid_roc_auc < 1"
+            # só os runs da busca; o final_model também registra valid_roc_auc
+            filter_string="metrics.valid_roc_auc < 1 "
+            "and tags.model_name = 'lr_hyperopt'"
         ).sort_values("metrics.valid_roc_auc", ascending=False)
         run_id = df_mlflow.loc[df_mlflow["metrics.valid_roc_auc"].idxmax()][
             "run_id"
@@ -87,6 +110,7 @@ class TrainModels:
 
         return best_roc_auc, df_best_params
 
+    @instrument()
     def run(self) -> None:
         """
         Executa o treinamento do modelo de Regressão Logística com os melhores parâmetros
@@ -98,6 +122,10 @@ class TrainModels:
 
         with mlflow.start_run(run_name="final_model"):
             mlflow.set_tag("model_name", self.model_name)
+            mlflow.set_tag(
+                "data_fingerprint",
+                frame_fingerprint(self.dados_X, self.dados_y),
+            )
 
             model = LogisticRegression(
                 warm_start=eval(df_best_params["params.warm_start"].values[0]),
@@ -109,39 +137,80 @@ class TrainModels:
                 tol=float(df_best_params["params.tol"].values[0]),
             )
 
-        pipe = Pipeline(
-            [
-                ("imputer", eval(df_best_params["params.imputer"].values[0])),
-                (
-                    "discretizer",
-                    eval(df_best_params["params.discretizer"].values[0]),
-                ),
-                ("scaler", eval(df_best_params["params.scaler"].values[0])),
-                ("model", model),
-            ]
-        )
-
-        pipe.fit(self.dados_X, self.dados_y)
-
-        # logar metricas de avaliação
-        y_val_preds = pipe.predict_log_proba(self.dados_X)[:, 1]
-        model_eval = ModelEvaluation(model, self.dados_X, self.dados_y)
-        val_roc_auc = model_eval.evaluate_predictions(
-            self.dados_y, y_val_preds
-        )
-        mlflow.log_metric("valid_roc_auc", val_roc_auc)
-
-        # registrar o modelo
-        mlflow.sklearn.log_model(
-            pipe,
-            self.model_name,
-            pyfunc_predict_fn="predict_proba",
-            input_example=self.dados_X.iloc[[0]],
-            registered_model_name=self.model_name,
-        )
-        client = mlflow.MlflowClient()
-        model = client.get_registered_model(self.model_name)
-
-        client.set_registered_model_alias(
-            self.model_name, "modelo", model.latest_versions[-1].version
-        )
+            pipe = Pipeline(
+                [
+                    (
+                        "imputer",
+                        eval(df_best_params["params.imputer"].values[0]),
+                    ),
+                    (
+                        "discretizer",
+                        eval(df_best_params["params.discretizer"].values[0]),
+                    ),
+                    (
+                        "scaler",
+                        eval(df_best_params["params.scaler"].values[0]),
+                    ),
+                    ("model", model),
+                ]
+            )
+
+            with span("TrainModels.fit", rows=len(self.dados_X)):
+                pipe.fit(self.dados_X, self.dados_y)
+
+            # avaliação no conjunto de validação; sem ele, no próprio treino
+            if self.valid_X is not None:
+                X_eval, y_eval, prefix = self.valid_X, self.valid_y, "valid"
+            else:
+                X_eval, y_eval, prefix = self.dados_X, self.dados_y, "train"
+
+            # logar metricas de avaliação
+            y_val_probs = pipe.predict_proba(X_eval)[:, 1]
+            model_eval = ModelEvaluation(model, X_eval, y_eval)
+            val_roc_auc = model_eval.evaluate_predictions(y_eval, y_val_probs)
+            mlflow.log_metric(f"{prefix}_roc_auc", val_roc_auc)
+
+            # intervalos de confiança das métricas por bootstrap
+            df_intervals = model_eval.evaluate_with_intervals(
+                y_eval, y_val_probs
+            )
+            FastEvaluation.log_to_mlflow(df_intervals, prefix=prefix)
+
+            # ponto de corte de aprovação pela matriz de custos
+            segment_column = load_config_file().get("threshold_segment_column")
+            DecisionThreshold.optimize(
+                y_eval,
+                y_val_probs,
+                segments=X_eval[segment_column] if segment_column else None,
+            ).log_to_mlflow()
+
+            # importância das variáveis por permutação
+            with span("TrainModels.importance", rows=len(X_eval)):
+                df_importance = PermutationImportance().run(
+                    pipe, X_eval, y_eval
+                )
+            PermutationImportance.log_to_mlflow(df_importance)
+
+            # perfil de referência usado pelo monitoramento
+            profile = ReferenceProfile.from_training(
+                self.dados_X, self.dados_y, pipe
+            )
+            mlflow.log_artifact(profile.save())
+
+            # tempo e memória de cada etapa do treino
+            instrumentation.log_to_mlflow()
+
+            # registrar o modelo
+            mlflow.sklearn.log_model(
+                pipe,
+                self.model_name,
+                pyfunc_predict_fn="predict_proba",
+                input_example=self.dados_X.iloc[[0]],
+                registered_model_name=self.model_name,
+            )
+            client = mlflow.MlflowClient()
+            model = client.get_registered_model(self.model_name)
+
+            client.set_registered_model_alias(
+                self.model_name, "modelo", model.latest_versions[-1].version
+            )
@@ -0,0 +1,454 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import mlflow
+import structlog
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+# o MLFLOW_TRACKING_URI do ambiente (ex.: o exportado pelo Makefile) prevalece
+if "MLFLOW_TRACKING_URI" not in os.environ:
+    mlflow.set_tracking_uri("http://127.0.0.1:5000")
+
+
+def registry_reachable(timeout: float) -> bool:
+    """
+    Verifica se o servidor de tracking aceita conexões.
+
+    Sem o servidor, as retentativas HTTP do MLflow levam muito tempo até
+    falhar; uma conexão TCP com timeout curto detecta a falta de rede antes.
+
+    Args:
+        timeout (float): O tempo máximo da conexão, em segundos.
+
+    Returns:
+        bool: False apenas quando o tracking é HTTP e não responde.
+    """
+
+    parsed = urlparse(mlflow.get_tracking_uri())
+    if parsed.scheme not in ("http", "https"):
+        return True
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        socket.create_connection((parsed.hostname, port), timeout).close()
+    except OSError:
+        return False
+    return True
+
+
+def directory_checksum(path: str) -> str:
+    """
+    Calcula o sha256 do conteúdo de um diretório.
+
+    O hash cobre o caminho relativo e o conteúdo de cada arquivo, em ordem,
+    então dois diretórios com os mesmos arquivos têm o mesmo checksum.
+
+    Args:
+        path (str): O diretório.
+
+    Returns:
+        str: O checksum em hexadecimal.
+    """
+
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def directory_size(path: str) -> int:
+    """
+    Calcula o tamanho total, em bytes, dos arquivos de um diretório.
+
+    Args:
+        path (str): O diretório.
+
+    Returns:
+        int: O tamanho em bytes.
+    """
+
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+class ArtifactCache:
+    """
+    Classe do cache local dos artefatos de modelos registrados.
+
+    Cada versão baixada do registro é gravada em `objects/<sha256>`, com o
+    checksum do conteúdo como endereço, e o índice `index.json` liga
+    `modelo/versão` ao checksum. Os aliases resolvidos também ficam no
+    índice, então uma versão já em cache é encontrada sem o servidor de
+    tracking; um servidor inacessível é detectado em `registry_timeout`
+    segundos, sem esperar as retentativas do MLflow. Quando o cache passa
+    de `max_bytes`, as versões usadas há mais tempo são removidas. O índice
+    é protegido por um lock de arquivo, o que permite vários workers
+    compartilharem o mesmo diretório.
+
+    Attributes:
+        cache_dir (str): O diretório do cache.
+        max_bytes (int): O tamanho máximo do cache.
+        registry_timeout (float): O tempo para detectar o servidor de
+            tracking inacessível.
+
+    Methods:
+        resolve: Resolve um URI `models:/` para o nome e a versão.
+        get: Retorna o caminho local de um modelo, baixando-o se preciso.
+        load_model: Carrega um modelo sklearn pelo cache.
+        get_artifact: Retorna um artefato do run de uma versão registrada.
+        prefetch: Baixa modelos para o cache antecipadamente.
+        evict: Remove as versões menos usadas até caber no limite.
+        entries: Lista as versões em cache.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        registry_timeout: Optional[float] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe ArtifactCache.
+
+        Args:
+            cache_dir (str, opcional): O diretório do cache. Padrão é o
+                `path_artifact_cache` do config.yaml.
+            max_bytes (int, opcional): O tamanho máximo do cache. Padrão é o
+                `artifact_cache_max_bytes` do config.yaml.
+            registry_timeout (float, opcional): O tempo, em segundos, para
+                detectar o servidor de tracking inacessível. Padrão é o
+                `artifact_cache_registry_timeout` do config.yaml.
+        """
+
+        config = load_config_file()
+        self.cache_dir = get_project_path(
+            cache_dir or config.get("path_artifact_cache", "models/cache")
+        )
+        self.max_bytes = max_bytes or config.get(
+            "artifact_cache_max_bytes", 2 * 1024**3
+        )
+        self.registry_timeout = registry_timeout or config.get(
+            "artifact_cache_registry_timeout", 2
+        )
+        os.makedirs(os.path.join(self.cache_dir, "objects"), exist_ok=True)
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+
+    @contextmanager
+    def _index(self) -> Iterator[Dict[str, Any]]:
+        """
+        Abre o índice com lock exclusivo e o grava ao final.
+
+        Yields:
+            Dict[str, Any]: O índice, com as chaves 'versions' e 'aliases'.
+        """
+
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = {"versions": {}, "aliases": {}}
+            if os.path.exists(self._index_path):
+                with open(self._index_path) as f:
+                    index = json.load(f)
+
+            yield index
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmp_path, self._index_path)
+
+    def resolve(self, model_uri: str) -> Tuple[str, str]:
+        """
+        Resolve um URI `models:/` para o nome e a versão do modelo.
+
+        Aliases são resolvidos no registro do MLflow e o resultado fica
+        gravado no índice. Sem acesso ao servidor, é usada a última versão
+        resolvida para o alias.
+
+        Args:
+            model_uri (str): 'models:/<nome>/<versão>' ou
+                'models:/<nome>@<alias>'.
+
+        Returns:
+            Tuple[str, str]: O nome e a versão do modelo.
+
+        Raises:
+            ValueError: Se o URI não for do registro de modelos.
+        """
+
+        if not model_uri.startswith("models:/"):
+            raise ValueError(f"URI não é do registro de modelos: {model_uri}")
+
+        path = model_uri[len("models:/") :]
+        if "@" not in path:
+            name, version = path.rsplit("/", 1)
+            return name, version
+
+        name, alias = path.rsplit("@", 1)
+        if registry_reachable(self.registry_timeout):
+            try:
+                version = str(
+                    mlflow.MlflowClient()
+                    .get_model_version_by_alias(name, alias)
+                    .version
+                )
+            except Exception as e:
+                error = e
+            else:
+                with self._index() as index:
+                    index["aliases"][f"{name}@{alias}"] = version
+                return name, version
+        else:
+            error = ConnectionError(
+                f"Servidor de tracking {mlflow.get_tracking_uri()} "
+                "inacessível."
+            )
+
+        with self._index() as index:
+            version = index["aliases"].get(f"{name}@{alias}")
+        if version is None:
+            raise error
+        logger.warning(
+            f"Registro indisponível ({error}), usando a versão {version} "
+            f"em cache para {name}@{alias}."
+        )
+        return name, version
+
+    def get(self, model_uri: str) -> str:
+        """
+        Retorna o caminho local de um modelo, baixando-o se preciso.
+
+        Args:
+            model_uri (str): 'models:/<nome>/<versão>' ou
+                'models:/<nome>@<alias>'.
+
+        Returns:
+            str: O diretório local do modelo.
+        """
+
+        name, version = self.resolve(model_uri)
+        key = f"{name}/{version}"
+
+        with self._index() as index:
+            entry = index["versions"].get(key)
+            if entry is not None:
+                path = self._object_path(entry["checksum"])
+                if os.path.isdir(path):
+                    entry["last_access"] = time.time()
+                    return path
+                del index["versions"][key]
+
+        logger.info(f"Baixando {key} para o cache.")
+        download_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            local_path = mlflow.artifacts.download_artifacts(
+                artifact_uri=f"models:/{name}/{version}",
+                dst_path=download_dir,
+            )
+            checksum = directory_checksum(local_path)
+            path = self._object_path(checksum)
+            try:
+                os.replace(local_path, path)
+            except OSError:
+                # outro processo baixou o mesmo objeto ao mesmo tempo e já o
+                # gravou; como o nome é o checksum, o conteúdo é o mesmo
+                if not os.path.isdir(path):
+                    raise
+            size = directory_size(path)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+        with self._index() as index:
+            index["versions"][key] = {
+                "checksum": checksum,
+                "size": size,
+                "last_access": time.time(),
+            }
+            self._evict(index, keep=key)
+        return path
+
+    def load_model(self, model_uri: str) -> Any:
+        """
+        Carrega um modelo sklearn pelo cache.
+
+        Args:
+            model_uri (str): 'models:/<nome>/<versão>' ou
+                'models:/<nome>@<alias>'.
+
+        Returns:
+            O modelo carregado.
+        """
+
+        import mlflow.sklearn
+
+        return mlflow.sklearn.load_model(self.get(model_uri))
+
+    def get_artifact(self, model_uri: str, artifact_path: str) -> str:
+        """
+        Retorna o caminho local de um artefato do run de um modelo registrado.
+
+        Os artefatos gravados junto ao modelo (perfil de referência, corte de
+        decisão) ficam em `artifacts/<nome>/<versão>/`, então seguem a versão
+        resolvida: depois de um novo treino ou de um rollback do alias, o
+        artefato da nova versão é baixado. São arquivos pequenos e não
+        entram no limite de `max_bytes`.
+
+        Args:
+            model_uri (str): 'models:/<nome>/<versão>' ou
+                'models:/<nome>@<alias>'.
+            artifact_path (str): O caminho do artefato no run.
+
+        Returns:
+            str: O caminho local do artefato.
+        """
+
+        name, version = self.resolve(model_uri)
+        path = os.path.join(
+            self.cache_dir, "artifacts", name, version, artifact_path
+        )
+        if os.path.exists(path):
+            return path
+
+        run_id = mlflow.MlflowClient().get_model_version(name, version).run_id
+        download_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            local_path = mlflow.artifacts.download_artifacts(
+                run_id=run_id,
+                artifact_path=artifact_path,
+                dst_path=download_dir,
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(local_path, path)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+        return path
+
+    def prefetch(self, model_uris: List[str]) -> List[str]:
+        """
+        Baixa modelos para o cache antecipadamente.
+
+        Args:
+            model_uris (List[str]): Os URIs dos modelos.
+
+        Returns:
+            List[str]: Os diretórios locais dos modelos.
+        """
+
+        return [self.get(model_uri) for model_uri in model_uris]
+
+    def evict(self) -> None:
+        """
+        Remove as versões menos usadas até o cache caber no limite.
+        """
+
+        with self._index() as index:
+            self._evict(index)
+
+    def _evict(
+        self, index: Dict[str, Any], keep: Optional[str] = None
+    ) -> None:
+        """
+        Remove as versões menos usadas até o cache caber no limite.
+
+        Um objeto só é apagado quando nenhuma versão do índice aponta para
+        ele. Deve ser chamado com o índice aberto.
+
+        Args:
+            index (Dict[str, Any]): O índice aberto.
+            keep (str, opcional): Uma versão que não deve ser removida.
+        """
+
+        versions = index["versions"]
+        sizes = {
+            entry["checksum"]: entry["size"] for entry in versions.values()
+        }
+        total = sum(sizes.values())
+
+        for key in sorted(versions, key=lambda k: versions[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            checksum = versions.pop(key)["checksum"]
+            if all(e["checksum"] != checksum for e in versions.values()):
+                shutil.rmtree(self._object_path(checksum), ignore_errors=True)
+                total -= sizes[checksum]
+            logger.info(f"{key} removido do cache.")
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Lista as versões em cache.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Checksum, tamanho e último acesso de
+                cada versão.
+        """
+
+        with self._index() as index:
+            return dict(index["versions"])
+
+    def _object_path(self, checksum: str) -> str:
+        """
+        Retorna o diretório de um objeto do cache.
+
+        Args:
+            checksum (str): O checksum do objeto.
+
+        Returns:
+            str: O diretório do objeto.
+        """
+
+        return os.path.join(self.cache_dir, "objects", checksum)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "model_uris",
+        nargs="*",
+        help="URIs dos modelos. Padrão é models:/<model_name>@modelo.",
+    )
+    parser.add_argument(
+        "--print-path",
+        action="store_true",
+        help="Imprime apenas o diretório local de cada modelo.",
+    )
+    args = parser.parse_args()
+
+    if args.print_path:
+        # mantém a saída padrão apenas com os caminhos
+        structlog.configure(
+            logger_factory=structlog.PrintLoggerFactory(sys.stderr)
+        )
+
+    model_uris = args.model_uris or [
+        f"models:/{load_config_file().get('model_name')}@modelo"
+    ]
+    paths = ArtifactCache().prefetch(model_uris)
+    if args.print_path:
+        print("\n".join(paths))
+    else:
+        for model_uri, path in zip(model_uris, paths):
+            logger.info(f"{model_uri} em cache: {path}")
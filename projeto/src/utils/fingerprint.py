@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple, Union
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import numpy as np
+import pandas as pd
+import structlog
+from utils.utils import load_config_file
+
+logger = structlog.getLogger()
+
+DIGEST_SIZE = 16
+
+# impressões de arquivos já calculadas, por (caminho, tamanho, mtime)
+_FILE_CACHE: Dict[Tuple[str, int, int], str] = {}
+
+
+def _settings(
+    chunk_mb: Optional[int], n_jobs: Optional[int]
+) -> Tuple[int, int]:
+    """
+    Resolve o tamanho dos blocos e a quantidade de threads.
+
+    Args:
+        chunk_mb (int, opcional): O tamanho de cada bloco, em MB.
+        n_jobs (int, opcional): A quantidade de threads.
+
+    Returns:
+        Tuple[int, int]: O tamanho dos blocos em bytes e as threads.
+    """
+
+    config = load_config_file()
+    chunk_mb = chunk_mb or config.get("fingerprint_chunk_mb", 8)
+    n_jobs = n_jobs or config.get("fingerprint_n_jobs") or os.cpu_count()
+    return chunk_mb * 1024**2, n_jobs
+
+
+def _hash_range(path: str, start: int, size: int) -> bytes:
+    """
+    Calcula o hash de um trecho de um arquivo.
+
+    Args:
+        path (str): O arquivo.
+        start (int): O byte inicial.
+        size (int): A quantidade de bytes.
+
+    Returns:
+        bytes: O hash do trecho.
+    """
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.blake2b(f.read(size), digest_size=DIGEST_SIZE).digest()
+
+
+def file_fingerprint(
+    path: str, chunk_mb: Optional[int] = None, n_jobs: Optional[int] = None
+) -> str:
+    """
+    Calcula a impressão digital do conteúdo de um arquivo.
+
+    O arquivo é dividido em blocos de `chunk_mb`, cada um com seu hash
+    BLAKE2b calculado em uma thread (o hashlib libera o GIL), e a impressão
+    é o hash do tamanho e da sequência dos hashes dos blocos. O resultado
+    depende apenas do conteúdo e do tamanho dos blocos, não do nome nem da
+    data de modificação. Dentro do processo, o resultado é reaproveitado
+    enquanto o tamanho e a data de modificação não mudam.
+
+    Args:
+        path (str): O arquivo.
+        chunk_mb (int, opcional): O tamanho de cada bloco. Padrão é o
+            `fingerprint_chunk_mb` do config.yaml.
+        n_jobs (int, opcional): A quantidade de threads. Padrão é o
+            `fingerprint_n_jobs` do config.yaml ou a quantidade de CPUs.
+
+    Returns:
+        str: A impressão digital, em hexadecimal.
+    """
+
+    chunk_bytes, n_jobs = _settings(chunk_mb, n_jobs)
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key in _FILE_CACHE:
+        return _FILE_CACHE[key]
+
+    starts = range(0, stat.st_size, chunk_bytes)
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        digests = executor.map(
+            lambda start: _hash_range(path, start, chunk_bytes), starts
+        )
+        combined = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        combined.update(f"file:{stat.st_size}:{chunk_bytes}".encode())
+        for digest in digests:
+            combined.update(digest)
+
+    _FILE_CACHE[key] = combined.hexdigest()
+    return _FILE_CACHE[key]
+
+
+def _column_digest(series: pd.Series) -> bytes:
+    """
+    Calcula o hash de uma coluna, considerando o nome e o tipo.
+
+    Colunas numéricas, booleanas e de datas são lidas direto da memória;
+    nas anuláveis (Int64, Float64, boolean), os valores e a máscara de
+    ausentes. As demais (texto, categorias) usam o hash vetorizado do
+    pandas, que já depende do tipo.
+
+    Args:
+        series (pd.Series): A coluna.
+
+    Returns:
+        bytes: O hash da coluna.
+    """
+
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(f"{series.name}:{series.dtype}".encode())
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        values = np.ascontiguousarray(series.to_numpy())
+    elif hasattr(dtype, "numpy_dtype") and dtype.kind in "biuf":
+        mask = series.isna().to_numpy()
+        digest.update(np.packbits(mask))
+        values = series.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+    else:
+        values = pd.util.hash_pandas_object(series, index=False).to_numpy()
+    digest.update(values.view(np.uint8))
+    return digest.digest()
+
+
+def frame_fingerprint(
+    *frames: Union[pd.DataFrame, pd.Series], n_jobs: Optional[int] = None
+) -> str:
+    """
+    Calcula a impressão digital de DataFrames e Series em memória.
+
+    Cada coluna tem seu hash calculado em uma thread, a partir do nome, do
+    tipo e dos valores na ordem das linhas; o índice é ignorado. A impressão
+    combina a forma e os hashes das colunas de todos os objetos, então
+    `frame_fingerprint(X, y)` identifica um conjunto de treino completo.
+
+    Args:
+        *frames (Union[pd.DataFrame, pd.Series]): Os dados.
+        n_jobs (int, opcional): A quantidade de threads. Padrão é o
+            `fingerprint_n_jobs` do config.yaml ou a quantidade de CPUs.
+
+    Returns:
+        str: A impressão digital, em hexadecimal.
+    """
+
+    _, n_jobs = _settings(None, n_jobs)
+    frames = [
+        frame.to_frame() if isinstance(frame, pd.Series) else frame
+        for frame in frames
+    ]
+    columns = [
+        frame.iloc[:, i] for frame in frames for i in range(frame.shape[1])
+    ]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        digests = list(executor.map(_column_digest, columns))
+
+    combined = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for frame in frames:
+        combined.update(f"frame:{frame.shape}".encode())
+    for digest in digests:
+        combined.update(digest)
+    return combined.hexdigest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="Os arquivos.")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(f"{file_fingerprint(path)}  {path}")
@@ -0,0 +1,363 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import structlog
+from utils.utils import load_config_file
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = structlog.getLogger()
+
+COUNTERS = ("calls", "errors", "seconds", "rows", "bytes_in", "bytes_out")
+
+# totais acumulados por span, exportados para o Prometheus e o MLflow
+_TOTALS: Dict[str, Dict[str, float]] = {}
+_LOCK = threading.Lock()
+_SETTINGS: Dict[str, Any] = {}
+_PARENT: contextvars.ContextVar = contextvars.ContextVar(
+    "span_parent", default=None
+)
+
+
+def _log_spans() -> bool:
+    """
+    Lê uma única vez se os spans são registrados no log.
+
+    Returns:
+        bool: O `instrumentation_log_spans` do config.yaml.
+    """
+
+    if not _SETTINGS:
+        _SETTINGS["log_spans"] = load_config_file().get(
+            "instrumentation_log_spans", True
+        )
+    return _SETTINGS["log_spans"]
+
+
+def rss_mb() -> Optional[float]:
+    """
+    Lê a memória residente atual do processo.
+
+    Returns:
+        Optional[float]: A RSS em MB, ou None fora do Linux.
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Lê o pico de memória residente do processo desde o início.
+
+    Returns:
+        Optional[float]: O pico da RSS em MB, ou None sem o módulo
+            `resource`.
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # o Linux informa em KB e o macOS em bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def count_rows(obj: Any) -> Optional[int]:
+    """
+    Conta as linhas de um DataFrame, Series ou array.
+
+    Args:
+        obj: O objeto.
+
+    Returns:
+        Optional[int]: A quantidade de linhas, ou None para outros tipos.
+    """
+
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+class Span:
+    """
+    Classe de um span: uma etapa medida do pipeline.
+
+    Usada como gerenciador de contexto, mede a duração, a variação e o pico
+    da memória residente e, quando informados, as linhas processadas e os
+    bytes recebidos (`bytes_in`) e enviados (`bytes_out`). Ao final, emite um
+    evento `span` no structlog e soma os valores aos totais do processo,
+    exportados por `prometheus_text` e `log_to_mlflow`. Spans abertos dentro
+    de outro span registram o nome dele em `parent`.
+
+    Attributes:
+        name (str): O nome da etapa (ex.: 'DataPreprocess.transform').
+        rows (int): As linhas processadas.
+        bytes_in (int): Os bytes recebidos (leitura, resposta HTTP).
+        bytes_out (int): Os bytes enviados (escrita, requisição HTTP).
+        fields (Dict[str, Any]): Campos extras do evento.
+        seconds (float): A duração, preenchida ao sair do contexto.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rows: Optional[int] = None,
+        bytes_in: Optional[int] = None,
+        bytes_out: Optional[int] = None,
+        **fields: Any,
+    ) -> None:
+        """
+        Inicializa uma instância da classe Span.
+
+        Args:
+            name (str): O nome da etapa.
+            rows (int, opcional): As linhas processadas. Pode ser informado
+                dentro do bloco, em `span.rows`.
+            bytes_in (int, opcional): Os bytes recebidos.
+            bytes_out (int, opcional): Os bytes enviados.
+            **fields: Campos extras do evento.
+        """
+
+        self.name = name
+        self.rows = rows
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.fields = fields
+        self.seconds = None
+
+    def __enter__(self) -> "Span":
+        """
+        Inicia a medição.
+        """
+
+        self._parent = _PARENT.get()
+        self._token = _PARENT.set(self.name)
+        self._rss = rss_mb()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        """
+        Encerra a medição, registra o evento e soma os totais.
+        """
+
+        self.seconds = time.perf_counter() - self._started
+        _PARENT.reset(self._token)
+        rss = rss_mb()
+
+        values = {
+            "calls": 1,
+            "errors": int(exc_type is not None),
+            "seconds": self.seconds,
+            "rows": self.rows or 0,
+            "bytes_in": self.bytes_in or 0,
+            "bytes_out": self.bytes_out or 0,
+        }
+        with _LOCK:
+            totals = _TOTALS.setdefault(self.name, dict.fromkeys(COUNTERS, 0))
+            for counter in COUNTERS:
+                totals[counter] += values[counter]
+
+        if not _log_spans():
+            return
+        event = {
+            "span": self.name,
+            "parent": self._parent,
+            "seconds": round(self.seconds, 6),
+            "rows": self.rows,
+            "rows_per_s": (
+                round(self.rows / self.seconds, 1)
+                if self.rows and self.seconds > 0
+                else None
+            ),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "rss_delta_mb": (
+                round(rss - self._rss, 2) if rss is not None else None
+            ),
+            "peak_rss_mb": peak_rss_mb(),
+            "error": exc_type.__name__ if exc_type is not None else None,
+            **self.fields,
+        }
+        logger.info(
+            "span",
+            **{key: val for key, val in event.items() if val is not None},
+        )
+
+
+def span(name: str, rows: Optional[int] = None, **fields: Any) -> Span:
+    """
+    Cria um span para medir um bloco com `with`.
+
+    Args:
+        name (str): O nome da etapa.
+        rows (int, opcional): As linhas processadas.
+        **fields: `bytes_in`, `bytes_out` ou campos extras do evento.
+
+    Returns:
+        Span: O span, usado como gerenciador de contexto.
+    """
+
+    return Span(name, rows=rows, **fields)
+
+
+def instrument(name: Optional[str] = None) -> Callable:
+    """
+    Decorador que mede cada chamada de uma função em um span.
+
+    As linhas são as do primeiro argumento com `shape` (DataFrame, Series
+    ou array) ou, na falta dele, as do retorno.
+
+    Args:
+        name (str, opcional): O nome do span. Padrão é o `__qualname__` da
+            função (ex.: 'Predict.run').
+
+    Returns:
+        Callable: O decorador.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with Span(span_name) as current:
+                current.rows = next(
+                    (
+                        rows
+                        for rows in map(count_rows, [*args, *kwargs.values()])
+                        if rows is not None
+                    ),
+                    None,
+                )
+                result = func(*args, **kwargs)
+                if current.rows is None:
+                    current.rows = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def totals() -> Dict[str, Dict[str, float]]:
+    """
+    Copia os totais acumulados por span.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Chamadas, erros, segundos, linhas e
+            bytes de cada span.
+    """
+
+    with _LOCK:
+        return {name: dict(values) for name, values in _TOTALS.items()}
+
+
+def reset() -> None:
+    """
+    Zera os totais acumulados.
+    """
+
+    with _LOCK:
+        _TOTALS.clear()
+
+
+def prometheus_text(namespace: str = "pipeline") -> str:
+    """
+    Exporta os totais no formato de texto do Prometheus.
+
+    Cada contador vira uma série `<namespace>_span_<contador>_total` com o
+    rótulo `span`, acompanhada da RSS atual e do pico do processo. Serve
+    tanto para o `/metrics/prometheus` do servidor quanto para o textfile
+    collector do node_exporter em jobs de lote (ver `write_prometheus`).
+
+    Args:
+        namespace (str, opcional): O prefixo das séries. Padrão é
+            'pipeline'.
+
+    Returns:
+        str: As métricas no formato de exposição do Prometheus.
+    """
+
+    snapshot = totals()
+    lines = []
+    for counter in COUNTERS:
+        metric = f"{namespace}_span_{counter}_total"
+        lines += [
+            f"# HELP {metric} Total de {counter} por span.",
+            f"# TYPE {metric} counter",
+        ]
+        for name in sorted(snapshot):
+            lines.append(
+                f'{metric}{{span="{name}"}} {snapshot[name][counter]:g}'
+            )
+
+    for metric, value in (
+        ("process_rss_bytes", rss_mb()),
+        ("process_peak_rss_bytes", peak_rss_mb()),
+    ):
+        if value is not None:
+            lines += [
+                f"# TYPE {namespace}_{metric} gauge",
+                f"{namespace}_{metric} {value * 1024**2:.0f}",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, namespace: str = "pipeline") -> None:
+    """
+    Grava os totais em um arquivo para o textfile collector.
+
+    A escrita é atômica, então o coletor nunca lê um arquivo pela metade.
+
+    Args:
+        path (str): O caminho do arquivo `.prom`.
+        namespace (str, opcional): O prefixo das séries.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text(namespace))
+    os.replace(tmp_path, path)
+
+
+def log_to_mlflow(prefix: str = "span") -> None:
+    """
+    Registra os totais por span no run ativo do MLflow.
+
+    Para cada span, registra os segundos, as linhas por segundo e as
+    chamadas, além do pico de memória do processo.
+
+    Args:
+        prefix (str, opcional): O prefixo das métricas. Padrão é 'span'.
+    """
+
+    import mlflow
+
+    metrics = {}
+    for name, values in totals().items():
+        key = f"{prefix}.{name}"
+        metrics[f"{key}.seconds"] = values["seconds"]
+        metrics[f"{key}.calls"] = values["calls"]
+        if values["rows"] and values["seconds"] > 0:
+            metrics[f"{key}.rows_per_s"] = values["rows"] / values["seconds"]
+    peak = peak_rss_mb()
+    if peak is not None:
+        metrics[f"{prefix}.peak_rss_mb"] = peak
+    mlflow.log_metrics(metrics)
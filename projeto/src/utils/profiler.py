@@ -0,0 +1,353 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import pandas as pd
+import structlog
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+
+def _frame_label(frame: Any) -> str:
+    """
+    Monta o rótulo de um frame no formato `módulo:função`.
+
+    Args:
+        frame: O frame.
+
+    Returns:
+        str: O rótulo, sem `;` nem espaços, como pede o formato colapsado.
+    """
+
+    module = frame.f_globals.get("__name__", "?")
+    label = f"{module}:{frame.f_code.co_name}"
+    return label.replace(";", ":").replace(" ", "_")
+
+
+class Profiler:
+    """
+    Classe do perfilador por amostragem com rastreamento de alocações.
+
+    Uma thread em segundo plano lê a pilha de todas as threads a cada
+    `interval_ms` (`sys._current_frames`), sem instrumentar as chamadas,
+    então o custo é fixo por amostra e não cresce com a quantidade de
+    funções chamadas. O tempo medido é o de parede, então esperas de I/O,
+    locks e chamadas HTTP aparecem na pilha onde acontecem. Processos filhos
+    (pools de processos) não são amostrados.
+
+    O `tracemalloc` dobra o tempo de código que aloca muito (pandas), então
+    fica ligado apenas em rajadas: `alloc_duty` de cada `alloc_period`
+    segundos. Ao fim de cada rajada, os locais com mais memória viva alocada
+    nela são somados ao resumo, que guarda o maior valor visto de cada
+    local. Com `alloc_duty` 1, o rastreamento é contínuo.
+
+    Ao final, grava no diretório do perfil:
+
+    - `<nome>.collapsed`: as pilhas no formato colapsado (`a;b;c N`), lido
+      pelo `flamegraph.pl`, speedscope ou inferno para gerar o flamegraph;
+    - `<nome>_modules.csv`: o tempo próprio (frame do topo) e o inclusivo
+      (em qualquer posição da pilha) de cada módulo;
+    - `<nome>_allocations.csv`: os locais que mais alocaram memória.
+
+    Attributes:
+        name (str): O nome do job perfilado.
+        interval_ms (float): O intervalo entre amostras.
+        alloc_frames (int): Os frames guardados por alocação (0 desliga o
+            tracemalloc).
+        alloc_duty (float): A fração do tempo com o tracemalloc ligado.
+        alloc_period (float): O período das rajadas, em segundos.
+        top_allocations (int): Quantos locais de alocação gravar.
+        output_dir (str): O diretório do perfil.
+        log_to_mlflow (bool): Se os arquivos vão para o run do MLflow.
+        stacks (Counter): As amostras de cada pilha.
+        samples (int): A quantidade de amostras.
+        allocations (Dict[Tuple[str, int], Dict[str, float]]): O maior
+            volume vivo e a maior quantidade de blocos de cada local.
+        peak_alloc_mb (float): O pico de memória rastreada nas rajadas.
+
+    Methods:
+        start: Inicia a amostragem e o tracemalloc.
+        stop: Encerra a amostragem e grava o perfil.
+        module_breakdown: Resume o tempo por módulo.
+        allocation_sites: Lista os locais que mais alocaram memória.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        interval_ms: Optional[float] = None,
+        alloc_frames: Optional[int] = None,
+        alloc_duty: Optional[float] = None,
+        alloc_period: Optional[float] = None,
+        top_allocations: int = 50,
+        output_dir: Optional[str] = None,
+        log_to_mlflow: bool = False,
+    ) -> None:
+        """
+        Inicializa uma instância da classe Profiler.
+
+        Args:
+            name (str): O nome do job (ex.: 'train').
+            interval_ms (float, opcional): O intervalo entre amostras. Padrão
+                é o `profile_interval_ms` do config.yaml.
+            alloc_frames (int, opcional): Os frames por alocação. Padrão é o
+                `profile_alloc_frames` do config.yaml.
+            alloc_duty (float, opcional): A fração do tempo com o
+                tracemalloc ligado. Padrão é o `profile_alloc_duty` do
+                config.yaml.
+            alloc_period (float, opcional): O período das rajadas. Padrão é
+                o `profile_alloc_period_seconds` do config.yaml.
+            top_allocations (int, opcional): Quantos locais de alocação
+                gravar. Padrão é 50.
+            output_dir (str, opcional): O diretório do perfil. Padrão é um
+                subdiretório com o nome e o instante em `path_profiles`.
+            log_to_mlflow (bool, opcional): Registra os arquivos como
+                artefatos do run ativo (ou do último run) do MLflow. Padrão é
+                False.
+        """
+
+        config = load_config_file()
+        self.name = name
+        self.interval_ms = interval_ms or config.get("profile_interval_ms", 20)
+        self.alloc_frames = (
+            alloc_frames
+            if alloc_frames is not None
+            else config.get("profile_alloc_frames", 1)
+        )
+        self.alloc_duty = alloc_duty or config.get("profile_alloc_duty", 0.1)
+        self.alloc_period = alloc_period or config.get(
+            "profile_alloc_period_seconds", 10
+        )
+        self.top_allocations = top_allocations
+        self.output_dir = output_dir or get_project_path(
+            config.get("path_profiles", "profiles"),
+            f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+        )
+        self.log_to_mlflow = log_to_mlflow
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.allocations: Dict[Tuple[str, int], Dict[str, float]] = {}
+        self.peak_alloc_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._trace = False
+
+    def _sample(self) -> None:
+        """
+        Lê a pilha de todas as threads até o perfilador ser encerrado.
+        """
+
+        own_id = threading.get_ident()
+        interval = self.interval_ms / 1000
+        burst_start = time.perf_counter()
+        while not self._stop.wait(interval):
+            if self._trace:
+                now = time.perf_counter()
+                tracing = tracemalloc.is_tracing()
+                if tracing and now >= burst_start + (
+                    self.alloc_duty * self.alloc_period
+                ):
+                    self._end_burst()
+                elif not tracing and now >= burst_start + self.alloc_period:
+                    burst_start = now
+                    tracemalloc.start(self.alloc_frames)
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> "Profiler":
+        """
+        Inicia a amostragem e o tracemalloc.
+
+        Returns:
+            Profiler: Esta instância.
+        """
+
+        # não interfere em um tracemalloc iniciado por outro código
+        self._trace = bool(self.alloc_frames) and not tracemalloc.is_tracing()
+        if self._trace:
+            tracemalloc.start(self.alloc_frames)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample, name="profiler", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Perfilando {self.name} a cada {self.interval_ms} ms.")
+        return self
+
+    def module_breakdown(self) -> pd.DataFrame:
+        """
+        Resume o tempo por módulo.
+
+        O tempo próprio conta as amostras em que o módulo está no topo da
+        pilha; o inclusivo, as amostras em que ele aparece em qualquer
+        posição. Os segundos são estimados pelo intervalo de amostragem.
+
+        Returns:
+            pd.DataFrame: As amostras, os segundos e a fração do tempo
+                próprio e inclusivo de cada módulo.
+        """
+
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            # o primeiro elemento é o nome da thread
+            modules = [frame.split(":")[0] for frame in stack.split(";")[1:]]
+            if not modules:
+                continue
+            own[modules[-1]] += count
+            for module in set(modules):
+                inclusive[module] += count
+
+        total = sum(own.values()) or 1
+        seconds = self.interval_ms / 1000
+        df_modules = pd.DataFrame(
+            {
+                "self_samples": pd.Series(own, dtype="int64"),
+                "total_samples": pd.Series(inclusive, dtype="int64"),
+            }
+        ).fillna(0)
+        df_modules["self_seconds"] = df_modules["self_samples"] * seconds
+        df_modules["total_seconds"] = df_modules["total_samples"] * seconds
+        df_modules["self_share"] = df_modules["self_samples"] / total
+        df_modules["total_share"] = df_modules["total_samples"] / total
+        return df_modules.rename_axis("module").sort_values(
+            "self_samples", ascending=False
+        )
+
+    def _end_burst(self) -> None:
+        """
+        Encerra uma rajada do tracemalloc e soma os locais de alocação.
+        """
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
+        self.peak_alloc_mb = max(
+            self.peak_alloc_mb, tracemalloc.get_traced_memory()[1] / 1024**2
+        )
+        tracemalloc.stop()
+
+        for stat in snapshot.statistics("lineno")[: self.top_allocations]:
+            frame = stat.traceback[0]
+            site = self.allocations.setdefault(
+                (frame.filename, frame.lineno), {"size_mb": 0, "blocks": 0}
+            )
+            site["size_mb"] = max(site["size_mb"], stat.size / 1024**2)
+            site["blocks"] = max(site["blocks"], stat.count)
+
+    def allocation_sites(self) -> pd.DataFrame:
+        """
+        Lista os locais que mais alocaram memória.
+
+        Returns:
+            pd.DataFrame: O arquivo, a linha, o maior volume vivo (MB) e a
+                maior quantidade de blocos de cada local ao fim das rajadas.
+        """
+
+        rows: List[Dict[str, Any]] = [
+            {"file": file, "line": line, **site}
+            for (file, line), site in self.allocations.items()
+        ]
+        df_sites = pd.DataFrame(
+            rows, columns=["file", "line", "size_mb", "blocks"]
+        )
+        return (
+            df_sites.sort_values("size_mb", ascending=False)
+            .head(self.top_allocations)
+            .reset_index(drop=True)
+        )
+
+    def stop(self) -> str:
+        """
+        Encerra a amostragem, grava o perfil e, se pedido, o registra no
+        MLflow.
+
+        Returns:
+            str: O diretório do perfil.
+        """
+
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.perf_counter() - self._started
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        with open(
+            os.path.join(self.output_dir, f"{self.name}.collapsed"), "w"
+        ) as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        df_modules = self.module_breakdown()
+        df_modules.to_csv(
+            os.path.join(self.output_dir, f"{self.name}_modules.csv")
+        )
+
+        if self._trace:
+            if tracemalloc.is_tracing():
+                self._end_burst()
+            self.allocation_sites().to_csv(
+                os.path.join(self.output_dir, f"{self.name}_allocations.csv"),
+                index=False,
+            )
+
+        logger.info(
+            f"Perfil de {self.name}: {elapsed:.1f} s, {self.samples} "
+            f"amostras, pico alocado {self.peak_alloc_mb:.1f} MB, módulos "
+            f"mais lentos {df_modules.index[:3].tolist()}. Gravado em "
+            f"{self.output_dir}."
+        )
+        if self.log_to_mlflow:
+            self._log_to_mlflow()
+        return self.output_dir
+
+    def _log_to_mlflow(self) -> None:
+        """
+        Registra os arquivos do perfil no run ativo ou, se o job já encerrou
+        seus runs, no último run do processo.
+        """
+
+        import mlflow
+
+        run = mlflow.active_run() or mlflow.last_active_run()
+        if run is None:
+            logger.warning("Nenhum run do MLflow para registrar o perfil.")
+            return
+        mlflow.MlflowClient().log_artifacts(
+            run.info.run_id, self.output_dir, artifact_path="profile"
+        )
+        logger.info(f"Perfil registrado no run {run.info.run_id}.")
+
+    def __enter__(self) -> "Profiler":
+        """
+        Permite perfilar um bloco `with`.
+        """
+
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        """
+        Grava o perfil ao final do bloco `with`, mesmo com erro.
+        """
+
+        self.stop()
@@ -0,0 +1,442 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../src"))
+
+import joblib
+import pandas as pd
+import structlog
+from utils.fingerprint import file_fingerprint, frame_fingerprint
+from utils.instrumentation import span
+from utils.utils import get_project_path, load_config_file
+
+logger = structlog.getLogger()
+
+
+def value_fingerprint(value: Any) -> str:
+    """
+    Calcula a impressão digital de uma saída de etapa.
+
+    Args:
+        value: A saída. DataFrames e Series usam `frame_fingerprint`; os
+            demais objetos, o `joblib.hash`.
+
+    Returns:
+        str: A impressão digital, em hexadecimal.
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return frame_fingerprint(value)
+    return joblib.hash(value)
+
+
+class Stage:
+    """
+    Classe de uma etapa do pipeline.
+
+    A função da etapa recebe as entradas como argumentos nomeados e retorna
+    uma saída, ou uma tupla na ordem de `outputs`. Os nomes das entradas são
+    saídas de outras etapas, o que define as arestas do DAG.
+
+    Attributes:
+        name (str): O nome da etapa.
+        func (Callable): A função executada.
+        inputs (List[str]): As saídas de outras etapas usadas.
+        outputs (List[str]): As saídas produzidas.
+        params (Dict[str, Any]): Os parâmetros que alteram o resultado, como
+            valores do config.yaml. Entram na chave do cache.
+        sources (List[str]): Os arquivos lidos pela etapa. O conteúdo deles
+            entra na chave do cache.
+        after (List[str]): Etapas que precisam terminar antes, sem passar
+            saídas (ex.: uma validação que interrompe o pipeline).
+        helpers (List[Callable]): Funções chamadas pela função da etapa cujo
+            código também entra na chave do cache.
+        cache (bool): Se a saída é reaproveitada. Etapas com efeitos que
+            devem acontecer a cada execução usam False.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        inputs: Optional[List[str]] = None,
+        outputs: Optional[List[str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        sources: Optional[List[str]] = None,
+        after: Optional[List[str]] = None,
+        helpers: Optional[List[Callable]] = None,
+        cache: bool = True,
+    ) -> None:
+        """
+        Inicializa uma instância da classe Stage.
+
+        Args:
+            name (str): O nome da etapa.
+            func (Callable): A função executada.
+            inputs (List[str], opcional): As saídas de outras etapas usadas.
+            outputs (List[str], opcional): As saídas produzidas. Padrão é
+                uma saída com o nome da etapa.
+            params (Dict[str, Any], opcional): Os parâmetros da etapa.
+            sources (List[str], opcional): Os arquivos lidos pela etapa.
+            after (List[str], opcional): Etapas que precisam terminar antes.
+            helpers (List[Callable], opcional): Funções auxiliares cujo
+                código entra na chave do cache.
+            cache (bool, opcional): Se a saída é reaproveitada. Padrão é
+                True.
+        """
+
+        self.name = name
+        self.func = func
+        self.inputs = inputs or []
+        self.outputs = outputs or [name]
+        self.params = params or {}
+        self.sources = sources or []
+        self.after = after or []
+        self.helpers = helpers or []
+        self.cache = cache
+
+    @staticmethod
+    def _source(func: Callable) -> str:
+        """
+        Obtém o código de uma função e os argumentos fixados por um
+        `functools.partial`.
+
+        Args:
+            func (Callable): A função.
+
+        Returns:
+            str: O código, ou o nome quando ele não está disponível.
+        """
+
+        bound = []
+        while isinstance(func, functools.partial):
+            bound.append(repr((func.args, func.keywords)))
+            func = func.func
+        try:
+            code = inspect.getsource(func)
+        except (OSError, TypeError):
+            code = getattr(func, "__qualname__", repr(func))
+        return code + "".join(bound)
+
+    def key(self, input_fingerprints: Dict[str, str]) -> str:
+        """
+        Calcula a chave do cache da etapa.
+
+        A chave cobre o código da função e das auxiliares, os parâmetros, o
+        conteúdo dos arquivos lidos e a impressão digital de cada entrada.
+        Uma etapa anterior executada de novo com o mesmo resultado não
+        invalida as seguintes.
+
+        Args:
+            input_fingerprints (Dict[str, str]): A impressão digital de cada
+                entrada.
+
+        Returns:
+            str: A chave, em hexadecimal.
+        """
+
+        content = {
+            "stage": self.name,
+            "code": [
+                self._source(func) for func in [self.func, *self.helpers]
+            ],
+            "params": self.params,
+            "sources": {path: file_fingerprint(path) for path in self.sources},
+            "inputs": {name: input_fingerprints[name] for name in self.inputs},
+        }
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+
+class StageRunner:
+    """
+    Classe para executar um DAG de etapas com cache por conteúdo.
+
+    As etapas formam um DAG pelas entradas e saídas declaradas. Cada etapa
+    tem uma chave calculada a partir do código, dos parâmetros, dos
+    arquivos lidos e da impressão digital das entradas (ver `Stage.key`).
+    As saídas ficam em `<cache_dir>/<etapa>/<chave>.joblib`, com as
+    impressões das saídas em `<chave>.json`. Numa nova execução, uma etapa
+    com a chave já gravada é pulada, e as saídas dela só são lidas do disco
+    se alguma etapa seguinte precisar executar. Etapas sem dependência entre
+    si executam em paralelo, em threads.
+
+    Attributes:
+        stages (Dict[str, Stage]): As etapas, pelo nome.
+        cache_dir (str): O diretório do cache.
+        n_jobs (int): As etapas executadas ao mesmo tempo.
+
+    Methods:
+        run: Executa as etapas necessárias para as saídas pedidas.
+    """
+
+    def __init__(
+        self,
+        stages: Iterable[Stage],
+        cache_dir: Optional[str] = None,
+        n_jobs: Optional[int] = None,
+    ) -> None:
+        """
+        Inicializa uma instância da classe StageRunner.
+
+        Args:
+            stages (Iterable[Stage]): As etapas.
+            cache_dir (str, opcional): O diretório do cache. Padrão é o
+                `path_stage_cache` do config.yaml.
+            n_jobs (int, opcional): As etapas executadas ao mesmo tempo.
+                Padrão é o `stage_runner_n_jobs` do config.yaml ou a
+                quantidade de CPUs.
+
+        Raises:
+            ValueError: Se uma saída for produzida por duas etapas, se uma
+                entrada não for produzida por nenhuma etapa ou se houver um
+                ciclo.
+        """
+
+        config = load_config_file()
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir or get_project_path(
+            config.get("path_stage_cache", "models/stage_cache")
+        )
+        self.n_jobs = (
+            n_jobs or config.get("stage_runner_n_jobs") or os.cpu_count()
+        )
+
+        self._producer: Dict[str, str] = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in self._producer:
+                    raise ValueError(
+                        f"A saída {output} é produzida por "
+                        f"{self._producer[output]} e {stage.name}."
+                    )
+                self._producer[output] = stage.name
+        for stage in self.stages.values():
+            missing = set(stage.inputs) - set(self._producer)
+            if missing:
+                raise ValueError(
+                    f"A etapa {stage.name} usa entradas sem etapa: {missing}."
+                )
+            unknown = set(stage.after) - set(self.stages)
+            if unknown:
+                raise ValueError(
+                    f"A etapa {stage.name} espera etapas inexistentes: "
+                    f"{unknown}."
+                )
+        self._order = self._topological_order()
+
+    def _upstream(self, stage: Stage) -> List[str]:
+        """
+        Lista as etapas que precisam terminar antes de uma etapa.
+
+        Args:
+            stage (Stage): A etapa.
+
+        Returns:
+            List[str]: As etapas que produzem as entradas dela e as de
+                `after`, sem repetição.
+        """
+
+        return list(
+            dict.fromkeys(
+                [self._producer[i] for i in stage.inputs] + stage.after
+            )
+        )
+
+    def _topological_order(self) -> List[str]:
+        """
+        Ordena as etapas de modo que cada uma venha depois das anteriores.
+
+        Returns:
+            List[str]: Os nomes das etapas.
+
+        Raises:
+            ValueError: Se houver um ciclo.
+        """
+
+        order, visiting, done = [], set(), set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Ciclo no pipeline passando por {name}.")
+            visiting.add(name)
+            for upstream in self._upstream(self.stages[name]):
+                visit(upstream)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _paths(self, stage: Stage, key: str) -> Dict[str, str]:
+        """
+        Monta os caminhos da entrada do cache de uma etapa.
+
+        Args:
+            stage (Stage): A etapa.
+            key (str): A chave da etapa.
+
+        Returns:
+            Dict[str, str]: Os caminhos das saídas e das impressões.
+        """
+
+        base = os.path.join(self.cache_dir, stage.name, key)
+        return {"values": f"{base}.joblib", "fingerprints": f"{base}.json"}
+
+    def _execute(
+        self, stage: Stage, key: str, inputs: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        Executa uma etapa e grava as saídas no cache.
+
+        Args:
+            stage (Stage): A etapa.
+            key (str): A chave da etapa.
+            inputs (Dict[str, Any]): As entradas.
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, str]]: As saídas e as impressões
+                digitais delas, pelo nome.
+        """
+
+        with span(f"stage.{stage.name}"):
+            result = stage.func(**inputs)
+        if len(stage.outputs) == 1:
+            result = (result,)
+        values = dict(zip(stage.outputs, result))
+        fingerprints = {
+            name: value_fingerprint(value) for name, value in values.items()
+        }
+
+        if stage.cache:
+            paths = self._paths(stage, key)
+            os.makedirs(os.path.dirname(paths["values"]), exist_ok=True)
+            # grava as saídas antes das impressões, que marcam a entrada
+            # como completa
+            joblib.dump(values, f"{paths['values']}.tmp")
+            os.replace(f"{paths['values']}.tmp", paths["values"])
+            with open(f"{paths['fingerprints']}.tmp", "w") as f:
+                json.dump(fingerprints, f)
+            os.replace(f"{paths['fingerprints']}.tmp", paths["fingerprints"])
+        return values, fingerprints
+
+    def run(
+        self,
+        targets: Optional[List[str]] = None,
+        force: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Executa as etapas necessárias para as saídas pedidas.
+
+        Args:
+            targets (List[str], opcional): As saídas pedidas. Padrão é todas
+                as saídas das etapas finais.
+            force (List[str], opcional): Etapas executadas mesmo com a chave
+                no cache.
+
+        Returns:
+            Dict[str, Any]: As saídas pedidas, pelo nome.
+        """
+
+        force = set(force or [])
+        if targets is None:
+            used = {i for stage in self.stages.values() for i in stage.inputs}
+            targets = [
+                output
+                for name in self._order
+                for output in self.stages[name].outputs
+                if output not in used
+            ]
+
+        # etapas necessárias para as saídas pedidas
+        needed, pending = set(), [self._producer[t] for t in targets]
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self._upstream(self.stages[name]))
+
+        fingerprints: Dict[str, str] = {}
+        values: Dict[str, Any] = {}
+        keys: Dict[str, str] = {}
+        hits: List[str] = []
+
+        def load(name: str) -> None:
+            stage = self.stages[self._producer[name]]
+            if name not in values:
+                values.update(
+                    joblib.load(self._paths(stage, keys[stage.name])["values"])
+                )
+
+        started = time.perf_counter()
+        remaining = [name for name in self._order if name in needed]
+        finished = set()
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            while remaining or running:
+                # em ordem topológica, então uma etapa pulada libera as
+                # seguintes na mesma passada
+                for name in list(remaining):
+                    stage = self.stages[name]
+                    if not set(self._upstream(stage)) <= finished:
+                        continue
+                    remaining.remove(name)
+                    keys[name] = stage.key(fingerprints)
+                    paths = self._paths(stage, keys[name])
+                    if (
+                        stage.cache
+                        and name not in force
+                        and os.path.exists(paths["fingerprints"])
+                    ):
+                        with open(paths["fingerprints"]) as f:
+                            fingerprints.update(json.load(f))
+                        hits.append(name)
+                        finished.add(name)
+                        logger.info(f"Etapa {name}: em cache, pulada.")
+                        continue
+
+                    for input_name in stage.inputs:
+                        load(input_name)
+                    logger.info(f"Etapa {name}: executando.")
+                    future = executor.submit(
+                        self._execute,
+                        stage,
+                        keys[name],
+                        {i: values[i] for i in stage.inputs},
+                    )
+                    running[future] = name
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    outputs, output_fingerprints = future.result()
+                    values.update(outputs)
+                    fingerprints.update(output_fingerprints)
+                    finished.add(running.pop(future))
+
+        for target in targets:
+            load(target)
+        logger.info(
+            f"Pipeline em {time.perf_counter() - started:.1f} s: "
+            f"{len(needed) - len(hits)} etapas executadas, "
+            f"{len(hits)} em cache ({', '.join(hits) or 'nenhuma'})."
+        )
+        return {target: values[target] for target in targets}
@@ -47,3 +47,23 @@ def save_model(model: Any) -> None:
     model_path = os.path.join(diretoria_atual, caminho_relativo)
 
     joblib.dump(model, model_path)
+
+
+def get_project_path(*paths: str) -> str:
+    """
+    Monta um caminho absoluto a partir da raiz do projeto.
+
+    Caminhos absolutos são retornados sem alteração, permitindo que as
+    entradas do config.yaml apontem para fora do projeto.
+
+    Args:
+        *paths (str): Partes do caminho relativas à raiz do projeto.
+
+    Returns:
+        str: O caminho absoluto resultante.
+    """
+
+    diretoria_atual = os.path.dirname(os.path.abspath(__file__))
+    raiz_projeto = os.path.abspath(os.path.join(diretoria_atual, "..", ".."))
+
+    return os.path.join(raiz_projeto, *paths)